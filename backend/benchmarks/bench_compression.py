@@ -0,0 +1,113 @@
+"""Benchmark response compression: bytes saved and CPU time per response size.
+
+Builds room lists and finance lists shaped like the API responses and
+compresses them with gzip and brotli at several levels.
+
+Run from the repository root:
+    python backend/benchmarks/bench_compression.py
+"""
+import gzip
+import json
+import random
+import statistics
+import time
+from datetime import date, timedelta
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REPEATS = 15
+
+
+def make_room(index, bookings):
+    """A room in the shape of GET /rooms?include=all"""
+    start = date(2025, 1, 1)
+    intervals = []
+    for n in range(bookings):
+        check_in = start + timedelta(days=n * 4 + random.randint(0, 1))
+        intervals.append({
+            'bookingId': '%024x' % random.getrandbits(96),
+            'checkIn': check_in.isoformat(),
+            'checkOut': (check_in + timedelta(days=random.randint(1, 3))).isoformat(),
+            'guestName': random.choice(['Nguyen Van A', 'Tran Thi B', 'Airbnb Guest', 'Le Van C']),
+            'guestPhone': '09%08d' % random.randint(0, 99999999),
+            'guestEmail': '',
+            'notes': random.choice(['', 'Late check-in', 'Synced from Airbnb']),
+            'createdAt': '2025-01-01T10:00:00'
+        })
+    return {
+        'id': '%04d' % index,
+        'room_id': '%04d' % index,
+        'name': f'Room {index}',
+        'price': 50 + index,
+        'capacity': 2 + index % 4,
+        'persons': 2 + index % 4,
+        'description': 'Cozy room with a garden view, air conditioning and private bathroom. ' * 3,
+        'amenities': ['WiFi', 'Air Conditioning', 'Hot Water', 'Parking'],
+        'images': {
+            'cover': [f'https://res.cloudinary.com/demo/image/upload/rooms/{index}/cover_{n}.jpg' for n in range(2)],
+            'bedroom': [f'https://res.cloudinary.com/demo/image/upload/rooms/{index}/bedroom_{n}.jpg' for n in range(4)],
+            'bathroom': [], 'exterior': []
+        },
+        'bookedIntervals': intervals,
+        'icalUrl': f'https://www.airbnb.com/calendar/ical/{index}.ics?s=abc',
+        'lastIcalSync': '2025-06-01T10:00:00',
+        'updated_at': '2025-06-01T10:00:00'
+    }
+
+
+def make_transactions(count):
+    """A finance list in the shape of GET /finance"""
+    return [{
+        '_id': '%024x' % random.getrandbits(96),
+        'type': random.choice(['income', 'expense']),
+        'amount': random.randint(100, 5000) * 1000,
+        'date': (date(2025, 1, 1) + timedelta(days=n % 365)).isoformat(),
+        'description': random.choice(['Room payment', 'Cleaning', 'Electricity bill', 'Laundry']),
+        'category': random.choice(['booking', 'utilities', 'maintenance']),
+        'personInCharge': random.choice(['Admin', 'Staff 1']),
+        'created_at': '2025-01-01T10:00:00'
+    } for n in range(count)]
+
+
+def timed(compress, data):
+    """Median milliseconds to compress data, and the compressed size"""
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        output = compress(data)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), len(output)
+
+
+def main():
+    random.seed(7)
+    payloads = [
+        ('rooms 3 x 10 bookings', {'success': True, 'data': [make_room(i, 10) for i in range(3)]}),
+        ('rooms 10 x 50 bookings', {'success': True, 'data': [make_room(i, 50) for i in range(10)]}),
+        ('rooms 30 x 200 bookings', {'success': True, 'data': [make_room(i, 200) for i in range(30)]}),
+        ('finance 100 transactions', {'success': True, 'transactions': make_transactions(100)}),
+        ('finance 2000 transactions', {'success': True, 'transactions': make_transactions(2000)}),
+    ]
+    codecs = [(f'gzip-{level}', lambda data, level=level: gzip.compress(data, compresslevel=level, mtime=0))
+              for level in (1, 6, 9)]
+    if brotli is not None:
+        codecs += [(f'br-{quality}', lambda data, quality=quality: brotli.compress(data, quality=quality))
+                   for quality in (1, 5, 11)]
+    else:
+        print('brotli not installed - showing gzip only\n')
+
+    print(f"{'payload':<28}{'codec':<9}{'raw KB':>9}{'sent KB':>9}{'saved':>8}{'ms':>9}")
+    for name, payload in payloads:
+        data = json.dumps(payload).encode('utf-8')
+        for codec_name, compress in codecs:
+            ms, size = timed(compress, data)
+            print(f"{name:<28}{codec_name:<9}{len(data) / 1024:>9.1f}{size / 1024:>9.1f}"
+                  f"{1 - size / len(data):>8.0%}{ms:>9.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
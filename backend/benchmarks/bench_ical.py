@@ -0,0 +1,130 @@
+"""Benchmark iCal feed parsing: icalendar object tree vs the streaming extractor.
+
+Builds Airbnb-style feeds where most events are in the past and compares
+Calendar.from_ical + walk() (the previous sync path) against
+server.diff_ical_bookings, in CPU time and peak allocated memory.
+
+The feed bytes are built before measuring, so peak memory is what parsing
+allocates on top of the body. The icalendar path needs the whole body in
+memory; the sync feeds the streaming extractor the lines of the response as
+they arrive (see fetch_ical_feed), which the streaming run mimics by reading
+the body in 64 KB chunks.
+
+Run from the repository root:
+    python backend/benchmarks/bench_ical.py
+"""
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta
+
+from icalendar import Calendar
+
+# Import the app in fallback mode - never connect to a real database from here
+os.environ['MONGODB_URI'] = ''
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+
+REPEATS = 5
+
+
+def make_feed(events, future_share=0.05):
+    """An Airbnb-style feed with the given number of events, mostly in the past"""
+    today = date.today()
+    future = max(1, int(events * future_share))
+    lines = ['BEGIN:VCALENDAR', 'PRODID:-//Airbnb Inc//Hosting Calendar 0.8.8//EN',
+             'CALSCALE:GREGORIAN', 'VERSION:2.0']
+    start = today - timedelta(days=(events - future) * 3)
+    for n in range(events):
+        check_in = start + timedelta(days=n * 3)
+        check_out = check_in + timedelta(days=random.randint(1, 2))
+        lines += [
+            'BEGIN:VEVENT',
+            f'DTSTAMP:{datetime.now():%Y%m%dT%H%M%SZ}',
+            f'DTSTART;VALUE=DATE:{check_in:%Y%m%d}',
+            f'DTEND;VALUE=DATE:{check_out:%Y%m%d}',
+            f'UID:{random.getrandbits(64):016x}-{n}@airbnb.com',
+            'SUMMARY:Reserved',
+            'DESCRIPTION:Reservation URL: https://www.airbnb.com/hosting/reservations/details/'
+            f'HM{random.getrandbits(40):010X}\\nPhone Number (Last 4 Digits): {random.randint(0, 9999):04d}',
+            'END:VEVENT',
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(lines) + '\r\n').encode('utf-8')
+
+
+def icalendar_bookings(content):
+    """The previous sync path: build the whole calendar, then drop past events"""
+    cal = Calendar.from_ical(content)
+    today = datetime.now().date()
+    bookings = []
+    for component in cal.walk():
+        if component.name != 'VEVENT':
+            continue
+        dtstart = component.get('DTSTART')
+        dtend = component.get('DTEND')
+        if not dtstart or not dtend:
+            continue
+        start_date, end_date = dtstart.dt, dtend.dt
+        if hasattr(start_date, 'date'):
+            start_date = start_date.date()
+        if hasattr(end_date, 'date'):
+            end_date = end_date.date()
+        if end_date < today:
+            continue
+        bookings.append({
+            'checkIn': start_date.strftime('%Y-%m-%d'),
+            'checkOut': end_date.strftime('%Y-%m-%d'),
+            'icalUid': str(component.get('UID', '')),
+        })
+    return bookings
+
+
+def chunked_lines(content, chunk_size=65536):
+    """Split content into lines the way fetch_ical_feed does for a streamed response"""
+    pending = b''
+    for start in range(0, len(content), chunk_size):
+        lines = (pending + content[start:start + chunk_size]).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+
+def streaming_bookings(content):
+    """The current sync path"""
+    return server.diff_ical_bookings(chunked_lines(content), [])[0]['added']
+
+
+def measure(parse, content):
+    """Median milliseconds, peak allocated KB and the number of bookings found"""
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        bookings = parse(content)
+        samples.append((time.perf_counter() - started) * 1000)
+    tracemalloc.start()
+    parse(content)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024, len(bookings)
+
+
+def main():
+    random.seed(7)
+    parsers = [('icalendar', icalendar_bookings), ('streaming', streaming_bookings)]
+
+    print(f"{'feed':<16}{'KB':>8}  {'parser':<11}{'ms':>9}{'peak KB':>10}{'bookings':>10}")
+    for events in (100, 1000, 5000, 20000):
+        content = make_feed(events)
+        for name, parse in parsers:
+            ms, peak_kb, found = measure(parse, content)
+            print(f"{events:>6} events{len(content) / 1024:>12.0f}  {name:<11}{ms:>9.1f}{peak_kb:>10.0f}{found:>10}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark JSON serialization of the room-list and finance-list shapes.
+
+Compares Flask's default JSON provider and the old snapshot format
+(json.dump with indent) against server.dump_json_bytes, with and without
+orjson.
+
+Run from the repository root:
+    python backend/benchmarks/bench_json.py
+"""
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from bson.objectid import ObjectId
+
+from bench_compression import make_room, make_transactions
+
+# Import the app in fallback mode - never connect to a real database from here
+os.environ['MONGODB_URI'] = ''
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+from flask.json.provider import DefaultJSONProvider  # noqa: E402
+
+REPEATS = 25
+
+
+def as_documents(rooms):
+    """Room dicts as MongoDB returns them (datetimes, ObjectId booking ids)"""
+    for room in rooms:
+        room['updated_at'] = datetime(2025, 6, 1, 10, 0, 0)
+        for booking in room['bookedIntervals']:
+            booking['_id'] = ObjectId()
+    return rooms
+
+
+def as_finance_documents(transactions):
+    """Transactions as MongoDB returns them"""
+    for n, transaction in enumerate(transactions):
+        transaction['_id'] = ObjectId()
+        transaction['created_at'] = datetime(2025, 1, 1) + timedelta(minutes=n)
+    return transactions
+
+
+def old_snapshot(obj):
+    """The previous rooms_data.json format"""
+    return json.dumps(obj, indent=4, ensure_ascii=False, default=server.json_default).encode('utf-8')
+
+
+def timed(serialize, obj):
+    """Median milliseconds to serialize obj, and the output size"""
+    samples = []
+    for _ in range(REPEATS):
+        started = time.perf_counter()
+        output = serialize(obj)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), len(output)
+
+
+def main():
+    random.seed(7)
+    flask_default = DefaultJSONProvider(server.app)
+    orjson_available = server.ORJSON_AVAILABLE
+
+    def stdlib_compact(obj):
+        server.ORJSON_AVAILABLE = False
+        try:
+            return server.dump_json_bytes(obj)
+        finally:
+            server.ORJSON_AVAILABLE = orjson_available
+
+    serializers = [
+        ('flask default', lambda obj: flask_default.dumps(obj, default=server.json_default).encode('utf-8')),
+        ('old snapshot', old_snapshot),
+        ('json compact', stdlib_compact),
+    ]
+    if orjson_available:
+        serializers.append(('orjson', server.dump_json_bytes))
+    else:
+        print('orjson not installed - showing the json module only\n')
+
+    payloads = [
+        ('rooms 10 x 50 bookings', {'success': True, 'data': as_documents([make_room(i, 50) for i in range(10)])}),
+        ('rooms 30 x 200 bookings', {'success': True, 'data': as_documents([make_room(i, 200) for i in range(30)])}),
+        ('finance 100 transactions', {'success': True, 'transactions': as_finance_documents(make_transactions(100))}),
+        ('finance 2000 transactions', {'success': True, 'transactions': as_finance_documents(make_transactions(2000))}),
+    ]
+
+    print(f"{'payload':<28}{'serializer':<15}{'KB':>9}{'ms':>9}")
+    for name, payload in payloads:
+        for serializer_name, serialize in serializers:
+            ms, size = timed(serialize, payload)
+            print(f"{name:<28}{serializer_name:<15}{size / 1024:>9.1f}{ms:>9.2f}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,32 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from pymongo.mongo_client import MongoClient
 from pymongo.server_api import ServerApi
-from pymongo import ReplaceOne
+from pymongo.errors import OperationFailure, PyMongoError, DuplicateKeyError
+from pymongo import ReplaceOne, UpdateOne, UpdateMany, InsertOne, DeleteOne, DeleteMany, ReturnDocument
 from bson.objectid import ObjectId
 from dotenv import load_dotenv
 from werkzeug.utils import secure_filename
 import os
 import json
 import io
+import threading
+import queue
+import time
+import hashlib
+import hmac
+import secrets
+import base64
+import bisect
+import gzip
+import calendar
+import random
+import re
 from datetime import datetime, timezone, timedelta
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
 from functools import wraps
 
 # Authentication libraries
@@ -35,20 +52,63 @@ except ImportError:
     ICAL_AVAILABLE = False
     print("⚠️ icalendar not installed. iCal sync will be unavailable.")
 
-# Custom JSON encoder to handle datetime and ObjectId
-class MongoJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, datetime):
-            return obj.isoformat()
-        if isinstance(obj, ObjectId):
-            return str(obj)
-        return super().default(obj)
+# orjson for fast JSON serialization (the standard json module is used when it is missing)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Brotli for response compression (gzip is used when it is missing)
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+# ===== JSON Serialization =====
+# API responses and the rooms_data.json snapshot share one compact serializer:
+# orjson when installed, the json module otherwise. datetimes become ISO 8601
+# strings and ObjectIds hex strings. See backend/benchmarks/bench_json.py.
+def json_default(obj):
+    """Serialize the non-JSON types found in MongoDB documents"""
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+def dump_json_bytes(obj):
+    """Serialize to compact UTF-8 JSON bytes"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.dumps(obj, default=json_default, option=orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits - let the json module try
+    return json.dumps(obj, default=json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by dump_json_bytes (used by jsonify)"""
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dump_json_bytes(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if ORJSON_AVAILABLE and not kwargs:
+            return orjson.loads(s)
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dump_json_bytes(obj), mimetype=self.mimetype)
 
 # Load environment variables
 load_dotenv()
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static', static_url_path='/backend/static')
+app.json = FastJSONProvider(app)
 
 # Disable Flask-CORS and handle CORS manually for full control
 # CORS(app) - disabled to prevent duplicate headers
@@ -63,7 +123,7 @@ def after_request(response):
     response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS, PATCH'
     response.headers['Access-Control-Allow-Credentials'] = 'true'
     response.headers['Access-Control-Max-Age'] = '86400'
-    return response
+    return compress_response(response)
 
 # Handle OPTIONS preflight requests globally for ALL routes
 @app.route('/<path:path>', methods=['OPTIONS'])
@@ -72,6 +132,65 @@ def handle_options(path=''):
     response = jsonify({'success': True})
     return response, 200
 
+# ===== Response Compression =====
+# JSON API responses and text-like files under /backend/static are compressed
+# with brotli or gzip, whichever the client accepts (brotli preferred). Small
+# bodies, streams (SSE) and already-encoded responses are sent as they are.
+# See backend/benchmarks/bench_compression.py for sizes and CPU cost.
+COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '5'))
+COMPRESSIBLE_MIMETYPES = frozenset([
+    'application/json', 'application/javascript', 'text/javascript', 'text/css',
+    'text/html', 'text/plain', 'text/calendar', 'image/svg+xml'
+])
+
+def negotiate_encoding(accept_encodings):
+    """Pick 'br', 'gzip' or None from the request's Accept-Encoding"""
+    if BROTLI_AVAILABLE and accept_encodings.quality('br') > 0:
+        return 'br'
+    if accept_encodings.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+def compress_payload(data, encoding):
+    """Compress bytes with the configured level for an encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def compress_response(response):
+    """Compress a finished response in place when it is worth it"""
+    if (response.status_code < 200 or response.status_code in (204, 206, 304)
+            or request.method == 'HEAD'
+            # Byte ranges address the identity body; encoding them would corrupt the slice
+            or 'Range' in request.headers
+            or 'Content-Range' in response.headers
+            or response.is_streamed and not response.direct_passthrough
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    
+    if response.direct_passthrough:
+        # File responses stream from disk; only static files are read into memory
+        if not request.path.startswith(app.static_url_path + '/'):
+            return response
+        response.direct_passthrough = False
+    
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(request.accept_encodings)
+    data = response.get_data()
+    if encoding is None or len(data) < COMPRESSION_MIN_BYTES:
+        return response
+    
+    response.set_data(compress_payload(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # The compressed body is a different representation of the same content
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    return response
+
 # Initialize variables
 client = None
 db = None
@@ -139,17 +258,7 @@ try:
     db = client[os.getenv('MONGODB_DB')]
     rooms_collection = db[os.getenv('MONGODB_COLLECTION')]
     print("✓ MongoDB connection successful - using live database")
-    
-    # Sync MongoDB data to local JSON file for backup/fallback (skip on Vercel - read-only)
-    if not IS_VERCEL:
-        try:
-            rooms_from_db = list(rooms_collection.find())
-            
-            with open(json_file_path, 'w', encoding='utf-8') as file:
-                json.dump(rooms_from_db, file, indent=4, ensure_ascii=False, cls=MongoJSONEncoder)
-            print(f"✓ Synced {len(rooms_from_db)} rooms to rooms_data.json")
-        except Exception as sync_error:
-            print(f"⚠️  Could not sync to JSON: {sync_error}")
+    # The rooms_data.json snapshot is written once bookings are migrated (see Bookings Collection)
         
 except Exception as e:
     print(f"❌ MongoDB connection failed: {e}")
@@ -171,13 +280,30 @@ except Exception as e:
 # JWT Secret Key - MUST be set in environment variables for production
 JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'khietan-homestay-super-secret-key-change-in-production-2024')
 JWT_EXPIRATION_HOURS = 24  # Token expires after 24 hours
+EVENT_STREAM_TOKEN_SECONDS = 60  # Stream tokens travel in URLs (and access logs), so they only open a stream
 
 # Users collection for authentication
 users_collection = None
 finance_collection = None
+meta_collection = None
+bookings_collection = None
+occupancy_collection = None
+tombstones_collection = None
+bookings_archive_collection = None
+ical_sync_state_collection = None
+sync_locks_collection = None
+jobs_collection = None
 if db is not None:
     users_collection = db['admin_users']
     finance_collection = db['finance_transactions']
+    meta_collection = db['app_meta']  # Shared counters (room catalog version, ...)
+    bookings_collection = db['bookings']  # One document per booking (roomId + dates)
+    occupancy_collection = db['room_occupancy']  # Booked-night counts per room and month
+    tombstones_collection = db['room_tombstones']  # Deleted room ids, for delta sync
+    bookings_archive_collection = db['bookings_archive']  # Past bookings moved out of bookings
+    ical_sync_state_collection = db['ical_sync_state']  # Per-room iCal schedule and last run
+    sync_locks_collection = db['sync_locks']  # Leases and last results of coalesced syncs
+    jobs_collection = db['jobs']  # Background jobs: status, progress and result
     print("✓ Users collection initialized")
     print("✓ Finance collection initialized")
     
@@ -202,6 +328,18 @@ if db is not None:
     except Exception as e:
         print(f"⚠️ Could not initialize default users: {e}")
 
+# Indexes backing the server-side room listing (filters, sort keys, keyset pagination)
+if rooms_collection is not None:
+    try:
+        rooms_collection.create_index([('persons', 1), ('_id', 1)])
+        rooms_collection.create_index([('price', 1), ('_id', 1)])
+        rooms_collection.create_index([('name', 1), ('_id', 1)])
+        rooms_collection.create_index([('promotion.active', 1), ('price', 1)])
+        rooms_collection.create_index('updated_at')  # Delta sync (?since=)
+        print("✓ Room listing indexes ensured")
+    except Exception as e:
+        print(f"⚠️ Could not create room indexes: {e}")
+
 def hash_password(password):
     """Hash a password using bcrypt"""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -222,10 +360,26 @@ def generate_token(user_data):
     }
     return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
 
-def verify_token(token):
-    """Verify and decode a JWT token"""
+def generate_event_stream_token(user_data):
+    """Generate a short-lived token that can only open the change event stream"""
+    payload = {
+        'username': user_data.get('username'),
+        'scope': 'events',
+        'exp': datetime.now(timezone.utc) + timedelta(seconds=EVENT_STREAM_TOKEN_SECONDS),
+        'iat': datetime.now(timezone.utc)
+    }
+    return jwt.encode(payload, JWT_SECRET_KEY, algorithm='HS256')
+
+def verify_token(token, scope=None):
+    """Verify and decode a JWT token.
+
+    Scoped tokens (see generate_event_stream_token) are only accepted where
+    their scope is asked for, and login tokens only where no scope is.
+    """
     try:
         payload = jwt.decode(token, JWT_SECRET_KEY, algorithms=['HS256'])
+        if payload.get('scope') != scope:
+            return None
         return payload
     except jwt.ExpiredSignatureError:
         return None
@@ -272,8 +426,76 @@ def admin_required(f):
     return decorated
 
 # ===== Helper Functions =====
-def convert_room_for_api(room):
-    """Convert MongoDB room document to API response format"""
+# API field name -> MongoDB field it is built from (used for projections)
+ROOM_API_FIELD_SOURCES = {
+    'room_id': '_id',
+    'id': '_id',
+    'name': 'name',
+    'price': 'price',
+    'capacity': 'persons',
+    'persons': 'persons',
+    'description': 'description',
+    'amenities': 'amenities',
+    'bookedIntervals': 'bookedIntervals',
+    'icalUrl': 'icalUrl',
+    'lastIcalSync': 'lastIcalSync',
+    'created_at': 'created_at',
+    'updated_at': 'updated_at',
+    'imageUrl': 'imageUrl',
+    'images': 'images',
+    'promotion': 'promotion'
+}
+
+# Default shape of the room list: everything needed for cards and filters,
+# without the heavy booking history, image galleries and long texts
+ROOM_SUMMARY_FIELDS = frozenset([
+    'room_id', 'id', 'name', 'price', 'capacity', 'persons', 'imageUrl',
+    'promotion', 'icalUrl', 'lastIcalSync', 'updated_at'
+])
+
+# Field groups that can be added to the summary with ?include=
+ROOM_FIELD_GROUPS = {
+    'bookings': ['bookedIntervals'],
+    'images': ['images'],
+    'details': ['description', 'amenities', 'created_at'],
+    'all': list(ROOM_API_FIELD_SOURCES)
+}
+
+def parse_room_fields(fields_param, include_param):
+    """Resolve ?fields= / ?include= into a set of API field names.
+
+    Returns None for the full room shape. Raises ValueError on unknown names.
+    """
+    if fields_param:
+        fields = set(f.strip() for f in fields_param.split(',') if f.strip())
+        unknown = fields - set(ROOM_API_FIELD_SOURCES)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        fields.add('id')  # Always needed to identify the room
+    else:
+        fields = set(ROOM_SUMMARY_FIELDS)
+    
+    if include_param:
+        for group in (g.strip() for g in include_param.split(',') if g.strip()):
+            if group not in ROOM_FIELD_GROUPS:
+                raise ValueError(f"Unknown include group: {group}")
+            fields.update(ROOM_FIELD_GROUPS[group])
+    
+    if fields >= set(ROOM_API_FIELD_SOURCES):
+        return None
+    return frozenset(fields)
+
+def room_projection(fields):
+    """MongoDB projection loading only what the given API fields need"""
+    if fields is None:
+        return None
+    return {ROOM_API_FIELD_SOURCES[f]: 1 for f in fields if ROOM_API_FIELD_SOURCES[f] != '_id'}
+
+def convert_room_for_api(room, fields=None):
+    """Convert MongoDB room document to API response format
+
+    When fields is given, only those API keys are emitted.
+    """
     if room is None:
         return None
     
@@ -309,8 +531,3070 @@ def convert_room_for_api(room):
     # Include promotion data if present
     if room.get('promotion'):
         api_room['promotion'] = room.get('promotion')
+    if fields is not None:
+        api_room = {key: value for key, value in api_room.items() if key in fields}
     return api_room
 
+# ===== Shared Version Counters =====
+# Monotonic counters stored in app_meta, one document per dataset. Mutations
+# bump them; readers use them for cache invalidation and ETags.
+ROOM_CATALOG_META_ID = 'rooms_catalog'
+FINANCE_META_ID = 'finance'
+USERS_META_ID = 'users'
+
+_meta_versions_lock = threading.Lock()
+_local_meta_versions = {}  # Used when running on fallback JSON data
+# Distinguishes local counters of this process from those of a previous run
+PROCESS_BOOT_ID = os.urandom(4).hex()
+
+def get_meta_version(key):
+    """Get the current version of a dataset (single point read on app_meta)"""
+    if meta_collection is None:
+        return _local_meta_versions.get(key, 0)
+    doc = meta_collection.find_one({'_id': key}, {'version': 1})
+    return doc.get('version', 0) if doc else 0
+
+def bump_meta_version(key):
+    """Increment the version of a dataset and return the new value"""
+    if meta_collection is None:
+        with _meta_versions_lock:
+            _local_meta_versions[key] = _local_meta_versions.get(key, 0) + 1
+            return _local_meta_versions[key]
+    doc = meta_collection.find_one_and_update(
+        {'_id': key},
+        {'$inc': {'version': 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc.get('version', 0)
+
+def bump_meta_version_safely(key):
+    """Bump a dataset version, logging (not raising) on failure"""
+    try:
+        return bump_meta_version(key)
+    except Exception as e:
+        print(f"⚠️ Could not bump {key} version: {e}")
+        return None
+
+# ===== Change Events =====
+# Compact change notifications ({'type': 'booking.added', 'data': {...}}) pushed
+# to open dashboards over Server-Sent Events (GET /backend/api/events). When the
+# deployment supports MongoDB change streams, one watcher thread per process
+# turns database changes from every worker into events; otherwise mutation
+# endpoints publish to the subscribers of their own process. A deployment
+# without change streams is remembered, and the watcher is only tried again
+# after a growing backoff.
+# Every open stream holds a worker thread for up to EVENT_STREAM_MAX_SECONDS.
+# Serverless platforms bill (and may buffer) such responses, and instances do
+# not share in-process events, so streams are off on Vercel by default and
+# dashboards fall back to polling for changes.
+EVENT_STREAM_ENABLED = os.getenv('EVENT_STREAM_ENABLED', 'false' if IS_VERCEL else 'true').lower() == 'true'
+EVENT_HISTORY_SIZE = 200  # Recent events kept for Last-Event-ID replay
+EVENT_QUEUE_SIZE = 100
+EVENT_HEARTBEAT_SECONDS = 15
+# Streams end after this long and the client reconnects
+EVENT_STREAM_MAX_SECONDS = int(os.getenv('EVENT_STREAM_MAX_SECONDS', '50' if IS_VERCEL else '900'))
+CHANGE_STREAM_RETRY_SECONDS = 60  # First wait after the watcher failed; doubles up to an hour
+CHANGE_STREAM_RETRY_MAX_SECONDS = 3600
+EVENT_WATCHED_COLLECTIONS = {
+    # The rooms collection is named by MONGODB_COLLECTION
+    (rooms_collection.name if rooms_collection is not None else 'rooms'): 'room',
+    'bookings': 'booking',
+    'finance_transactions': 'transaction'
+}
+
+_events_lock = threading.Lock()
+_event_subscribers = set()
+_event_history = deque(maxlen=EVENT_HISTORY_SIZE)
+_event_sequence = 0
+_change_stream = {'thread': None, 'active': False, 'retry_at': 0.0, 'backoff': CHANGE_STREAM_RETRY_SECONDS}
+
+def broadcast_event(event_type, data):
+    """Number an event, remember it for replay and hand it to every subscriber"""
+    global _event_sequence
+    with _events_lock:
+        _event_sequence += 1
+        event = {
+            'id': f'{PROCESS_BOOT_ID}-{_event_sequence}',
+            'type': event_type,
+            'data': data,
+            'at': datetime.now(timezone.utc).isoformat()
+        }
+        _event_history.append(event)
+        subscribers = list(_event_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            # Slow client: drop its oldest event, events are only refresh hints
+            try:
+                subscriber.get_nowait()
+                subscriber.put_nowait(event)
+            except (queue.Empty, queue.Full):
+                pass
+
+def publish_event(event_type, **data):
+    """Publish a change event from a mutation endpoint.
+
+    Skipped while a change stream is active, which reports the same change.
+    """
+    if _change_stream['active']:
+        return
+    try:
+        broadcast_event(event_type, data)
+    except Exception as e:
+        print(f"⚠️ Could not publish {event_type} event: {e}")
+
+def change_stream_event(change):
+    """Translate a MongoDB change stream document into (event_type, data), or None"""
+    prefix = EVENT_WATCHED_COLLECTIONS.get(change.get('ns', {}).get('coll'))
+    operation = change.get('operationType')
+    if prefix is None or operation not in ('insert', 'update', 'replace', 'delete'):
+        return None
+    key = str(change.get('documentKey', {}).get('_id'))
+    
+    if prefix == 'room':
+        return ('room.deleted' if operation == 'delete' else 'room.updated'), {'roomId': key}
+    if prefix == 'booking':
+        if operation == 'insert':
+            booking = change.get('fullDocument') or {}
+            return 'booking.added', {
+                'bookingId': key,
+                'roomId': str(booking.get('roomId')),
+                'checkIn': booking.get('checkIn'),
+                'checkOut': booking.get('checkOut')
+            }
+        return ('booking.removed' if operation == 'delete' else 'booking.updated'), {'bookingId': key}
+    suffix = {'insert': 'created', 'delete': 'deleted'}.get(operation, 'updated')
+    return f'transaction.{suffix}', {'transactionId': key}
+
+def watch_change_streams():
+    """Broadcast database changes until the stream fails (runs in a thread)"""
+    pipeline = [{'$match': {
+        'ns.coll': {'$in': list(EVENT_WATCHED_COLLECTIONS)},
+        'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+    }}]
+    try:
+        with db.watch(pipeline) as stream:
+            _change_stream.update(active=True, backoff=CHANGE_STREAM_RETRY_SECONDS)
+            print("✓ Watching MongoDB change streams for events")
+            for change in stream:
+                translated = change_stream_event(change)
+                if translated:
+                    broadcast_event(*translated)
+    except PyMongoError as e:
+        # Standalone servers have no change streams
+        print(f"⚠️ MongoDB change streams unavailable, using in-process events: {e}")
+    finally:
+        with _events_lock:
+            backoff = _change_stream['backoff']
+            _change_stream.update(
+                active=False,
+                thread=None,
+                retry_at=time.monotonic() + backoff,
+                backoff=min(backoff * 2, CHANGE_STREAM_RETRY_MAX_SECONDS)
+            )
+
+def ensure_change_stream_watcher():
+    """Start the change stream watcher when someone subscribes and none is running or backing off"""
+    if db is None:
+        return
+    with _events_lock:
+        if _change_stream['thread'] is not None or time.monotonic() < _change_stream['retry_at']:
+            return
+        thread = threading.Thread(target=watch_change_streams, name='change-stream-watcher', daemon=True)
+        _change_stream['thread'] = thread
+    thread.start()
+
+def subscribe_events():
+    """Register a new subscriber queue"""
+    ensure_change_stream_watcher()
+    subscriber = queue.Queue(maxsize=EVENT_QUEUE_SIZE)
+    with _events_lock:
+        _event_subscribers.add(subscriber)
+    return subscriber
+
+def unsubscribe_events(subscriber):
+    """Remove a subscriber queue"""
+    with _events_lock:
+        _event_subscribers.discard(subscriber)
+
+def events_after(last_event_id):
+    """Events after last_event_id, or None when it can't be replayed from this process"""
+    with _events_lock:
+        history = list(_event_history)
+    ids = [event['id'] for event in history]
+    if last_event_id not in ids:
+        return None
+    return history[ids.index(last_event_id) + 1:]
+
+def format_sse(event):
+    """Serialize an event in the text/event-stream format"""
+    payload = dump_json_bytes({'type': event['type'], 'at': event['at'], **event['data']}).decode('utf-8')
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {payload}\n\n"
+
+# ===== Room Resolver =====
+# Room ids arrive as strings. Stored _ids are canonically strings too, but
+# older rooms may still carry ObjectIds until an admin runs normalize_room_ids().
+# The stored type of every id seen is remembered so a lookup is one point read.
+_room_id_types = {}  # room id string -> 'str' or 'oid'
+
+def room_key_candidates(room_id):
+    """Possible stored _id values for a room id string (string and ObjectId forms)"""
+    candidates = [room_id]
+    if ObjectId.is_valid(room_id):
+        candidates.append(ObjectId(room_id))
+    return candidates
+
+def resolve_room(room_id, projection=None):
+    """Find a room by its id string; returns the document (with its stored _id) or None"""
+    if rooms_collection is None:
+        return next((r for r in fallback_rooms if str(r.get('_id')) == room_id), None)
+    
+    known_type = _room_id_types.get(room_id)
+    if known_type is not None:
+        room_key = ObjectId(room_id) if known_type == 'oid' else room_id
+        room = rooms_collection.find_one({'_id': room_key}, projection)
+        if room is not None:
+            return room
+        # Deleted or normalized since - forget the remembered type
+        _room_id_types.pop(room_id, None)
+    
+    candidates = room_key_candidates(room_id)
+    query = {'_id': candidates[0]} if len(candidates) == 1 else {'_id': {'$in': candidates}}
+    room = rooms_collection.find_one(query, projection)
+    if room is not None:
+        _room_id_types[room_id] = 'oid' if isinstance(room['_id'], ObjectId) else 'str'
+    return room
+
+def resolve_rooms(room_ids, projection=None, session=None):
+    """Find many rooms by id string in one query; returns {room id string: document}"""
+    if rooms_collection is None:
+        wanted = set(room_ids)
+        return {str(r.get('_id')): r for r in fallback_rooms if str(r.get('_id')) in wanted}
+    
+    candidates = []
+    for room_id in set(room_ids):
+        candidates += room_key_candidates(room_id)
+    rooms = {}
+    for room in rooms_collection.find({'_id': {'$in': candidates}}, projection, session=session):
+        rooms[str(room['_id'])] = room
+        _room_id_types[str(room['_id'])] = 'oid' if isinstance(room['_id'], ObjectId) else 'str'
+    return rooms
+
+def normalize_room_ids():
+    """Rewrite ObjectId room _ids as their hex strings (the canonical form).
+
+    Run by an admin (POST /rooms/normalize-ids), never at startup. Each room is
+    moved in its own transaction together with everything keyed by its id:
+    bookings, archived bookings, occupancy and its iCal sync state. Occupancy
+    and sync_locks _ids already use the id string and stay as they are.
+    Idempotent, and a re-run finishes a move interrupted without transactions.
+    Returns the number of rooms moved.
+    """
+    migrated = 0
+    for room_key in rooms_collection.distinct('_id', {'_id': {'$type': 'objectId'}}):
+        new_key = str(room_key)
+        
+        def move_room(session, old_key=room_key, new_key=new_key):
+            room = rooms_collection.find_one({'_id': old_key}, session=session)
+            if room is None:
+                return False  # Moved by a concurrent run
+            # Copy before deleting, so an interrupted move leaves both and not neither
+            rooms_collection.replace_one({'_id': new_key}, {**room, '_id': new_key}, upsert=True, session=session)
+            rooms_collection.delete_one({'_id': old_key}, session=session)
+            for collection in (bookings_collection, bookings_archive_collection, occupancy_collection):
+                if collection is not None:
+                    collection.update_many({'roomId': old_key}, {'$set': {'roomId': new_key}}, session=session)
+            if ical_sync_state_collection is not None:
+                state = ical_sync_state_collection.find_one({'_id': old_key}, session=session)
+                if state is not None:
+                    ical_sync_state_collection.replace_one(
+                        {'_id': new_key}, {**state, '_id': new_key, 'roomId': new_key}, upsert=True, session=session
+                    )
+                    ical_sync_state_collection.delete_one({'_id': old_key}, session=session)
+            return True
+        
+        if run_in_transaction(move_room):
+            _room_id_types[new_key] = 'str'
+            migrated += 1
+    
+    if migrated:
+        room_catalog_changed()
+    return migrated
+
+# ===== Room Occupancy =====
+# Booked nights are kept per room and month in room_occupancy as a day -> count
+# map ({'_id': '<room>|2026-07', 'days': {'14': 1, '15': 1}}). Every booking
+# write adjusts the counts with $inc, so a month grid is read without touching
+# booking history. A night is booked while its count is above zero; the
+# check-out day itself stays free. app_meta records when the counts were first
+# built from the bookings; until then the first calendar read builds them.
+OCCUPANCY_META_ID = 'room_occupancy'
+
+_occupancy_built = False  # Set once this process has seen the counts built
+
+def booking_nights_by_month(check_in, check_out):
+    """Group the nights of [check_in, check_out) as {'YYYY-MM': [day numbers]}"""
+    try:
+        night = datetime.strptime(str(check_in)[:10], '%Y-%m-%d').date()
+        end = datetime.strptime(str(check_out)[:10], '%Y-%m-%d').date()
+    except ValueError:
+        return {}
+    months = {}
+    while night < end:
+        months.setdefault(night.strftime('%Y-%m'), []).append(night.day)
+        night += timedelta(days=1)
+    return months
+
+def record_occupancy(entries, session=None):
+    """Apply booked-night count changes for (room_key, booking, delta) entries.
+
+    delta is the number of bookings added (positive) or removed (negative) with
+    those dates. All changes go out as one bulk write, one upsert per room-month.
+    """
+    if occupancy_collection is None:
+        return
+    changes = {}
+    for room_key, booking, delta in entries:
+        if not delta:
+            continue
+        nights = booking_nights_by_month(booking.get('checkIn'), booking.get('checkOut'))
+        for month, days in nights.items():
+            month_changes = changes.setdefault((room_key, month), {})
+            for day in days:
+                month_changes[day] = month_changes.get(day, 0) + delta
+    
+    operations = [
+        UpdateOne(
+            {'_id': f'{room_key}|{month}'},
+            {
+                '$inc': {f'days.{day}': count for day, count in days.items()},
+                '$set': {'roomId': room_key, 'month': month}
+            },
+            upsert=True
+        )
+        for (room_key, month), days in changes.items()
+    ]
+    if operations:
+        occupancy_collection.bulk_write(operations, session=session)
+
+def rebuild_room_occupancy(room_key):
+    """Recount one room's booked nights and swap its month documents in.
+
+    Runs under the room's booking guard (see run_in_transaction), so booking
+    writes of the room, and with them their $inc on these documents, happen
+    entirely before or after the recount. Returns the bookings counted.
+    """
+    def callback(session):
+        query = {'roomId': room_key}
+        fields = {'checkIn': 1, 'checkOut': 1}
+        bookings = list(bookings_collection.find(query, fields, session=session))
+        # Archived bookings keep their nights counted (see Booking Archive)
+        if bookings_archive_collection is not None:
+            bookings += list(bookings_archive_collection.find(query, fields, session=session))
+        # Embedded bookings of a room that has not been migrated yet count too
+        room = rooms_collection.find_one({'_id': room_key}, {'bookedIntervals': 1}, session=session) or {}
+        bookings += room.get('bookedIntervals') or []
+        
+        months = {}
+        for booking in bookings:
+            for month, days in booking_nights_by_month(booking.get('checkIn'), booking.get('checkOut')).items():
+                counts = months.setdefault(month, {})
+                for day in days:
+                    counts[str(day)] = counts.get(str(day), 0) + 1
+        for month, counts in months.items():
+            occupancy_collection.replace_one(
+                {'_id': f'{room_key}|{month}'},
+                {'roomId': room_key, 'month': month, 'days': counts},
+                upsert=True,
+                session=session
+            )
+        occupancy_collection.delete_many({'roomId': room_key, 'month': {'$nin': list(months)}}, session=session)
+        return len(bookings)
+    
+    return run_in_transaction(callback, room_ids=[str(room_key)])
+
+def rebuild_occupancy(room_key=None):
+    """Recount booked nights from the stored bookings (every room, or one room).
+
+    Rooms are recounted one at a time with rebuild_room_occupancy, never by
+    clearing the collection, so concurrent booking writes are not lost.
+    Returns the bookings counted.
+    """
+    if room_key is not None:
+        return rebuild_room_occupancy(room_key)
+    # Rooms left in the grid after being deleted are recounted (and cleared) too
+    room_keys = {room['_id'] for room in rooms_collection.find({}, {'_id': 1})}
+    room_keys.update(occupancy_collection.distinct('roomId'))
+    counted = sum(rebuild_room_occupancy(key) for key in room_keys)
+    if meta_collection is not None:
+        meta_collection.update_one(
+            {'_id': OCCUPANCY_META_ID},
+            {'$set': {'built_at': datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    return counted
+
+def ensure_occupancy_built():
+    """Build the counts if they never were. Returns the bookings counted, or None.
+
+    Runs from run_booking_maintenance and before every calendar read, so the
+    grid is complete right after a deploy; concurrent callers share one build
+    (see Sync Coalescing).
+    """
+    global _occupancy_built
+    if _occupancy_built or occupancy_collection is None:
+        return None
+    if meta_collection.find_one({'_id': OCCUPANCY_META_ID}) is not None:
+        _occupancy_built = True
+        return None
+    payload, _, mode = coalesce_sync('maintenance:occupancy', lambda: ({'counted': rebuild_occupancy()}, 200))
+    _occupancy_built = True
+    return payload['counted'] if mode == 'fresh' else None
+
+def occupancy_bitmap(day_counts, days_in_month):
+    """Render a month's day -> count map as '0'/'1' characters, one per day"""
+    return ''.join(
+        '1' if day_counts.get(str(day), 0) > 0 else '0'
+        for day in range(1, days_in_month + 1)
+    )
+
+def month_occupancy(month, days_in_month):
+    """Return {room id string: bitmap} for every room with bookings in a YYYY-MM month"""
+    if rooms_collection is None:
+        bitmaps = {}
+        for room in fallback_rooms:
+            counts = {}
+            for booking in room.get('bookedIntervals') or []:
+                nights = booking_nights_by_month(booking.get('checkIn'), booking.get('checkOut'))
+                for day in nights.get(month, []):
+                    counts[str(day)] = counts.get(str(day), 0) + 1
+            if counts:
+                bitmaps[str(room.get('_id'))] = occupancy_bitmap(counts, days_in_month)
+        return bitmaps
+    
+    ensure_occupancy_built()
+    return {
+        str(doc['roomId']): occupancy_bitmap(doc.get('days') or {}, days_in_month)
+        for doc in occupancy_collection.find({'month': month}, {'roomId': 1, 'days': 1})
+    }
+
+# ===== Bookings Collection =====
+# Bookings live in their own collection keyed by roomId (the room's stored _id)
+# instead of an ever-growing bookedIntervals array on the room document. The
+# API still exposes them as room['bookedIntervals'], attached on read. In
+# fallback JSON mode bookings stay embedded in the room dicts.
+BOOKING_ROOM_FIELDS = ('_id', 'roomId')
+
+def convert_booking_for_api(booking):
+    """Convert a bookings collection document to the bookedIntervals entry format"""
+    api_booking = {key: value for key, value in booking.items() if key not in BOOKING_ROOM_FIELDS}
+    api_booking['bookingId'] = str(booking['_id'])
+    return api_booking
+
+def booking_window_filter(room_key, start=None, end=None):
+    """Filter for a room's bookings overlapping [start, end) (either bound optional)"""
+    query = {'roomId': room_key}
+    if end:
+        query['checkIn'] = {'$lt': end}
+    if start:
+        query['checkOut'] = {'$gt': start}
+    return query
+
+def find_room_bookings(room_key, start=None, end=None):
+    """Load a room's bookings (API format) overlapping an optional date window"""
+    if bookings_collection is None:
+        return []
+    cursor = bookings_collection.find(booking_window_filter(room_key, start, end)).sort('checkIn', 1)
+    return [convert_booking_for_api(booking) for booking in cursor]
+
+def find_bookings_in_window(start, end):
+    """Load every room's bookings overlapping [start, end) as {room id string: [bookings]}"""
+    by_room = {}
+    if rooms_collection is None:
+        for room in fallback_rooms:
+            bookings = [
+                interval for interval in room.get('bookedIntervals') or []
+                if interval.get('checkIn', '') < end and interval.get('checkOut', '') > start
+            ]
+            if bookings:
+                by_room[str(room.get('_id'))] = bookings
+        return by_room
+    
+    cursor = bookings_collection.find({'checkOut': {'$gt': start}, 'checkIn': {'$lt': end}}).sort('checkIn', 1)
+    for booking in cursor:
+        by_room.setdefault(str(booking['roomId']), []).append(convert_booking_for_api(booking))
+    return by_room
+
+def attach_bookings(rooms):
+    """Set bookedIntervals on room documents from the bookings collection.
+
+    Any not-yet-migrated embedded entries are kept in front of the collection ones.
+    """
+    if bookings_collection is None or not rooms:
+        return rooms
+    by_room = {}
+    room_keys = [room.get('_id') for room in rooms]
+    cursor = bookings_collection.find({'roomId': {'$in': room_keys}}).sort([('roomId', 1), ('checkIn', 1)])
+    for booking in cursor:
+        by_room.setdefault(booking['roomId'], []).append(convert_booking_for_api(booking))
+    for room in rooms:
+        room['bookedIntervals'] = list(room.get('bookedIntervals') or []) + by_room.get(room.get('_id'), [])
+    return rooms
+
+def existing_intervals_for_sync(room):
+    """Bookings an iCal feed is reconciled with (embedded + stored, not yet past)"""
+    intervals = list(room.get('bookedIntervals') or [])
+    if rooms_collection is not None:
+        # Events that ended before today are skipped, so only bookings checking
+        # out today or later can match one
+        yesterday = (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+        intervals += find_room_bookings(room['_id'], start=yesterday)
+    return intervals
+
+def insert_room_bookings(room_key, bookings):
+    """Insert booking entries for a room into the bookings collection"""
+    if bookings:
+        bookings_collection.insert_many([{'roomId': room_key, **booking} for booking in bookings])
+        record_occupancy([(room_key, booking, 1) for booking in bookings])
+
+_transactions_supported = None  # Unknown until the first transaction is attempted
+
+# Standalone servers (local development) cannot run transactions. Booking
+# writes then hold a lease per room in sync_locks instead (_id 'booking:<room
+# id>', taken with a conditional upsert like locked_sync's), so the overlap
+# read and the write of two writers of one room never interleave. A writer
+# that cannot take the lease in time fails rather than writing unguarded.
+BOOKING_LOCK_SECONDS = 30  # Lease of a booking write; far longer than one takes
+BOOKING_LOCK_WAIT_SECONDS = 5
+BOOKING_LOCK_POLL_SECONDS = 0.05
+
+class RoomBusyError(Exception):
+    """Another booking write held a room's lease for longer than we can wait"""
+
+def acquire_booking_locks(room_ids, owner):
+    """Take the booking lease of every room (in a fixed order); returns the lock ids"""
+    acquired = []
+    deadline = time.monotonic() + BOOKING_LOCK_WAIT_SECONDS
+    for lock_id in sorted({f'booking:{room_id}' for room_id in room_ids}):
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                sync_locks_collection.update_one(
+                    {'_id': lock_id, '$or': [{'expiresAt': {'$lte': now}}, {'expiresAt': None}]},
+                    {'$set': {'owner': owner, 'expiresAt': now + timedelta(seconds=BOOKING_LOCK_SECONDS)}},
+                    upsert=True
+                )
+                acquired.append(lock_id)
+                break
+            except DuplicateKeyError:
+                if time.monotonic() >= deadline:
+                    release_booking_locks(acquired, owner)
+                    raise RoomBusyError('Room is busy with another booking change, please try again')
+                time.sleep(BOOKING_LOCK_POLL_SECONDS)
+    return acquired
+
+def release_booking_locks(lock_ids, owner):
+    """Release booking leases taken by acquire_booking_locks"""
+    if lock_ids:
+        sync_locks_collection.update_many(
+            {'_id': {'$in': lock_ids}, 'owner': owner},
+            {'$set': {'expiresAt': None}}
+        )
+
+def run_in_transaction(callback, room_ids=None):
+    """Run callback(session) in a MongoDB transaction, retrying transient conflicts.
+
+    Without transaction support the callback runs once without a session. When
+    room_ids (room id strings) are given it then runs under those rooms'
+    booking leases and raises RoomBusyError if they stay taken.
+    """
+    global _transactions_supported
+    if client is not None and _transactions_supported is not False:
+        try:
+            with client.start_session() as session:
+                result = session.with_transaction(callback)
+            _transactions_supported = True
+            return result
+        except OperationFailure as e:
+            # IllegalOperation: "Transaction numbers are only allowed on a replica set member or mongos"
+            if e.code != 20:
+                raise
+            _transactions_supported = False
+            print("⚠️ MongoDB transactions unavailable - booking writes fall back to per-room leases")
+    if room_ids is None or sync_locks_collection is None:
+        return callback(None)
+    
+    owner = f'{PROCESS_BOOT_ID}:{threading.get_ident()}'
+    lock_ids = acquire_booking_locks(room_ids, owner)
+    try:
+        return callback(None)
+    finally:
+        release_booking_locks(lock_ids, owner)
+
+def create_booking(room_key, new_interval):
+    """Insert a booking unless it overlaps an existing one of the same room.
+
+    Returns the new booking _id, or None when the dates overlap. The overlap
+    read, the insert and the room's updated_at write commit as one transaction;
+    the room write makes concurrent bookings of the same room conflict, so the
+    loser is retried and then sees the winner's booking. Without transactions
+    the room's booking lease serializes them (see run_in_transaction).
+    """
+    def callback(session):
+        overlapping = bookings_collection.find_one(
+            booking_window_filter(room_key, new_interval['checkIn'], new_interval['checkOut']),
+            {'_id': 1},
+            session=session
+        )
+        if overlapping:
+            return None
+        result = bookings_collection.insert_one({'roomId': room_key, **new_interval}, session=session)
+        record_occupancy([(room_key, new_interval, 1)], session=session)
+        rooms_collection.update_one(
+            {'_id': room_key},
+            {'$set': {'updated_at': datetime.now(timezone.utc)}},
+            session=session
+        )
+        return result.inserted_id
+    
+    return run_in_transaction(callback, room_ids=[str(room_key)])
+
+def touch_room(room_key):
+    """Bump a room's updated_at after one of its bookings changed"""
+    rooms_collection.update_one({'_id': room_key}, {'$set': {'updated_at': datetime.now(timezone.utc)}})
+
+def migrate_embedded_bookings():
+    """Move embedded bookedIntervals arrays into the bookings collection.
+
+    Idempotent: bookings are upserted on (roomId, dates, guest, createdAt) and the
+    embedded array is only removed if it did not change during the copy.
+    Returns (rooms_migrated, bookings_moved).
+    """
+    rooms_migrated = 0
+    bookings_moved = 0
+    for room in rooms_collection.find({'bookedIntervals.0': {'$exists': True}}, {'bookedIntervals': 1}):
+        intervals = room.get('bookedIntervals', [])
+        operations = []
+        for interval in intervals:
+            key = {
+                'roomId': room['_id'],
+                'checkIn': interval.get('checkIn'),
+                'checkOut': interval.get('checkOut'),
+                'guestName': interval.get('guestName'),
+                'createdAt': interval.get('createdAt')
+            }
+            rest = {k: v for k, v in interval.items() if k not in key}
+            operations.append(UpdateOne(key, {'$setOnInsert': rest}, upsert=True))
+        if operations:
+            result = bookings_collection.bulk_write(operations, ordered=False)
+            bookings_moved += result.upserted_count
+        
+        # Only drop the array if nobody appended to it meanwhile. The moved
+        # bookings gain bookingIds, so the room counts as updated.
+        result = rooms_collection.update_one(
+            {'_id': room['_id'], 'bookedIntervals': intervals},
+            {'$unset': {'bookedIntervals': ''}, '$set': {'updated_at': datetime.now(timezone.utc)}}
+        )
+        rooms_migrated += result.modified_count
+    
+    if rooms_migrated:
+        room_catalog_changed()
+    return rooms_migrated, bookings_moved
+
+# ===== Booking Archive =====
+# Bookings that checked out more than BOOKING_ARCHIVE_AFTER_DAYS ago are moved
+# to bookings_archive under the same _id, so live room documents and room lists
+# stop growing with history. Their booked nights stay counted in room_occupancy
+# (past calendar months do not change); history is read back on demand with
+# ?archived=include on the bookings endpoint.
+BOOKING_ARCHIVE_META_ID = 'bookings_archive'
+BOOKING_ARCHIVE_AFTER_DAYS = int(os.getenv('BOOKING_ARCHIVE_AFTER_DAYS', '90'))
+BOOKING_ARCHIVE_BATCH_SIZE = int(os.getenv('BOOKING_ARCHIVE_BATCH_SIZE', '500'))
+BOOKING_ARCHIVE_INTERVAL_HOURS = 24  # Startup runs are skipped within this window
+
+def booking_archive_cutoff(after_days=None):
+    """Check-out date (YYYY-MM-DD) before which bookings are archived"""
+    if after_days is None:
+        after_days = BOOKING_ARCHIVE_AFTER_DAYS
+    return (datetime.now().date() - timedelta(days=after_days)).strftime('%Y-%m-%d')
+
+def archive_past_bookings(after_days=None):
+    """Move bookings that checked out before the archive horizon into bookings_archive.
+
+    Works in batches of BOOKING_ARCHIVE_BATCH_SIZE: each batch is upserted into
+    the archive with one bulk_write and only then deleted from bookings, so an
+    interrupted run is simply repeated. Returns (bookings_archived, rooms_touched).
+    """
+    cutoff = booking_archive_cutoff(after_days)
+    archived = 0
+    room_keys = set()
+    while True:
+        batch = list(
+            bookings_collection.find({'checkOut': {'$lt': cutoff}})
+            .sort('checkOut', 1)
+            .limit(BOOKING_ARCHIVE_BATCH_SIZE)
+        )
+        if not batch:
+            break
+        archived_at = datetime.now(timezone.utc)
+        bookings_archive_collection.bulk_write(
+            [ReplaceOne({'_id': booking['_id']}, {**booking, 'archivedAt': archived_at}, upsert=True)
+             for booking in batch],
+            ordered=False
+        )
+        result = bookings_collection.bulk_write(
+            [DeleteOne({'_id': booking['_id']}) for booking in batch],
+            ordered=False
+        )
+        archived += result.deleted_count
+        room_keys.update(booking['roomId'] for booking in batch)
+    
+    if room_keys:
+        rooms_collection.update_many(
+            {'_id': {'$in': list(room_keys)}},
+            {'$set': {'updated_at': datetime.now(timezone.utc)}}
+        )
+        room_catalog_changed()
+    if meta_collection is not None:
+        meta_collection.update_one(
+            {'_id': BOOKING_ARCHIVE_META_ID},
+            {'$set': {'archived_at': datetime.now(timezone.utc), 'cutoff': cutoff}},
+            upsert=True
+        )
+    return archived, len(room_keys)
+
+def booking_archive_due():
+    """Whether the last archive run is older than BOOKING_ARCHIVE_INTERVAL_HOURS"""
+    last_run = meta_collection.find_one({'_id': BOOKING_ARCHIVE_META_ID}, {'archived_at': 1})
+    if not last_run or not last_run.get('archived_at'):
+        return True
+    archived_at = last_run['archived_at']
+    if archived_at.tzinfo is None:
+        archived_at = archived_at.replace(tzinfo=timezone.utc)
+    return datetime.now(timezone.utc) - archived_at > timedelta(hours=BOOKING_ARCHIVE_INTERVAL_HOURS)
+
+def find_archived_bookings(room_key, start=None, end=None):
+    """Load a room's archived bookings (API format) overlapping an optional date window"""
+    if bookings_archive_collection is None:
+        return []
+    cursor = bookings_archive_collection.find(booking_window_filter(room_key, start, end)).sort('checkIn', 1)
+    return [convert_booking_for_api(booking) for booking in cursor]
+
+def run_booking_maintenance():
+    """Move embedded bookings, archive past ones when due and build occupancy once.
+
+    Run by the cron endpoint and by the local server at startup - never at
+    import, so serverless cold starts don't scan whole collections. Each step
+    is a no-op when there is nothing to do. Returns a summary dict.
+    """
+    summary = {'roomsMigrated': 0, 'bookingsMoved': 0, 'bookingsArchived': 0, 'occupancyBuilt': None}
+    if bookings_collection is None:
+        return summary
+    summary['roomsMigrated'], summary['bookingsMoved'] = migrate_embedded_bookings()
+    if bookings_archive_collection is not None and booking_archive_due():
+        summary['bookingsArchived'], _ = archive_past_bookings()
+    # Counts are maintained incrementally; build them once from the bookings
+    summary['occupancyBuilt'] = ensure_occupancy_built()
+    return summary
+
+def save_fallback_rooms():
+    """Persist the fallback JSON room data to rooms_data.json"""
+    with open(json_file_path, 'wb') as file:
+        file.write(dump_json_bytes(fallback_rooms))
+
+def write_rooms_snapshot():
+    """Write all rooms (with bookings) to rooms_data.json for fallback mode"""
+    rooms_from_db = attach_bookings(list(rooms_collection.find()))
+    with open(json_file_path, 'wb') as file:
+        file.write(dump_json_bytes(rooms_from_db))
+    return len(rooms_from_db)
+
+# ===== Booking Batches =====
+# A batch is a list of create / cancel / update operations across rooms. All
+# rooms and their bookings are read once, every operation is checked in order
+# against that in-memory state (so a batch can't overlap itself), and the
+# accepted changes are written with one bulk_write per collection.
+BOOKING_BATCH_OPERATIONS = ('create', 'cancel', 'update')
+BOOKING_BATCH_MAX_OPERATIONS = int(os.getenv('BOOKING_BATCH_MAX_OPERATIONS', '500'))
+BOOKING_GUEST_FIELDS = ('guestName', 'guestPhone', 'guestEmail', 'notes')
+BOOKING_DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def booking_operation_error(operation):
+    """Validate the shape of one batch operation; returns an error message or None"""
+    if not isinstance(operation, dict):
+        return 'Operation must be an object'
+    if operation.get('op') not in BOOKING_BATCH_OPERATIONS:
+        return f"op must be one of: {', '.join(BOOKING_BATCH_OPERATIONS)}"
+    required = ['roomId', 'checkIn', 'checkOut']
+    if operation['op'] != 'cancel':
+        required.append('guestName')
+    missing = [field for field in required if not operation.get(field)]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    # Dates are compared and matched as strings, so they must be canonical
+    check_in, check_out = operation['checkIn'], operation['checkOut']
+    try:
+        if not (isinstance(check_in, str) and isinstance(check_out, str)
+                and BOOKING_DATE_PATTERN.fullmatch(check_in) and BOOKING_DATE_PATTERN.fullmatch(check_out)):
+            raise ValueError
+        datetime.strptime(check_in, '%Y-%m-%d')
+        datetime.strptime(check_out, '%Y-%m-%d')
+    except ValueError:
+        return 'checkIn and checkOut must be dates in YYYY-MM-DD format'
+    if check_out <= check_in:
+        return 'checkOut must be after checkIn'
+    return None
+
+def plan_booking_batch(operations, rooms, room_bookings):
+    """Check batch operations in order against the rooms' current bookings.
+
+    rooms maps room id strings to documents, room_bookings maps room keys to
+    their bookings (embedded ones flagged with 'embedded'); it is updated as
+    operations are accepted. Returns (results, changes), one result per
+    operation and one change per accepted operation.
+    """
+    results = []
+    changes = []
+    now = datetime.now().isoformat()
+
+    for index, operation in enumerate(operations):
+        result = {'index': index, 'op': operation.get('op') if isinstance(operation, dict) else None}
+        results.append(result)
+
+        error = booking_operation_error(operation)
+        if error:
+            result.update({'success': False, 'status': 400, 'error': error})
+            continue
+
+        room_id = str(operation['roomId'])
+        result['roomId'] = room_id
+        room = rooms.get(room_id)
+        if room is None:
+            result.update({'success': False, 'status': 404, 'error': 'Room not found'})
+            continue
+
+        room_key = room['_id']
+        check_in = operation['checkIn']
+        check_out = operation['checkOut']
+        bookings = room_bookings.setdefault(room_key, [])
+        matches = [b for b in bookings if b.get('checkIn') == check_in and b.get('checkOut') == check_out]
+
+        if operation['op'] == 'create':
+            # Same rule as book_room: exact duplicates and overlapping dates are rejected
+            if any(b.get('checkIn', '') and b.get('checkOut', '') and
+                   check_in < b['checkOut'] and check_out > b['checkIn'] for b in bookings) or \
+                    any(b.get('guestName') == operation['guestName'] for b in matches):
+                result.update({
+                    'success': False,
+                    'status': 409,
+                    'error': 'Booking already exists or dates overlap with existing booking'
+                })
+                continue
+            booking = {
+                'checkIn': check_in,
+                'checkOut': check_out,
+                'guestName': operation['guestName'],
+                'guestPhone': operation.get('guestPhone', ''),
+                'guestEmail': operation.get('guestEmail', ''),
+                'notes': operation.get('notes', ''),
+                'createdAt': now
+            }
+            bookings.append(booking)
+            changes.append({'op': 'create', 'room': room, 'booking': booking, 'result': result})
+        elif not matches:
+            result.update({'success': False, 'status': 404, 'error': 'Booking not found'})
+            continue
+        elif operation['op'] == 'cancel':
+            room_bookings[room_key] = [b for b in bookings if b not in matches]
+            changes.append({
+                'op': 'cancel', 'room': room, 'checkIn': check_in, 'checkOut': check_out,
+                'count': len(matches),
+                'embedded': any(b.get('embedded') for b in matches),
+                'stored': any(not b.get('embedded') for b in matches),
+                'result': result
+            })
+        else:
+            # Like update_booking, only the first booking with these dates is changed
+            fields = {field: operation.get(field, '') for field in BOOKING_GUEST_FIELDS}
+            matches[0].update(fields)
+            changes.append({
+                'op': 'update', 'room': room, 'checkIn': check_in, 'checkOut': check_out,
+                'fields': fields, 'embedded': bool(matches[0].get('embedded')),
+                'result': result
+            })
+        result.update({'success': True, 'status': 200})
+
+    return results, changes
+
+def booking_batch_writes(changes):
+    """Turn planned batch changes into (bookings operations, rooms operations) for bulk_write"""
+    booking_ops = []
+    room_ops = []
+    now = datetime.now()
+
+    for change in changes:
+        room_key = change['room']['_id']
+        if change['op'] == 'create':
+            booking_id = ObjectId()
+            booking_ops.append(InsertOne({'_id': booking_id, 'roomId': room_key, **change['booking']}))
+            change['result']['bookingId'] = str(booking_id)
+            continue
+
+        dates = {'checkIn': change['checkIn'], 'checkOut': change['checkOut']}
+        if change['op'] == 'cancel':
+            if change['stored']:
+                booking_ops.append(DeleteMany({'roomId': room_key, **dates}))
+            if change['embedded']:
+                room_ops.append(UpdateOne({'_id': room_key}, {'$pull': {'bookedIntervals': dates}}))
+        elif change['embedded']:
+            room_ops.append(UpdateOne(
+                # Both dates must match the same element for $ to point at it
+                {'_id': room_key, 'bookedIntervals': {'$elemMatch': dates}},
+                {'$set': {
+                    **{f'bookedIntervals.$.{field}': value for field, value in change['fields'].items()},
+                    'bookedIntervals.$.updatedAt': now
+                }}
+            ))
+        else:
+            booking_ops.append(UpdateOne({'roomId': room_key, **dates}, {'$set': {**change['fields'], 'updatedAt': now}}))
+
+    # Touching every changed room also makes concurrent bookings of those rooms
+    # conflict with this batch's transaction
+    room_keys = list({change['room']['_id']: True for change in changes})
+    if room_keys:
+        room_ops.append(UpdateMany({'_id': {'$in': room_keys}}, {'$set': {'updated_at': datetime.now(timezone.utc)}}))
+    return booking_ops, room_ops
+
+def apply_booking_batch(operations, atomic=False):
+    """Validate and apply a batch of booking operations.
+
+    Returns (results, changed_room_keys); no keys means nothing was written.
+    With atomic=True nothing is written unless every operation is valid. In MongoDB mode the reads and writes run in one
+    transaction where the deployment supports it.
+    """
+    room_ids = [str(op['roomId']) for op in operations if isinstance(op, dict) and op.get('roomId')]
+
+    if rooms_collection is None:
+        rooms = resolve_rooms(room_ids)
+        # Work on copies so a rejected atomic batch leaves the data untouched
+        planned = {room['_id']: [dict(b) for b in room.get('bookedIntervals') or []] for room in rooms.values()}
+        results, changes = plan_booking_batch(operations, rooms, planned)
+        if not changes or (atomic and len(changes) < len(operations)):
+            return results, []
+        changed_rooms = list({change['room']['_id']: change['room'] for change in changes}.values())
+        now = datetime.now().isoformat()
+        for room in changed_rooms:
+            room['bookedIntervals'] = planned[room['_id']]
+            room['updated_at'] = now
+        save_fallback_rooms()
+        return results, [room['_id'] for room in changed_rooms]
+
+    def callback(session):
+        rooms = resolve_rooms(room_ids, {'bookedIntervals': 1}, session=session)
+        room_bookings = {}
+        for room in rooms.values():
+            room_bookings[room['_id']] = [{**b, 'embedded': True} for b in room.get('bookedIntervals') or []]
+        if rooms:
+            cursor = bookings_collection.find(
+                {'roomId': {'$in': list(room_bookings)}},
+                {'roomId': 1, 'checkIn': 1, 'checkOut': 1, 'guestName': 1},
+                session=session
+            )
+            for booking in cursor:
+                room_bookings[booking['roomId']].append(booking)
+
+        results, changes = plan_booking_batch(operations, rooms, room_bookings)
+        if not changes or (atomic and len(changes) < len(operations)):
+            return results, []
+
+        booking_ops, room_ops = booking_batch_writes(changes)
+        if booking_ops:
+            bookings_collection.bulk_write(booking_ops, ordered=True, session=session)
+        rooms_collection.bulk_write(room_ops, ordered=True, session=session)
+        record_occupancy([
+            (change['room']['_id'], change['booking'], 1) if change['op'] == 'create'
+            else (change['room']['_id'], change, -change['count'])
+            for change in changes if change['op'] != 'update'
+        ], session=session)
+        return results, list({change['room']['_id']: True for change in changes})
+
+    return run_in_transaction(callback, room_ids=room_ids)
+
+# ===== Room Catalog Cache =====
+# The converted room list is kept in memory and shared by all requests of this
+# worker, one variant per requested field set. The rooms_catalog version in
+# app_meta is bumped by every room mutation so other workers notice the change;
+# it is re-read at most once per ROOM_CATALOG_VERSION_CHECK_SECONDS.
+ROOM_CATALOG_VERSION_CHECK_SECONDS = float(os.getenv('ROOM_CATALOG_VERSION_CHECK_SECONDS', '2'))
+ROOM_CATALOG_MAX_VARIANTS = 16
+
+_room_catalog_lock = threading.Lock()
+# stamps: room id string -> room_stamp() of the document the variants were built from
+_room_catalog = {'version': None, 'variants': {}, 'stamps': {}, 'checked_at': 0.0}
+
+def room_stamp(room):
+    """Identify a version of a room document (changes whenever its API shape can)"""
+    return f"{room.get('_id')}|{room.get('updated_at')}|{room.get('lastIcalSync')}"
+
+def load_room_documents(projection=None):
+    """Load every room document from MongoDB or the fallback JSON data"""
+    if rooms_collection is None:
+        return list(fallback_rooms)
+    rooms = list(rooms_collection.find({}, projection))
+    if projection is None or 'bookedIntervals' in projection:
+        attach_bookings(rooms)
+    return rooms
+
+def peek_catalog_version():
+    """Get the room catalog version without building the catalog.
+
+    Answers from the cache while it is fresh, otherwise reads app_meta and marks
+    the cache fresh again if it is still on that version.
+    """
+    now = time.monotonic()
+    with _room_catalog_lock:
+        if _room_catalog['version'] is not None and now - _room_catalog['checked_at'] < ROOM_CATALOG_VERSION_CHECK_SECONDS:
+            return _room_catalog['version']
+    
+    version = get_meta_version(ROOM_CATALOG_META_ID)
+    with _room_catalog_lock:
+        if _room_catalog['version'] != version:
+            # Another writer moved the catalog - every cached variant is stale
+            _room_catalog.update(version=version, variants={}, stamps={})
+        _room_catalog['checked_at'] = now
+    return version
+
+def get_cached_room_catalog(fields=None):
+    """Return (version, api_rooms) for a field set, building the variant when missing"""
+    version = peek_catalog_version()
+    with _room_catalog_lock:
+        api_rooms = _room_catalog['variants'].get(fields)
+        if api_rooms is not None and _room_catalog['version'] == version:
+            return version, api_rooms
+    
+    # Build the variant with only the fields it needs pulled from MongoDB.
+    # The version is read before the scan, so a concurrent write can only make
+    # the cache look older than it is and trigger another reload.
+    projection = room_projection(fields)
+    if projection is not None:
+        projection.update(updated_at=1, lastIcalSync=1)  # For room_stamp()
+    rooms = load_room_documents(projection)
+    api_rooms = [convert_room_for_api(room, fields) for room in rooms]
+    with _room_catalog_lock:
+        if _room_catalog['version'] == version:
+            variants = _room_catalog['variants']
+            if fields not in variants and len(variants) >= ROOM_CATALOG_MAX_VARIANTS:
+                variants.pop(next(iter(variants)))
+            variants[fields] = api_rooms
+            _room_catalog['stamps'].update((str(room.get('_id')), room_stamp(room)) for room in rooms)
+    return version, api_rooms
+
+def get_room_stamps():
+    """Current room id -> stamp map of the cached catalog (do not modify)"""
+    with _room_catalog_lock:
+        return _room_catalog['stamps']
+
+def find_room_document(room_key):
+    """Find a room by its stored _id value (no string/ObjectId probing)"""
+    if rooms_collection is None:
+        return next((r for r in fallback_rooms if r.get('_id') == room_key), None)
+    room = rooms_collection.find_one({'_id': room_key})
+    if room is not None:
+        attach_bookings([room])
+    return room
+
+def room_catalog_changed(room_key=None, deleted=False):
+    """Record a room mutation: bump the catalog version and patch the cached list.
+
+    room_key is the stored _id of the changed room. The cached list is patched in
+    place only when no other writer bumped the version since it was built;
+    otherwise (or without a room_key) it is dropped and rebuilt on next read.
+    """
+    new_version = bump_meta_version_safely(ROOM_CATALOG_META_ID)
+    if room_key is None:
+        publish_event('rooms.changed')
+    else:
+        publish_event('room.deleted' if deleted else 'room.updated', roomId=str(room_key))
+    
+    room = None
+    if room_key is not None and not deleted and new_version is not None:
+        try:
+            room = find_room_document(room_key)
+        except Exception as e:
+            print(f"⚠️ Could not reload room {room_key} for cache: {e}")
+            new_version = None
+    
+    with _room_catalog_lock:
+        if (new_version is None or room_key is None
+                or _room_catalog['version'] != new_version - 1):
+            _room_catalog.update(version=None, variants={}, stamps={}, checked_at=0.0)
+            return
+        
+        room_id_str = str(room_key)
+        stamps = dict(_room_catalog['stamps'])
+        if room is not None:
+            stamps[room_id_str] = room_stamp(room)
+        else:
+            stamps.pop(room_id_str, None)
+        _room_catalog['stamps'] = stamps
+        for fields, cached_rooms in list(_room_catalog['variants'].items()):
+            patched = [r for r in cached_rooms if r.get('id') != room_id_str]
+            if room is not None:
+                api_room = convert_room_for_api(room, fields)
+                # Keep the room in its original position when it already existed
+                index = next((i for i, r in enumerate(cached_rooms) if r.get('id') == room_id_str), None)
+                if index is None:
+                    patched.append(api_room)
+                else:
+                    patched.insert(index, api_room)
+            _room_catalog['variants'][fields] = patched
+        _room_catalog.update(version=new_version, checked_at=time.monotonic())
+
+# ===== Room Response Fragments =====
+# Serialized JSON for each room, keyed by field set and room_stamp(), so list
+# and single-room responses are assembled from ready bytes instead of encoding
+# every room per request. A stamp changes with the room's updated_at, so stale
+# fragments are never looked up again and age out of the LRU.
+ROOM_FRAGMENT_CACHE_SIZE = int(os.getenv('ROOM_FRAGMENT_CACHE_SIZE', '2048'))
+
+_room_fragment_lock = threading.Lock()
+_room_fragments = OrderedDict()  # (fields, stamp) -> JSON bytes, least recently used first
+_room_fragment_stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+
+def room_fragments(api_rooms, fields=None):
+    """Serialized JSON bytes for each API room, from the fragment cache where possible"""
+    stamps = get_room_stamps()
+    keys = [(fields, stamps.get(api_room.get('id'))) for api_room in api_rooms]
+    fragments = [None] * len(api_rooms)
+    with _room_fragment_lock:
+        for index, key in enumerate(keys):
+            if key[1] is not None:
+                fragment = _room_fragments.get(key)
+                if fragment is not None:
+                    _room_fragments.move_to_end(key)
+                    fragments[index] = fragment
+        hits = sum(1 for fragment in fragments if fragment is not None)
+        _room_fragment_stats['hits'] += hits
+        _room_fragment_stats['misses'] += len(fragments) - hits
+    
+    missed = [index for index, fragment in enumerate(fragments) if fragment is None]
+    for index in missed:
+        fragments[index] = dump_json_bytes(api_rooms[index])
+    
+    if missed:
+        with _room_fragment_lock:
+            for index in missed:
+                if keys[index][1] is not None:
+                    _room_fragments[keys[index]] = fragments[index]
+            trim_room_fragments()
+    return fragments
+
+def room_fragment(stamp, render, fields=None):
+    """Serialized JSON of one room version; render() -> API room runs only on a miss"""
+    key = (fields, stamp)
+    with _room_fragment_lock:
+        fragment = _room_fragments.get(key)
+        if fragment is not None:
+            _room_fragments.move_to_end(key)
+            _room_fragment_stats['hits'] += 1
+            return fragment
+        _room_fragment_stats['misses'] += 1
+    
+    fragment = dump_json_bytes(render())
+    with _room_fragment_lock:
+        _room_fragments[key] = fragment
+        trim_room_fragments()
+    return fragment
+
+def trim_room_fragments():
+    """Evict least recently used fragments over the size limit (hold _room_fragment_lock)"""
+    while len(_room_fragments) > ROOM_FRAGMENT_CACHE_SIZE:
+        _room_fragments.popitem(last=False)
+        _room_fragment_stats['evictions'] += 1
+
+def room_fragment_stats():
+    """Hit/miss/eviction counters and current size of the fragment cache"""
+    with _room_fragment_lock:
+        stats = dict(_room_fragment_stats, size=len(_room_fragments), maxSize=ROOM_FRAGMENT_CACHE_SIZE)
+    lookups = stats['hits'] + stats['misses']
+    stats['hitRate'] = round(stats['hits'] / lookups, 4) if lookups else None
+    return stats
+
+def json_envelope_response(data_bytes, **fields):
+    """Response for {"success": true, "data": <data_bytes>, **fields} without re-encoding data"""
+    body = b'{"success":true,"data":' + data_bytes
+    if fields:
+        body += b',' + dump_json_bytes(fields)[1:]
+    else:
+        body += b'}'
+    return app.response_class(body, mimetype='application/json')
+
+# ===== Room Listing Queries =====
+# Server-side filtering, sorting and keyset pagination for the room list.
+# Sorts always tie-break on _id so every page boundary is a unique position.
+ROOM_LIST_DEFAULT_LIMIT = 50
+ROOM_LIST_MAX_LIMIT = 200
+
+# Sort name (same values as the dashboard sort select) -> (MongoDB field, direction)
+ROOM_LIST_SORTS = {
+    'room_id': ('_id', 1),
+    'name': ('name', 1),
+    'price_asc': ('price', 1),
+    'price_desc': ('price', -1),
+    'capacity_asc': ('persons', 1),
+    'capacity_desc': ('persons', -1)
+}
+
+ROOM_LIST_QUERY_PARAMS = ('minCapacity', 'maxCapacity', 'minPrice', 'maxPrice',
+                          'promotion', 'sort', 'limit', 'cursor')
+
+def is_room_list_query(args):
+    """Check whether a room list request asks for filtering, sorting or paging"""
+    return any(param in args for param in ROOM_LIST_QUERY_PARAMS)
+
+def parse_room_list_query(args):
+    """Parse filter/sort/paging params. Raises ValueError on invalid input."""
+    query = {
+        'filters': {},
+        'sort': args.get('sort', 'room_id'),
+        'limit': ROOM_LIST_DEFAULT_LIMIT,
+        'cursor': None
+    }
+    if query['sort'] not in ROOM_LIST_SORTS:
+        raise ValueError(f"Invalid sort. Use one of: {', '.join(ROOM_LIST_SORTS)}")
+    
+    for param, cast in (('minCapacity', int), ('maxCapacity', int), ('minPrice', float), ('maxPrice', float)):
+        if args.get(param):
+            try:
+                query['filters'][param] = cast(args[param])
+            except ValueError:
+                raise ValueError(f'{param} must be a number')
+    
+    promotion = args.get('promotion')
+    if promotion:
+        if promotion not in ('active', 'inactive'):
+            raise ValueError('promotion must be active or inactive')
+        query['filters']['promotion'] = promotion
+    
+    if args.get('limit'):
+        try:
+            query['limit'] = int(args['limit'])
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if query['limit'] < 1:
+            raise ValueError('limit must be at least 1')
+        query['limit'] = min(query['limit'], ROOM_LIST_MAX_LIMIT)
+    
+    if args.get('cursor'):
+        query['cursor'] = decode_room_cursor(args['cursor'], query['sort'])
+    return query
+
+def encode_room_cursor(sort, room):
+    """Build the opaque cursor pointing just after the given room document"""
+    field, _ = ROOM_LIST_SORTS[sort]
+    room_key = room.get('_id')
+    payload = {
+        's': sort,
+        'v': None if field == '_id' else room.get(field),
+        'id': str(room_key),
+        'oid': isinstance(room_key, ObjectId)
+    }
+    raw = json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_room_cursor(token, sort):
+    """Decode a cursor token into (sort value, room _id). Raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        room_key = ObjectId(payload['id']) if payload.get('oid') else payload['id']
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if payload.get('s') != sort:
+        raise ValueError('Cursor was issued for a different sort order')
+    return payload.get('v'), room_key
+
+def room_id_after_filter(room_key, direction):
+    """MongoDB condition for _ids strictly after room_key in sort direction.
+
+    Rooms may carry string or ObjectId _ids. MongoDB sorts every string before
+    every ObjectId but range operators only compare within one type, so the
+    other type is added explicitly.
+    """
+    if direction == 1:
+        if isinstance(room_key, ObjectId):
+            return {'_id': {'$gt': room_key}}
+        return {'$or': [{'_id': {'$gt': room_key}}, {'_id': {'$type': 'objectId'}}]}
+    if isinstance(room_key, ObjectId):
+        return {'$or': [{'_id': {'$lt': room_key}}, {'_id': {'$type': 'string'}}]}
+    return {'_id': {'$lt': room_key}}
+
+def build_room_list_filter(query):
+    """Translate parsed filters and cursor into a MongoDB filter document"""
+    filters = query['filters']
+    conditions = []
+    
+    persons = {}
+    if 'minCapacity' in filters:
+        persons['$gte'] = filters['minCapacity']
+    if 'maxCapacity' in filters:
+        persons['$lte'] = filters['maxCapacity']
+    if persons:
+        conditions.append({'persons': persons})
+    
+    price = {}
+    if 'minPrice' in filters:
+        price['$gte'] = filters['minPrice']
+    if 'maxPrice' in filters:
+        price['$lte'] = filters['maxPrice']
+    if price:
+        conditions.append({'price': price})
+    
+    if filters.get('promotion') == 'active':
+        conditions.append({'promotion.active': True})
+    elif filters.get('promotion') == 'inactive':
+        conditions.append({'promotion.active': {'$ne': True}})
+    
+    if query['cursor'] is not None:
+        field, direction = ROOM_LIST_SORTS[query['sort']]
+        value, room_key = query['cursor']
+        if field == '_id':
+            conditions.append(room_id_after_filter(room_key, direction))
+        else:
+            op = '$gt' if direction == 1 else '$lt'
+            conditions.append({'$or': [
+                {field: {op: value}},
+                {'$and': [{field: value}, room_id_after_filter(room_key, direction)]}
+            ]})
+    
+    if not conditions:
+        return {}
+    return conditions[0] if len(conditions) == 1 else {'$and': conditions}
+
+def room_sort_key(room, field):
+    """Python equivalent of the MongoDB (field, _id) sort order for fallback data"""
+    room_key = room.get('_id')
+    id_key = (1 if isinstance(room_key, ObjectId) else 0, str(room_key))
+    if field == '_id':
+        return id_key
+    return (room.get(field) if room.get(field) is not None else 0, id_key)
+
+def room_matches_filters(room, filters):
+    """Python equivalent of build_room_list_filter (without cursor) for fallback data"""
+    persons = room.get('persons', 0)
+    price = room.get('price', 0)
+    if 'minCapacity' in filters and persons < filters['minCapacity']:
+        return False
+    if 'maxCapacity' in filters and persons > filters['maxCapacity']:
+        return False
+    if 'minPrice' in filters and price < filters['minPrice']:
+        return False
+    if 'maxPrice' in filters and price > filters['maxPrice']:
+        return False
+    promotion_active = bool((room.get('promotion') or {}).get('active'))
+    if filters.get('promotion') == 'active' and not promotion_active:
+        return False
+    if filters.get('promotion') == 'inactive' and promotion_active:
+        return False
+    return True
+
+def query_room_page(query, fields=None):
+    """Run a filtered, sorted, keyset-paginated room query.
+
+    Returns (api_rooms, next_cursor); next_cursor is None on the last page.
+    """
+    field, direction = ROOM_LIST_SORTS[query['sort']]
+    limit = query['limit']
+    
+    if rooms_collection is None:
+        rooms = [r for r in fallback_rooms if room_matches_filters(r, query['filters'])]
+        rooms.sort(key=lambda r: room_sort_key(r, field), reverse=direction == -1)
+        if query['cursor'] is not None:
+            value, room_key = query['cursor']
+            cursor_room = {'_id': room_key} if field == '_id' else {'_id': room_key, field: value}
+            cursor_key = room_sort_key(cursor_room, field)
+            if direction == 1:
+                rooms = [r for r in rooms if room_sort_key(r, field) > cursor_key]
+            else:
+                rooms = [r for r in rooms if room_sort_key(r, field) < cursor_key]
+        page = rooms[:limit + 1]
+    else:
+        projection = room_projection(fields)
+        if projection is not None and field != '_id':
+            projection[field] = 1  # Needed to build the next cursor
+        sort_spec = [(field, direction)] if field == '_id' else [(field, direction), ('_id', direction)]
+        # Fetch one extra document to know whether another page exists
+        page = list(rooms_collection.find(build_room_list_filter(query), projection)
+                    .sort(sort_spec).limit(limit + 1))
+        if projection is None or 'bookedIntervals' in projection:
+            attach_bookings(page)
+    
+    next_cursor = None
+    if len(page) > limit:
+        page = page[:limit]
+        next_cursor = encode_room_cursor(query['sort'], page[-1])
+    return [convert_room_for_api(room, fields) for room in page], next_cursor
+
+# ===== Room Delta Sync =====
+# GET /rooms?since=<token> returns only rooms whose updated_at moved past the
+# token's time, plus ids of rooms deleted since then (kept as tombstones for
+# ROOM_TOMBSTONE_RETENTION_DAYS). A token also records the catalog version, so
+# a client that is already current is answered without querying. Tokens reach
+# ROOM_DELTA_OVERLAP_SECONDS back to cover writes that commit slightly late;
+# clients replace rooms by id, so re-sent rooms are harmless.
+ROOM_TOMBSTONE_RETENTION_DAYS = int(os.getenv('ROOM_TOMBSTONE_RETENTION_DAYS', '30'))
+ROOM_DELTA_OVERLAP_SECONDS = 5
+
+_fallback_tombstones = {}  # room id string -> deleted_at, fallback JSON mode only
+
+def encode_sync_token(synced_at, version):
+    """Build the opaque delta sync token for a point in time and catalog version"""
+    payload = {'t': synced_at.isoformat(), 'v': version_etag('rooms', version)}
+    raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def new_sync_token(version):
+    """Sync token for a response built now from the given catalog version"""
+    synced_at = datetime.now(timezone.utc) - timedelta(seconds=ROOM_DELTA_OVERLAP_SECONDS)
+    return encode_sync_token(synced_at, version)
+
+def decode_sync_token(token):
+    """Decode a sync token (or a plain ISO timestamp) into (since, version etag). Raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        payload = json.loads(raw.decode('utf-8'))
+        since = parse_timestamp(payload['t'])
+        version = payload.get('v')
+    except Exception:
+        since = parse_timestamp(token)
+        version = None
+    if since is None:
+        raise ValueError('Invalid since token')
+    return since, version
+
+def record_room_tombstone(room_key):
+    """Remember that a room was deleted so delta sync can report it"""
+    deleted_at = datetime.now(timezone.utc)
+    if tombstones_collection is None:
+        _fallback_tombstones[str(room_key)] = deleted_at
+        return
+    tombstones_collection.replace_one(
+        {'_id': str(room_key)},
+        {'_id': str(room_key), 'deleted_at': deleted_at},
+        upsert=True
+    )
+
+def clear_room_tombstone(room_key):
+    """Forget a tombstone when a room id is used again"""
+    if tombstones_collection is None:
+        _fallback_tombstones.pop(str(room_key), None)
+        return
+    tombstones_collection.delete_one({'_id': str(room_key)})
+
+def query_room_changes(since, fields=None):
+    """Return (api_rooms changed since, ids of rooms deleted since) for a UTC datetime"""
+    if rooms_collection is None:
+        never = datetime.min.replace(tzinfo=timezone.utc)
+        changed = [
+            convert_room_for_api(room, fields) for room in fallback_rooms
+            if (parse_timestamp(room.get('updated_at')) or never) >= since
+        ]
+        deleted = [room_id for room_id, deleted_at in _fallback_tombstones.items() if deleted_at >= since]
+    else:
+        projection = room_projection(fields)
+        rooms = list(rooms_collection.find({'updated_at': {'$gte': since}}, projection))
+        if projection is None or 'bookedIntervals' in projection:
+            attach_bookings(rooms)
+        changed = [convert_room_for_api(room, fields) for room in rooms]
+        deleted = [
+            doc['_id'] for doc in tombstones_collection.find(
+                {'deleted_at': {'$gte': since}}, {'_id': 1}
+            )
+        ]
+    
+    # A room deleted and then re-created is reported as changed, not deleted
+    changed_ids = {room.get('id') for room in changed}
+    return changed, [room_id for room_id in deleted if room_id not in changed_ids]
+
+# ===== Availability Index =====
+# Per-room interval index over bookedIntervals, rebuilt only when the room
+# catalog version moves. Bookings are half-open [checkIn, checkOut) ranges of
+# YYYY-MM-DD strings, which compare correctly as plain strings. Each room keeps
+# its check-in dates sorted plus a running maximum of check-out dates, so an
+# overlap test is one binary search instead of a walk over every booked day.
+AVAILABILITY_FIELDS = ROOM_SUMMARY_FIELDS | {'bookedIntervals'}
+
+_availability_lock = threading.Lock()
+_availability_index = {'version': None, 'rooms': []}
+
+def build_interval_index(intervals):
+    """Build (sorted check-ins, running max check-out) for a room's bookings"""
+    spans = sorted(
+        (interval.get('checkIn'), interval.get('checkOut'))
+        for interval in intervals or []
+        if interval.get('checkIn') and interval.get('checkOut')
+    )
+    starts = []
+    max_ends = []
+    running_max = ''
+    for start, end in spans:
+        starts.append(start)
+        running_max = max(running_max, end)
+        max_ends.append(running_max)
+    return starts, max_ends
+
+def interval_index_overlaps(index, check_in, check_out):
+    """Check whether any booking overlaps [check_in, check_out)"""
+    starts, max_ends = index
+    # Bookings starting before check_out are the only candidates; among them
+    # one overlaps iff the latest check-out is after check_in
+    candidates = bisect.bisect_left(starts, check_out)
+    return candidates > 0 and max_ends[candidates - 1] > check_in
+
+def get_availability_index():
+    """Return [(api_room, interval_index)] for the current catalog version"""
+    version, api_rooms = get_cached_room_catalog(AVAILABILITY_FIELDS)
+    with _availability_lock:
+        if _availability_index['version'] == version:
+            return _availability_index['rooms']
+    
+    indexed = []
+    for api_room in api_rooms:
+        summary = {key: value for key, value in api_room.items() if key != 'bookedIntervals'}
+        indexed.append((summary, build_interval_index(api_room.get('bookedIntervals'))))
+    with _availability_lock:
+        _availability_index.update(version=version, rooms=indexed)
+    return indexed
+
+# ===== Conditional GET Helpers =====
+def version_etag(kind, version):
+    """Build an ETag value for a versioned dataset"""
+    if meta_collection is None:
+        # Local counters restart at 0, so scope them to this process
+        return f'{kind}-{PROCESS_BOOT_ID}-{version}'
+    return f'{kind}-{version}'
+
+def parse_timestamp(value):
+    """Parse a stored timestamp (datetime or ISO string) as an aware UTC datetime"""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)  # Naive timestamps are written in UTC
+    return parsed.astimezone(timezone.utc)
+
+def request_is_fresh(etag, last_modified=None):
+    """Check the request's If-None-Match / If-Modified-Since against the current state"""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def with_validators(response, etag, last_modified=None, private=False):
+    """Attach ETag / Last-Modified and a revalidate-always Cache-Control"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # no-cache lets browsers keep the body but revalidate it on every fetch
+    response.headers['Cache-Control'] = 'private, no-cache' if private else 'no-cache'
+    return response
+
+def not_modified_response(etag, last_modified=None, private=False):
+    """Empty 304 response carrying the current validators"""
+    return with_validators(app.response_class(status=304), etag, last_modified, private)
+
+# ===== Outbound HTTP =====
+# Upstream calls (iCal feeds) share one requests.Session: connections are
+# pooled and kept alive per host, and connection errors, read timeouts and
+# 429/5xx answers are retried with jittered exponential backoff.
+HTTP_USER_AGENT = 'KhietAnHomestay-Calendar-Sync/1.0'
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '15'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '2'))
+HTTP_RETRY_BACKOFF = float(os.getenv('HTTP_RETRY_BACKOFF', '0.5'))  # Seconds before the 2nd retry, doubling after
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '10'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '10'))  # Kept-alive connections per host
+HTTP_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+def get_http_session():
+    """Shared requests.Session for outbound calls (created on first use)"""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                
+                class JitteredRetry(Retry):
+                    """Retry whose backoff is randomized between half and all of the
+                    exponential delay, so concurrent retries do not line up"""
+                    def get_backoff_time(self):
+                        backoff = super().get_backoff_time()
+                        return backoff / 2 + random.uniform(0, backoff / 2) if backoff else 0
+                
+                retry = JitteredRetry(
+                    total=HTTP_RETRIES,
+                    backoff_factor=HTTP_RETRY_BACKOFF,
+                    status_forcelist=HTTP_RETRY_STATUSES,
+                    allowed_methods=frozenset(['GET', 'HEAD']),
+                    raise_on_status=False  # The last answer is returned and raise_for_status reports it
+                )
+                adapter = HTTPAdapter(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, max_retries=retry)
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['User-Agent'] = HTTP_USER_AGENT
+                _http_session = session
+    return _http_session
+
+def http_get(url, **kwargs):
+    """GET through the shared session with the configured connect/read timeouts"""
+    kwargs.setdefault('timeout', (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_http_session().get(url, **kwargs)
+
+# ===== iCal Feed Sync =====
+# Feeds of all rooms are fetched and parsed on a bounded thread pool, at most
+# ICAL_SYNC_MAX_PER_HOST at a time against one host (Airbnb serves them all),
+# and each download is cut off after ICAL_FETCH_TIMEOUT seconds in total, so a
+# sync-all takes about as long as its slowest feed instead of their sum.
+# Fetches go through the shared session (see Outbound HTTP).
+# Each room remembers its feed's ETag, Last-Modified and content hash in
+# room['icalFeed']; requests are conditional and a 304 skips parsing and
+# duplicate checks entirely. Bodies are parsed line by line as they download
+# (never buffered whole) and hashed on the way, so an identical body is only
+# recognized at its end; its diff is then dropped and nothing is written.
+ICAL_FETCH_TIMEOUT = float(os.getenv('ICAL_FETCH_TIMEOUT', '20'))
+ICAL_SYNC_MAX_WORKERS = int(os.getenv('ICAL_SYNC_MAX_WORKERS', '8'))
+ICAL_SYNC_MAX_PER_HOST = int(os.getenv('ICAL_SYNC_MAX_PER_HOST', '4'))
+
+_ical_host_limits_lock = threading.Lock()
+_ical_host_limits = {}  # host -> BoundedSemaphore(ICAL_SYNC_MAX_PER_HOST)
+
+def ical_host_limit(url):
+    """Semaphore bounding concurrent fetches against the URL's host"""
+    host = urlsplit(url).hostname or ''
+    with _ical_host_limits_lock:
+        limit = _ical_host_limits.get(host)
+        if limit is None:
+            limit = _ical_host_limits[host] = threading.BoundedSemaphore(ICAL_SYNC_MAX_PER_HOST)
+    return limit
+
+def iter_response_lines(response, deadline, digest):
+    """Yield a streamed response's raw lines as they arrive, hashing every chunk into digest.
+
+    Raises requests.exceptions.Timeout once time.monotonic() passes deadline.
+    """
+    pending = b''
+    for chunk in response.iter_content(chunk_size=65536):
+        if time.monotonic() > deadline:
+            raise requests.exceptions.Timeout('iCal feed took too long to download')
+        digest.update(chunk)
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+    if pending:
+        yield pending
+
+def fetch_ical_feed(url, process, timeout=None, etag=None, last_modified=None):
+    """Stream an iCal feed through process(lines), failing once timeout seconds have passed in total.
+
+    process receives the body's raw byte lines while they are downloaded, so
+    the feed is never held in memory whole. etag / last_modified make the
+    request conditional. Returns (result, response_etag, response_last_modified,
+    sha256 hex of the body); result and hash are None when the server answered
+    304 Not Modified. Raises requests.exceptions.RequestException (Timeout when
+    the deadline passes) and whatever process raises.
+    """
+    if timeout is None:
+        timeout = ICAL_FETCH_TIMEOUT
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    with ical_host_limit(url):
+        deadline = time.monotonic() + timeout
+        with http_get(url, stream=True, headers=headers) as response:
+            if response.status_code == 304:
+                return (None, response.headers.get('ETag') or etag,
+                        response.headers.get('Last-Modified') or last_modified, None)
+            response.raise_for_status()
+            digest = hashlib.sha256()
+            lines = iter_response_lines(response, deadline, digest)
+            result = process(lines)
+            for _ in lines:
+                pass  # The hash covers the whole body even if process stopped early
+            return result, response.headers.get('ETag'), response.headers.get('Last-Modified'), digest.hexdigest()
+
+def fetch_changed_ical_feed(room, process, force=False):
+    """Stream a room's iCal feed through process(lines) unless it is unchanged since the last sync.
+
+    Returns (result, feed_state): result is None when the server answered 304
+    or sent the same bytes as last time (compared by hash once the body is
+    read; the result process computed is then discarded). feed_state is the
+    room['icalFeed'] value to store once the result has been applied.
+    """
+    url = room['icalUrl']
+    stored = room.get('icalFeed') or {}
+    if force or stored.get('url') != url:
+        stored = {}
+    
+    result, etag, last_modified, content_hash = fetch_ical_feed(
+        url, process, etag=stored.get('etag'), last_modified=stored.get('lastModified'))
+    feed_state = {'url': url, 'etag': etag, 'lastModified': last_modified, 'hash': content_hash or stored.get('hash')}
+    if content_hash is None or content_hash == stored.get('hash'):
+        return None, feed_state
+    return result, feed_state
+
+ICAL_EVENT_PROPERTIES = (b'DTSTART', b'DTEND', b'UID', b'SUMMARY')
+ICAL_TEXT_ESCAPES = {'\\\\': '\\', '\\;': ';', '\\,': ',', '\\n': '\n', '\\N': '\n'}
+
+def unescape_ical_text(value):
+    """Undo RFC 5545 TEXT escaping of backslashes, semicolons, commas and newlines"""
+    if '\\' not in value:
+        return value
+    return re.sub(r'\\[\\;,nN]', lambda match: ICAL_TEXT_ESCAPES[match.group(0)], value)
+
+def iter_ical_events(lines):
+    """Stream the VEVENTs of an iCal feed as small dicts, one event at a time.
+
+    lines is any iterable of raw byte lines (a BytesIO, a streamed response).
+    Only DTSTART and DTEND (as their YYYYMMDD prefix, which date and date-time
+    values share) and UID and SUMMARY (unescaped text) are kept; every other
+    line is skipped without being decoded. Properties of nested components
+    (VALARM) are ignored. Raises ValueError if the data is not an iCalendar feed
+    or ends before END:VCALENDAR - only after the last event has been yielded,
+    so callers must consume every event before acting on a feed's absences.
+    """
+    event = None
+    current = None  # Property that folded continuation lines belong to
+    depth = 0
+    started = False
+    ended = False
+    for raw in lines:
+        line = raw.rstrip(b'\r\n')
+        if not line:
+            continue
+        if not started:
+            if line.lstrip(b'\xef\xbb\xbf').strip().upper() != b'BEGIN:VCALENDAR':
+                raise ValueError('Not an iCalendar feed (missing BEGIN:VCALENDAR)')
+            started = True
+            continue
+        if line[:1] in (b' ', b'\t'):
+            if current is not None:
+                event[current] += line[1:]
+            continue
+        
+        current = None
+        head = line[:12].upper()
+        if head.startswith(b'BEGIN:'):
+            if head == b'BEGIN:VEVENT' and event is None:
+                event = {}
+                depth = 0
+            elif event is not None:
+                depth += 1
+        elif event is None:
+            if line.strip().upper() == b'END:VCALENDAR':
+                ended = True
+            continue
+        elif head.startswith(b'END:'):
+            if depth:
+                depth -= 1
+                continue
+            yield {
+                name: (value[:8].decode('ascii', 'replace') if name.startswith('DT')
+                       else unescape_ical_text(value.decode('utf-8', 'replace')))
+                for name, value in event.items()
+            }
+            event = None
+        elif not depth and head.startswith(ICAL_EVENT_PROPERTIES):
+            colon = line.find(b':')
+            if colon == -1:
+                continue
+            name = line[:colon].split(b';', 1)[0].upper()
+            if name in ICAL_EVENT_PROPERTIES:
+                current = name.decode('ascii')
+                event[current] = line[colon + 1:]
+    if not started:
+        raise ValueError('Not an iCalendar feed (empty)')
+    if not ended:
+        # A cut-off download would otherwise read as every later stay cancelled
+        raise ValueError('Truncated iCalendar feed (missing END:VCALENDAR)')
+
+def booking_key_from_id(booking_id):
+    """Stored _id of a bookings collection entry from its API bookingId"""
+    return ObjectId(booking_id) if ObjectId.is_valid(booking_id) else booking_id
+
+def diff_ical_bookings(content, existing_bookings):
+    """Reconcile an iCal feed with a room's current and upcoming bookings.
+
+    content is the feed as bytes or as an iterable of raw byte lines (a
+    streamed response, see fetch_ical_feed).
+    existing_bookings are the room's bookings checking out yesterday or later
+    (see existing_intervals_for_sync). Feed events are matched through dict
+    indexes, first on iCal UID and then on (checkIn, checkOut), so a feed is
+    reconciled in one pass. Returns (diff, skipped_count) where diff has:
+      'added': new booking entries,
+      'changed': [(existing booking, {'checkIn', 'checkOut'})] for synced stays
+                 whose dates moved,
+      'removed': synced bookings whose UID left the feed (cancelled stays) or
+                 that repeat a UID already kept.
+    Past events and events matching an unchanged booking count as skipped.
+    Raises if the feed cannot be parsed.
+    """
+    today = datetime.now().date()
+    today_compact = today.strftime('%Y%m%d')
+    today_iso = today.strftime('%Y-%m-%d')
+    
+    by_uid = {}
+    by_dates = {}
+    removed = []
+    for booking in existing_bookings:
+        uid = booking.get('icalUid')
+        if uid:
+            if uid in by_uid:
+                if booking.get('source') == 'airbnb_ical':
+                    removed.append(booking)  # Synced twice by an earlier sync
+                continue
+            by_uid[uid] = booking
+        by_dates.setdefault((booking.get('checkIn'), booking.get('checkOut')), booking)
+    
+    seen_uids = set()
+    added = []
+    changed = []
+    skipped_count = 0
+    lines = io.BytesIO(content) if isinstance(content, bytes) else content
+    for event in iter_ical_events(lines):
+        try:
+            dtstart = event.get('DTSTART')
+            dtend = event.get('DTEND')
+            
+            if not dtstart or not dtend:
+                continue
+            
+            # Skip past bookings
+            if dtend < today_compact:
+                skipped_count += 1
+                continue
+            
+            summary = event.get('SUMMARY', 'Airbnb Booking')
+            uid = event.get('UID', '')
+            check_in = datetime.strptime(dtstart, '%Y%m%d').strftime('%Y-%m-%d')
+            check_out = datetime.strptime(dtend, '%Y%m%d').strftime('%Y-%m-%d')
+            
+            if uid:
+                if uid in seen_uids:
+                    skipped_count += 1
+                    continue
+                seen_uids.add(uid)
+                match = by_uid.get(uid)
+                if match is not None:
+                    if (match.get('checkIn'), match.get('checkOut')) != (check_in, check_out):
+                        changed.append((match, {'checkIn': check_in, 'checkOut': check_out}))
+                    else:
+                        skipped_count += 1
+                    continue
+            
+            # Same dates as an existing booking (manual, or synced without a UID)
+            if (check_in, check_out) in by_dates:
+                skipped_count += 1
+                continue
+            
+            booking = {
+                'checkIn': check_in,
+                'checkOut': check_out,
+                'guestName': summary if summary != 'Reserved' else 'Airbnb Guest',
+                'guestPhone': '',
+                'guestEmail': '',
+                'notes': 'Synced from Airbnb iCal',
+                'source': 'airbnb_ical',
+                'icalUid': uid,
+                'createdAt': datetime.now().isoformat()
+            }
+            added.append(booking)
+            by_dates[(check_in, check_out)] = booking
+        except Exception as e:
+            print(f"Error processing iCal event: {e}")
+            continue
+    
+    # Synced stays that are still ahead but no longer in the feed were cancelled
+    removed += [
+        booking for uid, booking in by_uid.items()
+        if uid not in seen_uids
+        and booking.get('source') == 'airbnb_ical'
+        and (booking.get('checkOut') or '') >= today_iso
+    ]
+    return {'added': added, 'changed': changed, 'removed': removed}, skipped_count
+
+def ical_diff_counts(diff):
+    """Result counters for a feed diff"""
+    return {
+        'syncedCount': len(diff['added']),
+        'updatedCount': len(diff['changed']),
+        'removedCount': len(diff['removed'])
+    }
+
+def is_imported_booking(booking):
+    """Whether a booking came in from an iCal feed (not booked here)"""
+    return booking.get('source') == 'airbnb_ical' or bool(booking.get('icalUid'))
+
+def split_ical_conflicts(diff, own_bookings):
+    """Hold back feed stays that overlap one of the room's own bookings.
+
+    Added stays and moved dates that would double-book nights taken by a
+    booking made here are not stored. Returns (diff to store, conflicts) where
+    conflicts are {'change': 'added' | 'moved', 'checkIn', 'checkOut', 'icalUid'}
+    entries.
+    """
+    def overlaps(dates):
+        return any(
+            dates['checkIn'] < booking.get('checkOut', '') and dates['checkOut'] > booking.get('checkIn', '')
+            for booking in own_bookings
+        )
+    
+    conflicts = []
+    added = []
+    for booking in diff['added']:
+        if overlaps(booking):
+            conflicts.append({
+                'change': 'added', 'checkIn': booking['checkIn'], 'checkOut': booking['checkOut'],
+                'icalUid': booking.get('icalUid')
+            })
+        else:
+            added.append(booking)
+    changed = []
+    for booking, dates in diff['changed']:
+        if overlaps(dates):
+            conflicts.append({'change': 'moved', **dates, 'icalUid': booking.get('icalUid')})
+        else:
+            changed.append((booking, dates))
+    return {'added': added, 'changed': changed, 'removed': diff['removed']}, conflicts
+
+def store_room_ical_diff(room, diff):
+    """Write one room's feed diff under the same guard as admin bookings.
+
+    The room's own bookings are read, overlapping stays held back (see
+    split_ical_conflicts) and the rest written together with the room's
+    lastIcalSync / updated_at in one transaction, or under the room's booking
+    lease without transactions (see run_in_transaction), so an import and an
+    admin booking cannot take the same nights. Returns (stored, conflicts).
+    """
+    room_key = room['_id']
+    embedded_own = [b for b in room.get('bookedIntervals') or [] if not is_imported_booking(b)]
+    yesterday = (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+    
+    def callback(session):
+        stored_own = [
+            booking for booking in bookings_collection.find(
+                booking_window_filter(room_key, start=yesterday),
+                {'checkIn': 1, 'checkOut': 1, 'source': 1, 'icalUid': 1},
+                session=session
+            )
+            if not is_imported_booking(booking)
+        ]
+        accepted, conflicts = split_ical_conflicts(diff, embedded_own + stored_own)
+        booking_ops = []
+        occupancy = []
+        for booking in accepted['added']:
+            booking_ops.append(InsertOne({'roomId': room_key, **booking}))
+            occupancy.append((room_key, booking, 1))
+        # Not-yet-migrated embedded entries have no bookingId and are left alone
+        for booking, dates in accepted['changed']:
+            if booking.get('bookingId'):
+                booking_ops.append(UpdateOne(
+                    {'_id': booking_key_from_id(booking['bookingId']), 'roomId': room_key},
+                    {'$set': {**dates, 'updatedAt': datetime.now()}}
+                ))
+                occupancy += [(room_key, booking, -1), (room_key, dates, 1)]
+        for booking in accepted['removed']:
+            if booking.get('bookingId'):
+                booking_ops.append(DeleteOne({'_id': booking_key_from_id(booking['bookingId']), 'roomId': room_key}))
+                occupancy.append((room_key, booking, -1))
+        if not booking_ops:
+            return False, conflicts
+        
+        bookings_collection.bulk_write(booking_ops, ordered=False, session=session)
+        record_occupancy(occupancy, session=session)
+        rooms_collection.update_one(
+            {'_id': room_key},
+            {'$set': {'lastIcalSync': datetime.now(), 'updated_at': datetime.now(timezone.utc)}},
+            session=session
+        )
+        return True, conflicts
+    
+    return run_in_transaction(callback, room_ids=[str(room_key)])
+
+def apply_ical_diffs(room_diffs, feed_states=()):
+    """Store the reconciled feeds of several rooms.
+
+    room_diffs is [(room, diff)] from diff_ical_bookings and feed_states is
+    [(room, icalFeed)]. Each room's bookings are written under the booking
+    guard (see store_room_ical_diff); feed states go out in one rooms write.
+    In fallback JSON mode each room's bookedIntervals is replaced once. Rooms
+    whose bookings changed get a new lastIcalSync and updated_at; the feed
+    state is not part of the API shape, so storing it alone does not count as
+    a room update.
+    
+    Returns (changed, problems): the stored _ids of the rooms whose bookings
+    changed, and {room id string: {'conflicts': [...]} or {'error': str}} for
+    rooms with stays held back or whose write failed. Their feed state is
+    stored without its validators and hash, so the next sync reads the whole
+    feed again.
+    """
+    room_diffs = [(room, diff) for room, diff in room_diffs if any(diff.values())]
+    feed_states = list(feed_states)
+    if not room_diffs and not feed_states:
+        return [], {}
+    
+    changed = []
+    problems = {}
+    if rooms_collection is None:
+        now = datetime.now().isoformat()
+        for room, diff in room_diffs:
+            own = [b for b in room.get('bookedIntervals') or [] if not is_imported_booking(b)]
+            diff, conflicts = split_ical_conflicts(diff, own)
+            if conflicts:
+                problems[str(room['_id'])] = {'conflicts': conflicts}
+            if not any(diff.values()):
+                continue
+            removed = {id(booking) for booking in diff['removed']}
+            for booking, dates in diff['changed']:
+                booking.update(dates)
+            room['bookedIntervals'] = [
+                booking for booking in room.get('bookedIntervals') or [] if id(booking) not in removed
+            ] + diff['added']
+            room['lastIcalSync'] = now
+            room['updated_at'] = now
+            changed.append(room['_id'])
+    else:
+        for room, diff in room_diffs:
+            try:
+                stored, conflicts = store_room_ical_diff(room, diff)
+            except RoomBusyError as e:
+                problems[str(room['_id'])] = {'error': str(e)}
+                continue
+            if conflicts:
+                problems[str(room['_id'])] = {'conflicts': conflicts}
+            if stored:
+                changed.append(room['_id'])
+    
+    # Rooms with held-back stays get their whole feed again next time
+    feed_by_room = {room['_id']: (room, feed_state) for room, feed_state in feed_states}
+    for room, _ in room_diffs:
+        if str(room['_id']) in problems:
+            feed_by_room[room['_id']] = (room, {'url': room.get('icalUrl')})
+    if rooms_collection is None:
+        for room, feed_state in feed_by_room.values():
+            room['icalFeed'] = feed_state
+        save_fallback_rooms()
+    elif feed_by_room:
+        rooms_collection.bulk_write([
+            UpdateOne({'_id': room_key}, {'$set': {'icalFeed': feed_state}})
+            for room_key, (_, feed_state) in feed_by_room.items()
+        ], ordered=False)
+    return changed, problems
+
+def merge_ical_problem(result, problem):
+    """Fold a room's apply_ical_diffs problem into its sync result"""
+    if 'error' in problem:
+        result.update(success=False, error=problem['error'])
+        return result
+    conflicts = problem['conflicts']
+    result['syncedCount'] -= sum(1 for conflict in conflicts if conflict['change'] == 'added')
+    result['updatedCount'] -= sum(1 for conflict in conflicts if conflict['change'] == 'moved')
+    result.update(conflictCount=len(conflicts), conflicts=conflicts)
+    return result
+
+def sync_ical_feeds(rooms, on_room_done=None, force=False):
+    """Fetch and reconcile the iCal feeds of rooms concurrently, then store all changes at once.
+
+    rooms are room documents with an icalUrl. Returns one result dict per room,
+    in the order given. on_room_done(room) is called from the worker threads as
+    each feed is fetched and parsed. force refetches feeds unchanged since the
+    last sync.
+    """
+    if not rooms:
+        return []
+    
+    # Bookings a feed is reconciled with, for every room in one query
+    stored_by_room = {}
+    if rooms_collection is not None:
+        yesterday = (datetime.now().date() - timedelta(days=1)).strftime('%Y-%m-%d')
+        stored_by_room = find_bookings_in_window(yesterday, '9999-12-31')
+    
+    durations = {}  # room id string -> milliseconds spent fetching and parsing
+    
+    def sync_room(room):
+        started = time.monotonic()
+        try:
+            existing_bookings = list(room.get('bookedIntervals') or []) + stored_by_room.get(str(room['_id']), [])
+            # The feed is parsed while it downloads
+            parsed, feed_state = fetch_changed_ical_feed(
+                room, lambda lines: diff_ical_bookings(lines, existing_bookings), force=force)
+            if parsed is None:
+                return None, 0, feed_state
+            return parsed + (feed_state,)
+        finally:
+            durations[str(room['_id'])] = round((time.monotonic() - started) * 1000)
+            if on_room_done is not None:
+                on_room_done(room)
+    
+    workers = max(1, min(ICAL_SYNC_MAX_WORKERS, len(rooms)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ical-sync') as executor:
+        futures = [executor.submit(sync_room, room) for room in rooms]
+    
+    results = []
+    room_diffs = []
+    feed_states = []  # (room, new icalFeed) for feeds whose validators or hash changed
+    for room, future in zip(rooms, futures):
+        result = {'roomId': str(room['_id']), 'roomName': room.get('name', 'Unknown')}
+        try:
+            diff, skipped_count, feed_state = future.result()
+            result['durationMs'] = durations.get(result['roomId'])
+        except Exception as e:
+            result.update(success=False, error=str(e), durationMs=durations.get(result['roomId']))
+        else:
+            unchanged = diff is None
+            diff = diff or {'added': [], 'changed': [], 'removed': []}
+            result.update(success=True, unchanged=unchanged, skippedCount=skipped_count, **ical_diff_counts(diff))
+            room_diffs.append((room, diff))
+            if feed_state != room.get('icalFeed'):
+                feed_states.append((room, feed_state))
+        results.append(result)
+    
+    changed, problems = apply_ical_diffs(room_diffs, feed_states)
+    for result in results:
+        if result['roomId'] in problems:
+            merge_ical_problem(result, problems[result['roomId']])
+    if changed:
+        room_catalog_changed()
+    return results
+
+def sync_room_ical(room, force=False):
+    """Fetch, reconcile and store one room's iCal feed.
+
+    Returns (response payload, HTTP status) for the sync-ical endpoint.
+    """
+    # Fetch iCal data from URL (conditionally, see iCal Feed Sync) and
+    # reconcile it with the room's bookings while it downloads
+    started = time.monotonic()
+    existing_bookings = existing_intervals_for_sync(room)
+    try:
+        parsed, feed_state = fetch_changed_ical_feed(
+            room, lambda lines: diff_ical_bookings(lines, existing_bookings), force=force)
+    except requests.exceptions.RequestException as e:
+        error = f'Failed to fetch iCal data: {str(e)}'
+        record_ical_sync_results([room], [{'success': False, 'error': error}])
+        return {
+            'success': False,
+            'error': error
+        }, 502
+    except Exception as e:
+        error = f'Failed to parse iCal data: {str(e)}'
+        record_ical_sync_results([room], [{'success': False, 'error': error}])
+        return {
+            'success': False,
+            'error': error
+        }, 400
+    
+    unchanged = parsed is None
+    diff, skipped_count = parsed or ({'added': [], 'changed': [], 'removed': []}, 0)
+    result = {
+        'success': True,
+        'unchanged': unchanged,
+        **ical_diff_counts(diff),
+        'durationMs': round((time.monotonic() - started) * 1000)
+    }
+    
+    # The room (and with it the catalog version) only changes when its
+    # bookings did, as in sync_ical_feeds; the run itself goes to ical_sync_state
+    feed_states = [(room, feed_state)] if feed_state != room.get('icalFeed') else []
+    changed, problems = apply_ical_diffs([(room, diff)], feed_states)
+    if str(room['_id']) in problems:
+        merge_ical_problem(result, problems[str(room['_id'])])
+    record_ical_sync_results([room], [result])
+    if changed:
+        room_catalog_changed(room['_id'])
+    if not result['success']:
+        return {
+            'success': False,
+            'error': result['error']
+        }, 503
+    
+    counts = {key: result[key] for key in ('syncedCount', 'updatedCount', 'removedCount')}
+    conflicts = result.get('conflicts', [])
+    if unchanged:
+        message = 'iCal feed unchanged since the last sync.'
+    else:
+        message = (f"iCal sync completed. {counts['syncedCount']} new bookings added, "
+                   f"{counts['updatedCount']} moved, {counts['removedCount']} cancelled, {skipped_count} skipped.")
+        if conflicts:
+            message += f" {len(conflicts)} not imported because they overlap bookings made here."
+    return {
+        'success': True,
+        'message': message,
+        'unchanged': unchanged,
+        **counts,
+        'skippedCount': skipped_count,
+        'conflictCount': len(conflicts),
+        'conflicts': conflicts,
+        'lastSync': datetime.now().isoformat()
+    }, 200
+
+# ===== iCal Sync Scheduler =====
+# Rooms are synced on their own cadence instead of whenever a dashboard loads.
+# ical_sync_state holds one document per room with its schedule (nextRunAt)
+# and the outcome of its last run, which the dashboard reads without syncing.
+# A tick claims at most ICAL_SCHEDULER_BATCH_SIZE due rooms and schedules each
+# one a jittered interval ahead, so runs stay spread out. Ticks come from a
+# background thread when the server runs locally and from the cron endpoint
+# on Vercel.
+ICAL_SYNC_INTERVAL_MINUTES = int(os.getenv('ICAL_SYNC_INTERVAL_MINUTES', '30'))
+ICAL_SYNC_RETRY_MINUTES = 5  # Delay after a failed run, doubling up to the room's interval
+ICAL_SYNC_LEASE_MINUTES = 10  # A claimed room is not claimed again before this passes
+ICAL_SCHEDULER_BATCH_SIZE = int(os.getenv('ICAL_SCHEDULER_BATCH_SIZE', '10'))
+ICAL_SCHEDULER_TICK_SECONDS = int(os.getenv('ICAL_SCHEDULER_TICK_SECONDS', '60'))
+CRON_SECRET = os.getenv('CRON_SECRET', '')
+
+_fallback_ical_states = {}  # room id string -> state, when running without MongoDB
+
+def room_sync_interval(room):
+    """How often a room's feed is synced (room['icalSyncInterval'] minutes, or the default)"""
+    return timedelta(minutes=room.get('icalSyncInterval') or ICAL_SYNC_INTERVAL_MINUTES)
+
+def load_ical_sync_states():
+    """Return {room id string: sync state} for every room with a recorded state"""
+    if ical_sync_state_collection is None:
+        return {room_id: dict(state) for room_id, state in _fallback_ical_states.items()}
+    return {str(state['_id']): state for state in ical_sync_state_collection.find()}
+
+def claim_due_ical_rooms(rooms, limit):
+    """Pick up to limit rooms whose sync is due, most overdue first, and lease them.
+
+    A room is leased by moving its nextRunAt ICAL_SYNC_LEASE_MINUTES ahead, so
+    concurrent ticks (another instance, an overlapping cron call) skip it.
+    """
+    now = datetime.now(timezone.utc)
+    states = load_ical_sync_states()
+    never = datetime.min.replace(tzinfo=timezone.utc)
+    due = []
+    for room in rooms:
+        next_run = parse_timestamp((states.get(str(room['_id'])) or {}).get('nextRunAt'))
+        if next_run is None or next_run <= now:
+            due.append((next_run or never, room))
+    due.sort(key=lambda item: item[0])
+    
+    lease_until = now + timedelta(minutes=ICAL_SYNC_LEASE_MINUTES)
+    claimed = []
+    for _, room in due:
+        if len(claimed) >= limit:
+            break
+        if ical_sync_state_collection is None:
+            _fallback_ical_states.setdefault(str(room['_id']), {})['nextRunAt'] = lease_until
+            claimed.append(room)
+            continue
+        try:
+            result = ical_sync_state_collection.update_one(
+                {'_id': room['_id'], '$or': [{'nextRunAt': {'$lte': now}}, {'nextRunAt': None}]},
+                {'$set': {'roomId': room['_id'], 'nextRunAt': lease_until}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            continue  # Leased by someone else since the states were read
+        if result.matched_count or result.upserted_id is not None:
+            claimed.append(room)
+    return claimed
+
+def record_ical_sync_results(rooms, results, scheduled=False):
+    """Store each room's last run (time, duration, outcome) and its next scheduled run"""
+    now = datetime.now(timezone.utc)
+    states = load_ical_sync_states()
+    operations = []
+    for room, result in zip(rooms, results):
+        room_key = room['_id']
+        previous = states.get(str(room_key)) or {}
+        interval = room_sync_interval(room)
+        update = {
+            'roomId': room_key,
+            'lastRunAt': now,
+            'durationMs': result.get('durationMs'),
+            'scheduled': scheduled,
+            'error': result.get('error')
+        }
+        if result.get('success'):
+            update.update(
+                lastSuccessAt=now,
+                failures=0,
+                unchanged=result.get('unchanged', False),
+                syncedCount=result.get('syncedCount', 0),
+                updatedCount=result.get('updatedCount', 0),
+                removedCount=result.get('removedCount', 0),
+                conflictCount=result.get('conflictCount', 0)
+            )
+            # Up to 10% either way keeps rooms synced together from staying in lockstep
+            delay = interval * random.uniform(0.9, 1.1)
+        else:
+            update['failures'] = previous.get('failures', 0) + 1
+            delay = min(interval, timedelta(minutes=ICAL_SYNC_RETRY_MINUTES * 2 ** (update['failures'] - 1)))
+        update['nextRunAt'] = now + delay
+        
+        if ical_sync_state_collection is None:
+            _fallback_ical_states.setdefault(str(room_key), {}).update(update)
+        else:
+            operations.append(UpdateOne({'_id': room_key}, {'$set': update}, upsert=True))
+    if operations:
+        ical_sync_state_collection.bulk_write(operations, ordered=False)
+
+def forget_ical_sync_state(room_key):
+    """Drop a room's schedule so its (new) feed is synced on the next tick"""
+    if ical_sync_state_collection is None:
+        _fallback_ical_states.pop(str(room_key), None)
+    else:
+        ical_sync_state_collection.delete_one({'_id': room_key})
+
+def convert_ical_sync_state_for_api(state):
+    """Convert a sync state to the /ical/status entry format"""
+    api_state = {key: value for key, value in state.items() if key not in ('_id', 'roomId')}
+    for key in ('lastRunAt', 'lastSuccessAt', 'nextRunAt'):
+        if api_state.get(key):
+            api_state[key] = parse_timestamp(api_state[key]).isoformat()
+    return api_state
+
+def load_ical_rooms():
+    """Rooms with an iCal URL, with the fields a feed sync needs"""
+    if rooms_collection is None:
+        return [room for room in fallback_rooms if room.get('icalUrl')]
+    return list(rooms_collection.find(
+        {'icalUrl': {'$nin': [None, '']}},
+        {'name': 1, 'icalUrl': 1, 'icalFeed': 1, 'icalSyncInterval': 1, 'bookedIntervals': 1}
+    ))
+
+def run_ical_scheduler_tick(limit=None):
+    """Sync the rooms whose turn has come. Returns the per-room results."""
+    rooms = claim_due_ical_rooms(load_ical_rooms(), limit or ICAL_SCHEDULER_BATCH_SIZE)
+    if not rooms:
+        return []
+    results = sync_ical_feeds(rooms)
+    record_ical_sync_results(rooms, results, scheduled=True)
+    return results
+
+def ical_scheduler_loop():
+    """Background worker: run a scheduler tick every ICAL_SCHEDULER_TICK_SECONDS"""
+    while True:
+        try:
+            results = run_ical_scheduler_tick()
+            synced = sum(r.get('syncedCount', 0) for r in results)
+            failed = sum(1 for r in results if not r.get('success'))
+            if synced or failed:
+                print(f"📅 Scheduled iCal sync: {len(results)} rooms, {synced} new bookings, {failed} failed")
+        except Exception as e:
+            print(f"⚠️ iCal scheduler tick failed: {e}")
+        time.sleep(ICAL_SCHEDULER_TICK_SECONDS)
+
+def start_ical_scheduler():
+    """Start the in-process scheduler thread (local server; Vercel uses the cron endpoint)"""
+    if not ICAL_AVAILABLE:
+        return
+    threading.Thread(target=ical_scheduler_loop, name='ical-scheduler', daemon=True).start()
+    print(f"✓ iCal scheduler started (every {ICAL_SCHEDULER_TICK_SECONDS}s, rooms every {ICAL_SYNC_INTERVAL_MINUTES} min)")
+
+# ===== iCal Export =====
+# Each room publishes its own bookings as an iCalendar feed that Airbnb and
+# Booking.com import, so a stay booked here blocks the dates there too.
+# Bookings imported from a feed are left out, otherwise channels would import
+# their own events back. The feed URL carries a per-room secret token
+# (room['icalExportToken']). Channel managers poll every few minutes, so the
+# rendered feed is cached per room and keyed by a digest of the exported
+# bookings: room edits, token rotations and imported-only syncs leave the
+# digest, the body and its ETag unchanged.
+ICAL_EXPORT_CACHE_SIZE = int(os.getenv('ICAL_EXPORT_CACHE_SIZE', '256'))
+ICAL_EXPORT_PRODID = '-//Khiet An Homestay//Room Calendar 1.0//EN'
+ICAL_EXPORT_META_PREFIX = 'ical_export:'  # app_meta: {'digest', 'changed_at'} per room
+ICAL_EXPORT_EPOCH = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+_ical_exports_lock = threading.Lock()
+_ical_exports = OrderedDict()  # room id string -> {'digest', 'body', 'etag', 'last_modified'}
+
+def escape_ical_text(value):
+    """Escape a TEXT property value (RFC 5545 3.3.11)"""
+    return (str(value).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+def fold_ical_line(line):
+    """Fold a content line at 75 octets, continuing with CRLF + space"""
+    data = line.encode('utf-8')
+    if len(data) <= 75:
+        return line
+    parts = []
+    limit = 75
+    while len(data) > limit:
+        cut = limit
+        while (data[cut] & 0xC0) == 0x80:
+            cut -= 1  # Never split a UTF-8 sequence
+        parts.append(data[:cut].decode('utf-8'))
+        data = data[cut:]
+        limit = 74  # Continuation lines start with the space
+    parts.append(data.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+def room_export_bookings(room):
+    """The room's own bookings (imported feed events excluded), by check-in"""
+    bookings = list(room.get('bookedIntervals') or [])
+    if rooms_collection is not None:
+        bookings += find_room_bookings(room['_id'])
+    own = [
+        b for b in bookings
+        if not is_imported_booking(b)
+        and b.get('checkIn') and b.get('checkOut') and b['checkOut'] > b['checkIn']
+    ]
+    return sorted(own, key=lambda b: (b['checkIn'], b['checkOut']))
+
+def export_booking_key(room_id_str, booking):
+    """Stable UID part of an exported booking"""
+    return booking.get('bookingId') or hashlib.sha1(
+        f"{room_id_str}|{booking['checkIn']}|{booking['checkOut']}".encode('utf-8')).hexdigest()[:24]
+
+def export_booking_stamp(booking):
+    """DTSTAMP of an exported booking: when it was created (never changes)"""
+    return parse_timestamp(booking.get('createdAt')) or ICAL_EXPORT_EPOCH
+
+def export_bookings_digest(room_id_str, bookings):
+    """Digest of everything the export renders from a booking set"""
+    digest = hashlib.sha256()
+    for booking in bookings:
+        digest.update('{}|{}|{}|{}\n'.format(
+            export_booking_key(room_id_str, booking), booking['checkIn'], booking['checkOut'],
+            export_booking_stamp(booking).isoformat()
+        ).encode('utf-8'))
+    return digest.hexdigest()
+
+def export_changed_at(room_id_str, digest, bookings):
+    """When the room's exported booking set last changed (the feed's Last-Modified).
+
+    The latest booking creation time only moves forward while bookings are
+    added, so the digest is also remembered in app_meta: a different digest
+    (e.g. after a cancellation) is stamped with the current time instead.
+    """
+    latest = max((export_booking_stamp(b) for b in bookings), default=ICAL_EXPORT_EPOCH)
+    if meta_collection is None:
+        return latest
+    
+    meta_id = ICAL_EXPORT_META_PREFIX + room_id_str
+    state = meta_collection.find_one({'_id': meta_id})
+    if state is not None and state.get('digest') == digest:
+        return parse_timestamp(state.get('changed_at')) or latest
+    changed_at = latest if state is None else max(latest, datetime.now(timezone.utc))
+    meta_collection.update_one(
+        {'_id': meta_id},
+        {'$set': {'digest': digest, 'changed_at': changed_at}},
+        upsert=True
+    )
+    return changed_at
+
+def render_room_ical(room_id_str, bookings):
+    """Render bookings as an iCalendar feed. Guest details are never included."""
+    lines = [
+        'BEGIN:VCALENDAR',
+        f'PRODID:{ICAL_EXPORT_PRODID}',
+        'VERSION:2.0',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f'X-WR-CALNAME:{escape_ical_text("Room " + room_id_str)}'
+    ]
+    for booking in bookings:
+        lines += [
+            'BEGIN:VEVENT',
+            f'UID:{export_booking_key(room_id_str, booking)}-{room_id_str}@khietan-homestay',
+            f"DTSTAMP:{export_booking_stamp(booking).strftime('%Y%m%dT%H%M%SZ')}",
+            f"DTSTART;VALUE=DATE:{booking['checkIn'].replace('-', '')}",
+            f"DTEND;VALUE=DATE:{booking['checkOut'].replace('-', '')}",
+            'SUMMARY:Reserved',
+            'TRANSP:OPAQUE',
+            'END:VEVENT'
+        ]
+    lines.append('END:VCALENDAR')
+    return ('\r\n'.join(fold_ical_line(line) for line in lines) + '\r\n').encode('utf-8')
+
+def get_room_ical_export(room):
+    """Return the cached export entry of a room, rendering it when its bookings changed"""
+    room_id_str = str(room['_id'])
+    bookings = room_export_bookings(room)
+    digest = export_bookings_digest(room_id_str, bookings)
+    with _ical_exports_lock:
+        entry = _ical_exports.get(room_id_str)
+        if entry is not None and entry['digest'] == digest:
+            _ical_exports.move_to_end(room_id_str)
+            return entry
+    
+    body = render_room_ical(room_id_str, bookings)
+    entry = {
+        'digest': digest,
+        'body': body,
+        'etag': 'ical-' + hashlib.sha256(body).hexdigest()[:32],
+        'last_modified': export_changed_at(room_id_str, digest, bookings)
+    }
+    with _ical_exports_lock:
+        _ical_exports[room_id_str] = entry
+        _ical_exports.move_to_end(room_id_str)
+        while len(_ical_exports) > ICAL_EXPORT_CACHE_SIZE:
+            _ical_exports.popitem(last=False)
+    return entry
+
+def room_ical_export_url(room_id, token):
+    """Absolute URL of a room's export feed"""
+    return f"{request.url_root.rstrip('/')}/backend/ical/rooms/{room_id}.ics?token={token}"
+
+# ===== Sync Coalescing =====
+# Sync requests for the same key (one room, or all rooms) are coalesced:
+# callers arriving while a sync runs wait for it and get its result, and a
+# sync that finished less than SYNC_COALESCE_SECONDS ago is answered from its
+# stored result. Within a process this is a dict of in-flight syncs; across
+# workers a sync_locks document per key holds a lease (expiresAt) and the
+# last result. ?force=1 skips the stored result but still joins a running sync.
+SYNC_COALESCE_SECONDS = int(os.getenv('SYNC_COALESCE_SECONDS', '30'))
+SYNC_LOCK_SECONDS = 120  # Lease of a running sync; longer than any feed fetch with retries
+SYNC_LOCK_POLL_SECONDS = 0.25
+
+_sync_flights_lock = threading.Lock()
+_sync_flights = {}  # key -> {'done': Event, 'result': (payload, status), 'error': str}
+_sync_recent = {}  # key -> {'finished': monotonic time, 'result': (payload, status)}
+
+def locked_sync(key, run, force=False):
+    """Run run() under the key's sync_locks lease, or reuse another worker's result.
+
+    Returns ((payload, status), mode) with mode 'fresh', 'joined' or 'cached'.
+    """
+    if sync_locks_collection is None:
+        return run(), 'fresh'
+    
+    now = datetime.now(timezone.utc)
+    lock = sync_locks_collection.find_one({'_id': key}) or {}
+    finished_at = parse_timestamp(lock.get('finishedAt'))
+    if (not force and lock.get('result') and finished_at
+            and now - finished_at < timedelta(seconds=SYNC_COALESCE_SECONDS)):
+        return tuple(lock['result']), 'cached'
+    
+    owner = f'{PROCESS_BOOT_ID}:{threading.get_ident()}'
+    try:
+        sync_locks_collection.update_one(
+            {'_id': key, '$or': [{'expiresAt': {'$lte': now}}, {'expiresAt': None}]},
+            {'$set': {'owner': owner, 'startedAt': now, 'expiresAt': now + timedelta(seconds=SYNC_LOCK_SECONDS)}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker holds the lease - wait for its result
+        deadline = time.monotonic() + SYNC_LOCK_SECONDS
+        while time.monotonic() < deadline:
+            time.sleep(SYNC_LOCK_POLL_SECONDS)
+            lock = sync_locks_collection.find_one({'_id': key}) or {}
+            if lock.get('expiresAt') is None:
+                finished_at = parse_timestamp(lock.get('finishedAt'))
+                if lock.get('result') and finished_at and finished_at >= now:
+                    return tuple(lock['result']), 'joined'
+                break
+        # The holder failed or vanished; sync without the lease
+        return run(), 'fresh'
+    
+    result = None
+    try:
+        result = run()
+        return result, 'fresh'
+    finally:
+        sync_locks_collection.update_one(
+            {'_id': key, 'owner': owner},
+            {'$set': {
+                'expiresAt': None,
+                'finishedAt': datetime.now(timezone.utc),
+                'result': list(result) if result is not None else None
+            }}
+        )
+
+def coalesce_sync(key, run, force=False):
+    """Run run() -> (payload, status) once for all concurrent callers of key.
+
+    Returns (payload, status, mode); mode is 'fresh' for the caller that ran the
+    sync, 'joined' for callers that waited for it and 'cached' when a recent
+    result was reused.
+    """
+    with _sync_flights_lock:
+        recent = _sync_recent.get(key)
+        if not force and recent and time.monotonic() - recent['finished'] < SYNC_COALESCE_SECONDS:
+            return recent['result'] + ('cached',)
+        flight = _sync_flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _sync_flights[key] = {'done': threading.Event(), 'result': None, 'error': None}
+    
+    if not leader:
+        flight['done'].wait()
+        if flight['result'] is None:
+            raise RuntimeError(flight['error'] or 'Sync failed')
+        return flight['result'] + ('joined',)
+    
+    try:
+        result, mode = locked_sync(key, run, force=force)
+        flight['result'] = result
+        return result + (mode,)
+    except Exception as e:
+        flight['error'] = str(e)
+        raise
+    finally:
+        with _sync_flights_lock:
+            _sync_flights.pop(key, None)
+            if flight['result'] is not None:
+                _sync_recent[key] = {'finished': time.monotonic(), 'result': flight['result']}
+        flight['done'].set()
+
+# ===== Background Jobs =====
+# Long operations (syncing every feed, archiving, rebuilding the occupancy
+# grid) run as jobs instead of holding the request open. A job is a document
+# in jobs with its type, params, status (queued -> running -> succeeded |
+# failed), progress and result; the endpoint inserts it and answers 202 with
+# the job id. While a job is queued or running it holds activeKey (type and
+# params) under a unique index, so concurrent requests for the same work
+# share one job. Whoever runs a job claims it with a lease (heartbeatAt), so a
+# job whose instance died is picked up again; after JOB_MAX_ATTEMPTS lost
+# leases it fails and releases its activeKey.
+# Where it runs depends on JOB_RUN_IN_BACKGROUND:
+# - true (default, long-running server): a small thread pool in this process.
+# - false (default on Vercel): a serverless instance is frozen as soon as it
+#   responds, so a thread would stall. Instead queued jobs are run by the
+#   cron endpoint and by GET /jobs/<id> polls, each for at most
+#   JOB_SLICE_SECONDS so a request stays inside the function time limit.
+#   Resumable jobs (the iCal sweep) checkpoint their progress and go back to
+#   queued when the slice is over; the next poll or cron call continues them.
+JOB_RUN_IN_BACKGROUND = os.getenv('JOB_RUN_IN_BACKGROUND', 'false' if IS_VERCEL else 'true').lower() == 'true'
+JOB_MAX_WORKERS = int(os.getenv('JOB_MAX_WORKERS', '2'))
+JOB_SLICE_SECONDS = int(os.getenv('JOB_SLICE_SECONDS', '20'))
+# A running job without a heartbeat for this long is claimed again. Inline
+# slices are short, so their lease is too: a slice killed by the platform
+# holds the job for a minute, not five.
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', '300' if JOB_RUN_IN_BACKGROUND else '60'))
+JOB_MAX_ATTEMPTS = 3
+JOB_PROGRESS_SECONDS = 1.0  # Progress is stored at most this often
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', '7'))
+JOB_FALLBACK_HISTORY = 200  # Jobs kept in memory when running without MongoDB
+
+JOB_HANDLERS = {}  # job type -> handler(params, progress) returning the result dict
+# Types whose handler(params, progress, checkpoint, deadline) returns
+# (finished, result or checkpoint) and can stop early to be continued later
+RESUMABLE_JOB_TYPES = set()
+
+_job_executor = None
+_job_executor_lock = threading.Lock()
+_fallback_jobs_lock = threading.Lock()
+_fallback_jobs = OrderedDict()  # job id -> job, when running without MongoDB
+
+def job_handler(job_type, resumable=False):
+    """Register the decorated function as the handler of job_type"""
+    def register(handler):
+        JOB_HANDLERS[job_type] = handler
+        if resumable:
+            RESUMABLE_JOB_TYPES.add(job_type)
+        return handler
+    return register
+
+def get_job_executor():
+    """The shared job thread pool, created on first use"""
+    global _job_executor
+    with _job_executor_lock:
+        if _job_executor is None:
+            _job_executor = ThreadPoolExecutor(max_workers=JOB_MAX_WORKERS, thread_name_prefix='job')
+        return _job_executor
+
+def find_job(job_id):
+    """Return the job with this id, or None"""
+    if jobs_collection is None:
+        with _fallback_jobs_lock:
+            job = _fallback_jobs.get(job_id)
+            return dict(job) if job else None
+    return jobs_collection.find_one({'_id': job_id})
+
+def job_active_key(job_type, params):
+    """The activeKey of a queued or running job: one such job per type and params"""
+    return f"{job_type}|{json.dumps(params, sort_keys=True)}"
+
+def job_is_claimable(job):
+    """Whether nobody is running the job: queued, or running without a recent heartbeat"""
+    if job.get('attempts', 0) >= JOB_MAX_ATTEMPTS:
+        return False
+    if job['status'] == 'queued':
+        return True
+    stale = datetime.now(timezone.utc) - timedelta(seconds=JOB_LEASE_SECONDS)
+    heartbeat = parse_timestamp(job.get('heartbeatAt'))
+    return job['status'] == 'running' and (heartbeat is None or heartbeat <= stale)
+
+def start_job(job_id):
+    """Hand a job to the background thread pool (a no-op when it runs on poll, see above)"""
+    if JOB_RUN_IN_BACKGROUND:
+        get_job_executor().submit(run_job, job_id)
+
+def enqueue_job(job_type, params=None, created_by=None):
+    """Store a queued job and start it in the background. Returns (job, created).
+
+    When a job of the same type and params is already queued or running, that
+    job is returned instead and created is False. The unique activeKey index
+    makes this hold for concurrent requests too.
+    """
+    params = params or {}
+    active_key = job_active_key(job_type, params)
+    fail_abandoned_jobs()  # An abandoned job must not hold the activeKey
+    job = {
+        '_id': str(ObjectId()),
+        'type': job_type,
+        'params': params,
+        'activeKey': active_key,
+        'status': 'queued',
+        'progress': {'done': 0, 'total': None},
+        'attempts': 0,
+        'createdBy': created_by,
+        'createdAt': datetime.now(timezone.utc)
+    }
+    
+    existing = None
+    if jobs_collection is None:
+        with _fallback_jobs_lock:
+            existing = next((dict(j) for j in _fallback_jobs.values() if j.get('activeKey') == active_key), None)
+            if existing is None:
+                _fallback_jobs[job['_id']] = dict(job)
+                while len(_fallback_jobs) > JOB_FALLBACK_HISTORY:
+                    _fallback_jobs.popitem(last=False)
+    else:
+        for _ in range(2):
+            try:
+                jobs_collection.insert_one(job)
+                existing = None
+                break
+            except DuplicateKeyError:
+                existing = jobs_collection.find_one({'activeKey': active_key})
+                if existing is not None:
+                    break
+                # The active job finished between the insert and the lookup - try again
+    
+    if existing is not None:
+        # Its worker may be gone; claiming is atomic, so a second start is harmless
+        if job_is_claimable(existing):
+            start_job(existing['_id'])
+        return existing, False
+    start_job(job['_id'])
+    return job, True
+
+def claim_job(job_id=None):
+    """Lease a queued job, or a running one whose worker stopped heartbeating.
+
+    Returns the claimed job (status running, with this worker as owner) or None.
+    Without job_id the oldest claimable job is taken.
+    """
+    now = datetime.now(timezone.utc)
+    owner = f'{PROCESS_BOOT_ID}:{threading.get_ident()}'
+    claim = {'status': 'running', 'owner': owner, 'heartbeatAt': now}
+    stale = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    
+    if jobs_collection is None:
+        with _fallback_jobs_lock:
+            for job in _fallback_jobs.values():
+                if job_id is not None and job['_id'] != job_id:
+                    continue
+                claimable = job['status'] == 'queued' or (
+                    job['status'] == 'running' and job['heartbeatAt'] <= stale)
+                if claimable and job['attempts'] < JOB_MAX_ATTEMPTS:
+                    job.update(claim, attempts=job['attempts'] + 1)
+                    job.setdefault('startedAt', now)
+                    return dict(job)
+        return None
+    
+    query = {
+        '$or': [{'status': 'queued'}, {'status': 'running', 'heartbeatAt': {'$lte': stale}}],
+        'attempts': {'$lt': JOB_MAX_ATTEMPTS}
+    }
+    if job_id is not None:
+        query['_id'] = job_id
+    job = jobs_collection.find_one_and_update(
+        query,
+        {'$set': claim, '$inc': {'attempts': 1}},
+        sort=[('createdAt', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+    if job and not job.get('startedAt'):
+        jobs_collection.update_one({'_id': job['_id']}, {'$set': {'startedAt': now}})
+        job['startedAt'] = now
+    return job
+
+def update_job(job, fields, finished=False):
+    """Store fields on a claimed job, unless another worker has claimed it since.
+
+    finished releases the job's activeKey, so the same work can be queued again.
+    """
+    if jobs_collection is None:
+        with _fallback_jobs_lock:
+            stored = _fallback_jobs.get(job['_id'])
+            if stored and stored.get('owner') == job['owner']:
+                stored.update(fields)
+                if finished:
+                    stored.pop('activeKey', None)
+        return
+    update = {'$set': fields}
+    if finished:
+        update['$unset'] = {'activeKey': ''}
+    jobs_collection.update_one({'_id': job['_id'], 'owner': job['owner']}, update)
+
+def job_progress_reporter(job):
+    """A thread-safe progress(done=0, total=None, checkpoint=None) callback for a job's handler.
+
+    done is added to the count of finished items (continuing from the job's
+    stored progress); total sets the item count. Progress (and the job's
+    heartbeat) is stored at most every JOB_PROGRESS_SECONDS; a checkpoint, the
+    state a resumable handler continues from, is stored right away.
+    """
+    lock = threading.Lock()
+    stored = job.get('progress') or {}
+    state = {'done': stored.get('done', 0), 'total': stored.get('total'), 'saved': 0.0}
+    
+    def progress(done=0, total=None, checkpoint=None):
+        with lock:
+            state['done'] += done
+            if total is not None:
+                state['total'] = total
+            now = time.monotonic()
+            if (checkpoint is None and now - state['saved'] < JOB_PROGRESS_SECONDS
+                    and state['done'] != state['total']):
+                return
+            state['saved'] = now
+            fields = {
+                'progress': {'done': state['done'], 'total': state['total']},
+                'heartbeatAt': datetime.now(timezone.utc)
+            }
+            if checkpoint is not None:
+                fields['checkpoint'] = checkpoint
+            update_job(job, fields)
+    return progress
+
+def run_job(job_id=None, deadline=None):
+    """Claim a job and run its handler, storing the result or the error. Returns the job id run.
+
+    deadline (a time.monotonic() value) bounds resumable jobs: one that is not
+    done by then is queued again with its checkpoint and a fresh attempt count.
+    """
+    job = claim_job(job_id)
+    if job is None:
+        return None
+    try:
+        handler = JOB_HANDLERS.get(job['type'])
+        if handler is None:
+            raise ValueError(f"Unknown job type: {job['type']}")
+        progress = job_progress_reporter(job)
+        if job['type'] in RESUMABLE_JOB_TYPES:
+            finished, result = handler(job['params'], progress, job.get('checkpoint'), deadline)
+            if not finished:
+                update_job(job, {'status': 'queued', 'checkpoint': result, 'attempts': 0,
+                                 'heartbeatAt': datetime.now(timezone.utc)})
+                return job['_id']
+        else:
+            result = handler(job['params'], progress)
+        update_job(job, {'status': 'succeeded', 'result': result, 'error': None, 'checkpoint': None,
+                         'finishedAt': datetime.now(timezone.utc)}, finished=True)
+    except Exception as e:
+        print(f"⚠️ Job {job['_id']} ({job['type']}) failed: {e}")
+        update_job(job, {'status': 'failed', 'error': str(e), 'finishedAt': datetime.now(timezone.utc)},
+                   finished=True)
+    return job['_id']
+
+def fail_abandoned_jobs():
+    """Mark running jobs that lost their worker JOB_MAX_ATTEMPTS times as failed"""
+    now = datetime.now(timezone.utc)
+    stale = now - timedelta(seconds=JOB_LEASE_SECONDS)
+    failed = {'status': 'failed', 'error': 'Job abandoned by its worker', 'finishedAt': now}
+    if jobs_collection is None:
+        with _fallback_jobs_lock:
+            for job in _fallback_jobs.values():
+                if (job['status'] == 'running' and job['heartbeatAt'] <= stale
+                        and job['attempts'] >= JOB_MAX_ATTEMPTS):
+                    job.update(failed)
+                    job.pop('activeKey', None)
+        return
+    jobs_collection.update_many(
+        {'status': 'running', 'heartbeatAt': {'$lte': stale}, 'attempts': {'$gte': JOB_MAX_ATTEMPTS}},
+        {'$set': failed, '$unset': {'activeKey': ''}}
+    )
+
+def run_pending_jobs(limit=None, deadline=None):
+    """Run queued and abandoned jobs in this request, oldest first. Returns the job ids run.
+
+    No job is started after deadline, and resumable ones stop at it (see run_job).
+    """
+    fail_abandoned_jobs()
+    ran = []
+    while limit is None or len(ran) < limit:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        job_id = run_job(deadline=deadline)
+        if job_id is None:
+            break
+        ran.append(job_id)
+    return ran
+
+def convert_job_for_api(job):
+    """Convert a job document to API format"""
+    api_job = {key: value for key, value in job.items() if key not in ('_id', 'owner', 'activeKey', 'checkpoint')}
+    api_job['id'] = job['_id']
+    for key in ('createdAt', 'startedAt', 'heartbeatAt', 'finishedAt'):
+        if api_job.get(key):
+            api_job[key] = parse_timestamp(api_job[key]).isoformat()
+    return api_job
+
+def job_accepted_response(job, created):
+    """202 Accepted for an enqueued job, pointing at its status endpoint"""
+    status_url = f"/backend/api/admin/jobs/{job['_id']}"
+    response = jsonify({
+        'success': True,
+        'message': 'Job queued' if created else 'Job already in progress',
+        'jobId': job['_id'],
+        'status': job['status'],
+        'statusUrl': status_url
+    })
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+@job_handler('ical.sync_all', resumable=True)
+def sync_all_ical_job(params, progress, checkpoint, deadline):
+    """Sync every room's iCal feed; per-room results go into the job result
+
+    Feeds are fetched concurrently (see iCal Feed Sync). With a deadline the
+    rooms go in groups of ICAL_SYNC_MAX_WORKERS, each group's results are
+    checkpointed, and rooms already in the checkpoint are not synced again.
+    Two sync-alls never run at once: the job's activeKey makes them share it.
+    """
+    results = list((checkpoint or {}).get('results', []))
+    done = {result['roomId'] for result in results}
+    rooms = [room for room in load_ical_rooms() if str(room['_id']) not in done]
+    progress(total=len(done) + len(rooms))
+    group_size = ICAL_SYNC_MAX_WORKERS if deadline is not None else max(1, len(rooms))
+    for start in range(0, len(rooms), group_size):
+        # Every run syncs at least one group, so the job always moves on
+        if start and deadline is not None and time.monotonic() >= deadline:
+            return False, {'results': results}
+        group = rooms[start:start + group_size]
+        group_results = sync_ical_feeds(group, on_room_done=lambda room: progress(1),
+                                        force=params.get('force', False))
+        record_ical_sync_results(group, group_results)
+        results += group_results
+        progress(checkpoint={'results': results})
+    
+    total_synced = sum(r.get('syncedCount', 0) for r in results if r.get('success'))
+    total_removed = sum(r.get('removedCount', 0) for r in results if r.get('success'))
+    successful_rooms = sum(1 for r in results if r.get('success'))
+    unchanged_rooms = sum(1 for r in results if r.get('unchanged'))
+    return True, {
+        'success': True,
+        'message': (f'Synced {successful_rooms} rooms ({unchanged_rooms} unchanged), '
+                    f'{total_synced} total new bookings, {total_removed} cancelled'),
+        'results': results,
+        'lastSync': datetime.now().isoformat()
+    }
+
+@job_handler('bookings.archive')
+def archive_bookings_job(params, progress):
+    """Move past bookings to bookings_archive"""
+    after_days = params.get('afterDays', BOOKING_ARCHIVE_AFTER_DAYS)
+    archived, rooms_touched = archive_past_bookings(after_days)
+    return {
+        'message': f'Archived {archived} bookings from {rooms_touched} rooms',
+        'bookingsArchived': archived,
+        'roomsTouched': rooms_touched,
+        'cutoff': booking_archive_cutoff(after_days)
+    }
+
+@job_handler('bookings.migrate')
+def migrate_bookings_job(params, progress):
+    """Move embedded bookedIntervals into the bookings collection"""
+    rooms_migrated, bookings_moved = migrate_embedded_bookings()
+    return {
+        'message': f'Moved {bookings_moved} bookings from {rooms_migrated} rooms',
+        'roomsMigrated': rooms_migrated,
+        'bookingsMoved': bookings_moved
+    }
+
+@job_handler('calendar.rebuild')
+def rebuild_calendar_job(params, progress):
+    """Recount the occupancy grid from the stored bookings"""
+    counted = rebuild_occupancy()
+    room_catalog_changed()
+    return {
+        'message': f'Rebuilt occupancy from {counted} bookings',
+        'bookingsCounted': counted
+    }
+
+# ===== Startup Maintenance =====
+# Only cheap, idempotent index creation runs at import. Data maintenance
+# (moving embedded bookings, archiving, building occupancy) runs from the cron
+# endpoint and the local server's startup, see run_booking_maintenance().
+if bookings_collection is not None:
+    try:
+        bookings_collection.create_index([('roomId', 1), ('checkIn', 1), ('checkOut', 1)])
+        bookings_collection.create_index('icalUid', sparse=True)
+        # Month calendar lookups: bookings checking out after the month starts
+        bookings_collection.create_index([('checkOut', 1), ('checkIn', 1)])
+        print("✓ Booking indexes ensured")
+    except Exception as e:
+        print(f"⚠️ Could not create booking indexes: {e}")
+
+if bookings_archive_collection is not None:
+    try:
+        bookings_archive_collection.create_index([('roomId', 1), ('checkIn', 1), ('checkOut', 1)])
+    except Exception as e:
+        print(f"⚠️ Could not create booking archive index: {e}")
+
+if ical_sync_state_collection is not None:
+    try:
+        ical_sync_state_collection.create_index('nextRunAt')
+    except Exception as e:
+        print(f"⚠️ Could not create iCal sync state index: {e}")
+
+if jobs_collection is not None:
+    try:
+        jobs_collection.create_index([('status', 1), ('createdAt', 1)])
+        # One queued or running job per type and params (see Background Jobs)
+        jobs_collection.create_index('activeKey', unique=True, partialFilterExpression={'activeKey': {'$exists': True}})
+        jobs_collection.create_index('finishedAt', expireAfterSeconds=JOB_RETENTION_DAYS * 24 * 3600)
+    except Exception as e:
+        print(f"⚠️ Could not create job indexes: {e}")
+
+if tombstones_collection is not None:
+    try:
+        tombstones_collection.create_index(
+            'deleted_at',
+            expireAfterSeconds=ROOM_TOMBSTONE_RETENTION_DAYS * 24 * 3600
+        )
+    except Exception as e:
+        print(f"⚠️ Could not create room tombstone index: {e}")
+
+if occupancy_collection is not None:
+    try:
+        occupancy_collection.create_index('month')
+    except Exception as e:
+        print(f"⚠️ Could not create room occupancy index: {e}")
+
+# Sync MongoDB data to local JSON file for backup/fallback (skip on Vercel - read-only)
+if rooms_collection is not None and not IS_VERCEL:
+    try:
+        synced_rooms = write_rooms_snapshot()
+        print(f"✓ Synced {synced_rooms} rooms to rooms_data.json")
+    except Exception as sync_error:
+        print(f"⚠️  Could not sync to JSON: {sync_error}")
+
 # ===== Authentication API Endpoints =====
 
 @app.route('/backend/api/auth/login', methods=['POST'])
@@ -434,6 +3718,7 @@ def change_password():
             {'username': username},
             {'$set': {'password_hash': new_hash, 'updated_at': datetime.now(timezone.utc)}}
         )
+        bump_meta_version_safely(USERS_META_ID)
         
         return jsonify({
             'success': True,
@@ -452,17 +3737,22 @@ def get_users():
         if users_collection is None:
             return jsonify({'success': False, 'error': 'Service unavailable'}), 503
         
+        etag = version_etag('users', get_meta_version(USERS_META_ID))
+        if request_is_fresh(etag):
+            return not_modified_response(etag, private=True)
+        
         users = list(users_collection.find({}, {'password_hash': 0}))  # Exclude password hash
         
         # Convert ObjectId to string
         for user in users:
             user['_id'] = str(user['_id'])
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': users,
             'count': len(users)
-        }), 200
+        })
+        return with_validators(response, etag, private=True), 200
         
     except Exception as e:
         print(f"Get users error: {e}")
@@ -515,6 +3805,7 @@ def create_user():
         }
         
         result = users_collection.insert_one(new_user)
+        bump_meta_version_safely(USERS_META_ID)
         
         return jsonify({
             'success': True,
@@ -552,6 +3843,7 @@ def delete_user(user_id):
         
         if result.deleted_count == 0:
             return jsonify({'success': False, 'error': 'User not found'}), 404
+        bump_meta_version_safely(USERS_META_ID)
         
         return jsonify({
             'success': True,
@@ -610,6 +3902,7 @@ def update_user(user_id):
             {'_id': user_id_obj},
             {'$set': update_data}
         )
+        bump_meta_version_safely(USERS_META_ID)
         
         # Fetch updated user
         updated_user = users_collection.find_one({'_id': user_id_obj})
@@ -672,6 +3965,7 @@ def admin_change_user_password(user_id):
                 {'_id': user_id},
                 {'$set': {'password_hash': new_hash, 'updated_at': datetime.now(timezone.utc)}}
             )
+        bump_meta_version_safely(USERS_META_ID)
         
         return jsonify({
             'success': True,
@@ -692,17 +3986,22 @@ def get_all_transactions():
         if finance_collection is None:
             return jsonify({'success': False, 'error': 'Service unavailable'}), 503
         
+        etag = version_etag('finance', get_meta_version(FINANCE_META_ID))
+        if request_is_fresh(etag):
+            return not_modified_response(etag, private=True)
+        
         transactions = list(finance_collection.find().sort('date', -1))
         
         # Convert ObjectId to string
         for transaction in transactions:
             transaction['_id'] = str(transaction['_id'])
         
-        return jsonify({
+        response = jsonify({
             'success': True,
             'data': transactions,
             'count': len(transactions)
-        }), 200
+        })
+        return with_validators(response, etag, private=True), 200
         
     except Exception as e:
         print(f"Get transactions error: {e}")
@@ -754,6 +4053,8 @@ def create_transaction():
         }
         
         result = finance_collection.insert_one(new_transaction)
+        bump_meta_version_safely(FINANCE_META_ID)
+        publish_event('transaction.created', transactionId=str(result.inserted_id))
         
         return jsonify({
             'success': True,
@@ -831,6 +4132,8 @@ def update_transaction(transaction_id):
             {'_id': transaction_id_obj},
             {'$set': update_data}
         )
+        bump_meta_version_safely(FINANCE_META_ID)
+        publish_event('transaction.updated', transactionId=str(transaction_id_obj))
         
         return jsonify({
             'success': True,
@@ -857,6 +4160,8 @@ def delete_transaction(transaction_id):
         
         if result.deleted_count == 0:
             return jsonify({'success': False, 'error': 'Transaction not found'}), 404
+        bump_meta_version_safely(FINANCE_META_ID)
+        publish_event('transaction.deleted', transactionId=transaction_id)
         
         return jsonify({
             'success': True,
@@ -867,6 +4172,78 @@ def delete_transaction(transaction_id):
         print(f"Delete transaction error: {e}")
         return jsonify({'success': False, 'error': 'Failed to delete transaction'}), 500
 
+# ===== Event Stream Endpoint =====
+
+@app.route('/backend/api/events/token', methods=['POST'])
+@token_required
+def create_event_stream_token():
+    """Short-lived token for opening the event stream (EventSource URLs can't carry headers)"""
+    if not EVENT_STREAM_ENABLED:
+        # Dashboards poll for changes instead
+        return jsonify({'success': True, 'enabled': False}), 200
+    return jsonify({
+        'success': True,
+        'enabled': True,
+        'token': generate_event_stream_token(request.current_user),
+        'expiresIn': EVENT_STREAM_TOKEN_SECONDS
+    }), 200
+
+@app.route('/backend/api/events', methods=['GET'])
+def stream_events():
+    """Server-Sent Events stream of room, booking and finance changes.
+
+    Requires a login token as a Bearer header, or a stream token from
+    POST /backend/api/events/token as ?token= (EventSource cannot send
+    headers); login tokens are not accepted in the URL. Reconnecting clients
+    send Last-Event-ID; when those events can no longer be replayed a 'reset'
+    event tells them to refresh their data instead.
+    """
+    if not EVENT_STREAM_ENABLED:
+        return jsonify({'success': False, 'error': 'Live updates are disabled on this deployment'}), 503
+    
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        token, scope = auth_header[7:], None
+    else:
+        token, scope = request.args.get('token', ''), 'events'
+    if not token:
+        return jsonify({'success': False, 'error': 'Authentication token required'}), 401
+    if not verify_token(token, scope):
+        return jsonify({'success': False, 'error': 'Invalid or expired token'}), 401
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    subscriber = subscribe_events()
+
+    def generate():
+        try:
+            yield 'retry: 3000\n\n'
+            sent_ids = set()
+            if last_event_id:
+                missed = events_after(last_event_id)
+                if missed is None:
+                    yield 'event: reset\ndata: {"type": "reset"}\n\n'
+                else:
+                    for event in missed:
+                        sent_ids.add(event['id'])
+                        yield format_sse(event)
+
+            deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = subscriber.get(timeout=EVENT_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ': keep-alive\n\n'
+                    continue
+                if event['id'] not in sent_ids:  # Already sent as part of the replay
+                    yield format_sse(event)
+        finally:
+            unsubscribe_events(subscriber)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'  # Don't let proxies buffer the stream
+    })
+
 # ===== Root & Info Endpoints =====
 
 @app.route('/', methods=['GET'])
@@ -884,28 +4261,147 @@ def root():
 
 # ===== Room API Endpoints =====
 
-@app.route('/backend/api/admin/rooms', methods=['GET'])
-def get_all_rooms():
-    """Fetch all rooms from MongoDB or fallback JSON"""
+@app.route('/backend/api/admin/availability', methods=['GET'])
+def get_availability():
+    """List rooms that are free for a date range (?checkIn=&checkOut=&guests=)"""
     try:
-        if rooms_collection is None:
-            # Use fallback JSON data
-            api_rooms = [convert_room_for_api(room) for room in fallback_rooms]
+        check_in = request.args.get('checkIn', '')
+        check_out = request.args.get('checkOut', '')
+        try:
+            datetime.strptime(check_in, '%Y-%m-%d')
+            datetime.strptime(check_out, '%Y-%m-%d')
+        except ValueError:
             return jsonify({
-                'success': True,
-                'data': api_rooms,
-                'count': len(api_rooms),
-                'source': 'fallback'
-            }), 200
+                'success': False,
+                'error': 'checkIn and checkOut must be dates in YYYY-MM-DD format'
+            }), 400
+        
+        if check_out <= check_in:
+            return jsonify({
+                'success': False,
+                'error': 'checkOut must be after checkIn'
+            }), 400
+        
+        guests = 0
+        if request.args.get('guests'):
+            try:
+                guests = int(request.args['guests'])
+            except ValueError:
+                return jsonify({
+                    'success': False,
+                    'error': 'guests must be an integer'
+                }), 400
+        
+        etag = version_etag('rooms', peek_catalog_version())
+        if request_is_fresh(etag):
+            return not_modified_response(etag)
+        
+        available = [
+            summary for summary, index in get_availability_index()
+            if summary.get('capacity', 0) >= guests
+            and not interval_index_overlaps(index, check_in, check_out)
+        ]
+        
+        response = jsonify({
+            'success': True,
+            'data': available,
+            'count': len(available),
+            'checkIn': check_in,
+            'checkOut': check_out,
+            'guests': guests
+        })
+        return with_validators(response, etag), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/calendar', methods=['GET'])
+def get_calendar():
+    """Month occupancy grid for all rooms (?month=YYYY-MM, optional &include=bookings)
+
+    Each room carries a bitmap with one '0'/'1' character per day of the month
+    ('1' = the night is booked). include=bookings adds the bookings overlapping
+    the month, for drawing and editing them.
+    """
+    try:
+        month = request.args.get('month') or datetime.now().strftime('%Y-%m')
+        try:
+            month_start = datetime.strptime(month, '%Y-%m').date()
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'month must be in YYYY-MM format'
+            }), 400
+        month = month_start.strftime('%Y-%m')
+        days_in_month = calendar.monthrange(month_start.year, month_start.month)[1]
+        next_month = (month_start + timedelta(days=days_in_month)).strftime('%Y-%m-%d')
+        include_bookings = 'bookings' in (request.args.get('include') or '').split(',')
+        
+        version, api_rooms = get_cached_room_catalog(ROOM_SUMMARY_FIELDS)
+        # Without ?month= the content follows the current month, so it is part of the tag
+        etag = version_etag(f"calendar-{month}{'-bookings' if include_bookings else ''}", version)
+        if request_is_fresh(etag):
+            return not_modified_response(etag)
+        
+        bitmaps = month_occupancy(month, days_in_month)
+        if include_bookings:
+            month_bookings = find_bookings_in_window(month_start.strftime('%Y-%m-%d'), next_month)
+        
+        empty_bitmap = '0' * days_in_month
+        grid = []
+        for api_room in api_rooms:
+            entry = {
+                'id': api_room.get('id'),
+                'room_id': api_room.get('room_id'),
+                'name': api_room.get('name'),
+                'bitmap': bitmaps.get(api_room.get('id'), empty_bitmap)
+            }
+            entry['bookedNights'] = entry['bitmap'].count('1')
+            if include_bookings:
+                entry['bookings'] = month_bookings.get(api_room.get('id'), [])
+            grid.append(entry)
         
-        rooms = list(rooms_collection.find())
-        api_rooms = [convert_room_for_api(room) for room in rooms]
+        response = jsonify({
+            'success': True,
+            'month': month,
+            'daysInMonth': days_in_month,
+            'data': grid,
+            'count': len(grid)
+        })
+        return with_validators(response, etag), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/calendar/rebuild', methods=['POST'])
+@admin_required
+def rebuild_calendar():
+    """Recount the occupancy grid from the stored bookings, as a background job - Admin only"""
+    try:
+        if occupancy_collection is None:
+            return jsonify({'success': False, 'error': 'Service unavailable'}), 503
         
+        job, created = enqueue_job('calendar.rebuild', created_by=request.current_user.get('username'))
+        return job_accepted_response(job, created)
+    except Exception as e:
+        print(f"Rebuild calendar error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Report room fragment cache hits and misses - Admin only"""
+    try:
         return jsonify({
             'success': True,
-            'data': api_rooms,
-            'count': len(api_rooms),
-            'source': 'mongodb'
+            'roomFragments': room_fragment_stats()
         }), 200
     except Exception as e:
         return jsonify({
@@ -913,38 +4409,122 @@ def get_all_rooms():
             'error': str(e)
         }), 500
 
+@app.route('/backend/api/admin/rooms', methods=['GET'])
+def get_all_rooms():
+    """Fetch all rooms from MongoDB or fallback JSON
+
+    Returns the summary shape by default; use ?include=bookings,images,details
+    (or all) to add field groups, or ?fields=a,b,c for an explicit field list.
+    Filtering (minCapacity, maxCapacity, minPrice, maxPrice, promotion=active|inactive),
+    sorting (sort=room_id|name|price_asc|price_desc|capacity_asc|capacity_desc)
+    and paging (limit, cursor) switch to an indexed, keyset-paginated query.
+    ?since=<syncToken> returns only rooms changed since the token was issued,
+    plus the ids of deleted rooms.
+    """
+    try:
+        try:
+            fields = parse_room_fields(request.args.get('fields'), request.args.get('include'))
+            list_query = parse_room_list_query(request.args) if is_room_list_query(request.args) else None
+            since_token = request.args.get('since')
+            if since_token is not None:
+                if list_query is not None:
+                    raise ValueError('since cannot be combined with filters, sorting or paging')
+                since, token_version = decode_sync_token(since_token)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        # Answer revalidations from the catalog version alone
+        version = peek_catalog_version()
+        etag = version_etag('rooms', version)
+        if request_is_fresh(etag):
+            return not_modified_response(etag)
+        
+        if since_token is not None:
+            if token_version == etag:
+                # Nothing changed since the token was issued
+                changed, deleted, full = [], [], False
+                sync_token = since_token
+            elif since < datetime.now(timezone.utc) - timedelta(days=ROOM_TOMBSTONE_RETENTION_DAYS):
+                # Tombstones this old are gone - the client must replace its list
+                sync_token = new_sync_token(version)
+                version, changed = get_cached_room_catalog(fields)
+                deleted, full = [], True
+            else:
+                sync_token = new_sync_token(version)
+                changed, deleted = query_room_changes(since, fields)
+                full = False
+            response = jsonify({
+                'success': True,
+                'data': changed,
+                'deleted': deleted,
+                'count': len(changed),
+                'full': full,
+                'syncToken': sync_token,
+                'source': 'fallback' if rooms_collection is None else 'mongodb'
+            })
+            return with_validators(response, etag), 200
+        
+        if list_query is not None:
+            api_rooms, next_cursor = query_room_page(list_query, fields)
+            response = jsonify({
+                'success': True,
+                'data': api_rooms,
+                'count': len(api_rooms),
+                'nextCursor': next_cursor,
+                'source': 'fallback' if rooms_collection is None else 'mongodb'
+            })
+            return with_validators(response, etag), 200
+        
+        # Served from the in-process catalog cache (see get_cached_room_catalog)
+        # and assembled from pre-serialized room fragments
+        sync_token = new_sync_token(version)
+        version, api_rooms = get_cached_room_catalog(fields)
+        
+        response = json_envelope_response(
+            b'[' + b','.join(room_fragments(api_rooms, fields)) + b']',
+            count=len(api_rooms),
+            syncToken=sync_token,
+            source='fallback' if rooms_collection is None else 'mongodb'
+        )
+        return with_validators(response, version_etag('rooms', version)), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/backend/api/admin/rooms/<room_id>', methods=['GET'])
 def get_room(room_id):
-    """Fetch a specific room by ID"""
+    """Fetch a specific room by ID
+
+    The ETag follows the room catalog version, so a revalidation is answered
+    without reading the room. Otherwise the room is read and served from its
+    fragment (see Room Response Fragments); its bookings are only loaded and
+    serialized when the room changed since the fragment was rendered.
+    """
     try:
-        room = None
-        
-        if rooms_collection is None:
-            # Search in fallback data
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
-        else:
-            # Try to find by _id as string first
-            room = rooms_collection.find_one({'_id': room_id})
-            
-            # If not found, try as ObjectId
-            if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                except:
-                    pass
+        version = peek_catalog_version()
+        etag = version_etag(f'room-{room_id}', version)
+        if request.if_none_match and request_is_fresh(etag):
+            return not_modified_response(etag)
         
+        room = resolve_room(room_id)
         if not room:
             return jsonify({
                 'success': False,
                 'error': 'Room not found'
             }), 404
         
-        api_room = convert_room_for_api(room)
-        return jsonify({
-            'success': True,
-            'data': api_room
-        }), 200
+        last_modified = parse_timestamp(room.get('updated_at'))
+        if request_is_fresh(etag, last_modified):
+            return not_modified_response(etag, last_modified)
+        
+        fragment = room_fragment(room_stamp(room), lambda: convert_room_for_api(attach_bookings([room])[0]))
+        response = json_envelope_response(fragment)
+        return with_validators(response, etag, last_modified), 200
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1009,7 +4589,7 @@ def add_room():
                         'error': f'Room with ID {custom_id} already exists'
                     }), 400
             else:
-                new_room['_id'] = ObjectId()
+                new_room['_id'] = str(ObjectId())  # Room _ids are stored as strings
             
             # Use ReplaceOne with upsert=True for MongoDB
             operations = [ReplaceOne({'_id': new_room['_id']}, new_room, upsert=True)]
@@ -1019,6 +4599,9 @@ def add_room():
             
             api_room = convert_room_for_api(new_room.copy())
         
+        clear_room_tombstone(new_room['_id'])
+        room_catalog_changed(new_room['_id'])
+        
         return jsonify({
             'success': True,
             'message': 'Room added successfully',
@@ -1038,7 +4621,7 @@ def update_room(room_id):
         
         if rooms_collection is None:
             # Update in fallback data
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
@@ -1058,22 +4641,14 @@ def update_room(room_id):
             
             api_room = convert_room_for_api(room.copy())
         else:
-            # Find existing room first (try string _id, then ObjectId)
-            existing_room = rooms_collection.find_one({'_id': room_id})
-            if not existing_room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    existing_room = rooms_collection.find_one({'_id': obj_id})
-                    if existing_room:
-                        room_id = obj_id  # Use ObjectId for upsert
-                except:
-                    pass
-            
+            # Find existing room first
+            existing_room = resolve_room(room_id)
             if not existing_room:
                 return jsonify({
                     'success': False,
                     'error': 'Room not found'
                 }), 404
+            room_id = existing_room['_id']  # Stored _id for the upsert
             
             # Prepare full document for upsert
             updated_room = existing_room.copy()
@@ -1103,6 +4678,8 @@ def update_room(room_id):
             
             api_room = convert_room_for_api(updated_room.copy())
         
+        room_catalog_changed(room_id)
+        
         return jsonify({
             'success': True,
             'message': 'Room updated successfully',
@@ -1175,31 +4752,26 @@ def upload_room_image(room_id):
 
         # Update room document
         if rooms_collection is None:
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
             room['imageUrl'] = image_url
             room['updated_at'] = datetime.now().isoformat()
-            with open(json_file_path, 'w') as f:
-                json.dump(fallback_rooms, f, indent=2)
+            save_fallback_rooms()
         else:
-            # Try to update by string id or ObjectId
-            filter_id = {'_id': room_id}
-            room = rooms_collection.find_one(filter_id)
+            room = resolve_room(room_id, {'_id': 1})
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    filter_id = {'_id': obj_id}
-                except:
-                    pass
+                return jsonify({'success': False, 'error': 'Room not found'}), 404
 
-            result = rooms_collection.update_one(filter_id, {
+            result = rooms_collection.update_one({'_id': room['_id']}, {
                 '$set': {'imageUrl': image_url, 'updated_at': datetime.now(timezone.utc)}
             })
 
             if result.matched_count == 0:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
 
+        room_catalog_changed(room['_id'])
+
         return jsonify({'success': True, 'message': 'Image uploaded', 'imageUrl': image_url}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1212,20 +4784,14 @@ def delete_room_image(room_id):
         # Find room
         target_room = None
         if rooms_collection is None:
-            target_room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            target_room = resolve_room(room_id)
             if not target_room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
         else:
-            target_room = rooms_collection.find_one({'_id': room_id})
+            target_room = resolve_room(room_id)
             if not target_room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    target_room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({'success': False, 'error': 'Room not found'}), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({'success': False, 'error': 'Room not found'}), 404
+            room_id_filter = {'_id': target_room['_id']}
 
         # Determine image path
         image_url = target_room.get('imageUrl') if target_room else None
@@ -1247,13 +4813,14 @@ def delete_room_image(room_id):
         if rooms_collection is None:
             target_room.pop('imageUrl', None)
             target_room['updated_at'] = datetime.now().isoformat()
-            with open(json_file_path, 'w') as f:
-                json.dump(fallback_rooms, f, indent=2)
+            save_fallback_rooms()
         else:
             result = rooms_collection.update_one(room_id_filter, {'$unset': {'imageUrl': ''}, '$set': {'updated_at': datetime.now(timezone.utc)}})
             if result.matched_count == 0:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
 
+        room_catalog_changed(target_room['_id'])
+
         return jsonify({'success': True, 'message': 'Image deleted'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1336,7 +4903,7 @@ def upload_room_image_multi(room_id):
 
         # Update room document - add to images array
         if rooms_collection is None:
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
             
@@ -1347,22 +4914,12 @@ def upload_room_image_multi(room_id):
             room['images'][category].append(image_url)
             room['updated_at'] = datetime.now().isoformat()
             
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(fallback_rooms, f, indent=2, ensure_ascii=False)
+            save_fallback_rooms()
         else:
-            # Try to find room
-            filter_id = {'_id': room_id}
-            room = rooms_collection.find_one(filter_id)
-            if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    filter_id = {'_id': obj_id}
-                    room = rooms_collection.find_one(filter_id)
-                except:
-                    pass
-            
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
+            filter_id = {'_id': room['_id']}
 
             # Use $push to atomically add to array (avoids race conditions)
             push_field = f'images.{category}'
@@ -1386,6 +4943,8 @@ def upload_room_image_multi(room_id):
             if result.matched_count == 0:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
 
+        room_catalog_changed(room['_id'])
+
         return jsonify({
             'success': True, 
             'message': 'Image uploaded', 
@@ -1414,7 +4973,7 @@ def reorder_room_images(room_id):
         print(f"🔄 Reordering {category} images for room {room_id}: {len(new_order)} images")
         
         if rooms_collection is None:
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
             
@@ -1423,21 +4982,12 @@ def reorder_room_images(room_id):
             room['images'][category] = new_order
             room['updated_at'] = datetime.now().isoformat()
             
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(fallback_rooms, f, indent=2, ensure_ascii=False)
+            save_fallback_rooms()
         else:
-            filter_id = {'_id': room_id}
-            room = rooms_collection.find_one(filter_id)
-            if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    filter_id = {'_id': obj_id}
-                    room = rooms_collection.find_one(filter_id)
-                except:
-                    pass
-            
+            room = resolve_room(room_id, {'_id': 1})
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
+            filter_id = {'_id': room['_id']}
 
             result = rooms_collection.update_one(filter_id, {
                 '$set': {f'images.{category}': new_order, 'updated_at': datetime.now(timezone.utc)}
@@ -1446,6 +4996,7 @@ def reorder_room_images(room_id):
             if result.matched_count == 0:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
 
+        room_catalog_changed(room['_id'])
         print(f"✓ Images reordered successfully")
         return jsonify({'success': True, 'message': 'Images reordered'}), 200
     except Exception as e:
@@ -1467,18 +5018,13 @@ def delete_room_image_multi(room_id, image_id):
         filter_id = {'_id': room_id}
         
         if rooms_collection is None:
-            target_room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            target_room = resolve_room(room_id)
             if not target_room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
         else:
-            target_room = rooms_collection.find_one(filter_id)
-            if not target_room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    filter_id = {'_id': obj_id}
-                    target_room = rooms_collection.find_one(filter_id)
-                except:
-                    return jsonify({'success': False, 'error': 'Room not found'}), 404
+            target_room = resolve_room(room_id)
+            if target_room:
+                filter_id = {'_id': target_room['_id']}
 
         if not target_room:
             return jsonify({'success': False, 'error': 'Room not found'}), 404
@@ -1539,13 +5085,14 @@ def delete_room_image_multi(room_id, image_id):
         if rooms_collection is None:
             target_room['images'] = images
             target_room['updated_at'] = datetime.now().isoformat()
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(fallback_rooms, f, indent=2, ensure_ascii=False)
+            save_fallback_rooms()
         else:
             rooms_collection.update_one(filter_id, {
                 '$set': {'images': images, 'updated_at': datetime.now(timezone.utc)}
             })
 
+        room_catalog_changed(target_room['_id'])
+
         return jsonify({'success': True, 'message': 'Image deleted'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1567,7 +5114,7 @@ def update_room_images_order(room_id):
         new_image_url = images.get('cover', [None])[0] if images.get('cover') else None
         
         if rooms_collection is None:
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
             
@@ -1579,17 +5126,12 @@ def update_room_images_order(room_id):
                 room.pop('imageUrl', None)  # Remove legacy field if no cover
             room['updated_at'] = datetime.now().isoformat()
             
-            with open(json_file_path, 'w', encoding='utf-8') as f:
-                json.dump(fallback_rooms, f, indent=2, ensure_ascii=False)
+            save_fallback_rooms()
         else:
-            filter_id = {'_id': room_id}
-            room = rooms_collection.find_one(filter_id)
+            room = resolve_room(room_id, {'_id': 1})
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    filter_id = {'_id': obj_id}
-                except:
-                    return jsonify({'success': False, 'error': 'Room not found'}), 404
+                return jsonify({'success': False, 'error': 'Room not found'}), 404
+            filter_id = {'_id': room['_id']}
 
             # Build update operation - sync imageUrl with first cover
             update_fields = {
@@ -1609,6 +5151,8 @@ def update_room_images_order(room_id):
             if result.matched_count == 0:
                 return jsonify({'success': False, 'error': 'Room not found'}), 404
 
+        room_catalog_changed(room['_id'])
+
         return jsonify({'success': True, 'message': 'Images order updated'}), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
@@ -1630,22 +5174,25 @@ def delete_room(room_id):
                     'error': 'Room not found'
                 }), 404
         else:
-            # Try to delete by _id as string first
-            result = rooms_collection.delete_one({'_id': room_id})
+            room = resolve_room(room_id, {'_id': 1})
+            result = rooms_collection.delete_one({'_id': room['_id']}) if room else None
             
-            # If not found, try as ObjectId
-            if result.deleted_count == 0:
-                try:
-                    obj_id = ObjectId(room_id)
-                    result = rooms_collection.delete_one({'_id': obj_id})
-                except:
-                    pass
-            
-            if result.deleted_count == 0:
+            if result is None or result.deleted_count == 0:
                 return jsonify({
                     'success': False,
                     'error': 'Room not found'
                 }), 404
+            
+            room_id = room['_id']
+            if bookings_collection is not None:
+                bookings_collection.delete_many({'roomId': room_id})
+            if bookings_archive_collection is not None:
+                bookings_archive_collection.delete_many({'roomId': room_id})
+            if occupancy_collection is not None:
+                occupancy_collection.delete_many({'roomId': room_id})
+        
+        record_room_tombstone(room_id)
+        room_catalog_changed(room_id, deleted=True)
         
         return jsonify({
             'success': True,
@@ -1657,8 +5204,201 @@ def delete_room(room_id):
             'error': str(e)
         }), 500
 
-# ===== Booking API Endpoints =====
-
+@app.route('/backend/api/admin/rooms/normalize-ids', methods=['POST'])
+@admin_required
+def normalize_rooms():
+    """Rewrite legacy ObjectId room ids as strings - Admin only"""
+    try:
+        if rooms_collection is None:
+            return jsonify({'success': False, 'error': 'Service unavailable'}), 503
+
+        migrated = normalize_room_ids()
+        return jsonify({
+            'success': True,
+            'message': f'Normalized {migrated} room ids',
+            'roomsMigrated': migrated
+        }), 200
+    except Exception as e:
+        print(f"Normalize room ids error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ===== Booking API Endpoints =====
+
+@app.route('/backend/api/admin/rooms/<room_id>/bookings', methods=['GET'])
+def get_room_bookings(room_id):
+    """List a room's bookings overlapping an optional ?from=&to= date window
+
+    ?archived=include adds archived bookings, ?archived=only returns just those.
+    """
+    try:
+        window_start = request.args.get('from') or None
+        window_end = request.args.get('to') or None
+        archived = request.args.get('archived', 'exclude')
+        if archived not in ('exclude', 'include', 'only'):
+            return jsonify({
+                'success': False,
+                'error': 'archived must be exclude, include or only'
+            }), 400
+        
+        if rooms_collection is None:
+            room = resolve_room(room_id)
+            if not room:
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            bookings = [
+                interval for interval in room.get('bookedIntervals', [])
+                if (not window_end or interval.get('checkIn', '') < window_end)
+                and (not window_start or interval.get('checkOut', '') > window_start)
+            ]
+        else:
+            room = resolve_room(room_id, {'bookedIntervals': 1})
+            if not room:
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            # Not-yet-migrated embedded entries are filtered in Python
+            legacy = [
+                interval for interval in room.get('bookedIntervals') or []
+                if (not window_end or interval.get('checkIn', '') < window_end)
+                and (not window_start or interval.get('checkOut', '') > window_start)
+            ]
+            bookings = []
+            if archived != 'exclude':
+                bookings += find_archived_bookings(room['_id'], window_start, window_end)
+            if archived != 'only':
+                bookings += legacy + find_room_bookings(room['_id'], window_start, window_end)
+        
+        return jsonify({
+            'success': True,
+            'data': bookings,
+            'count': len(bookings)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/bookings/migrate', methods=['POST'])
+@admin_required
+def migrate_bookings():
+    """Move any embedded bookedIntervals into the bookings collection, as a background job - Admin only"""
+    try:
+        if bookings_collection is None:
+            return jsonify({'success': False, 'error': 'Service unavailable'}), 503
+        
+        job, created = enqueue_job('bookings.migrate', created_by=request.current_user.get('username'))
+        return job_accepted_response(job, created)
+    except Exception as e:
+        print(f"Migrate bookings error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/bookings/archive', methods=['POST'])
+@admin_required
+def archive_bookings():
+    """Move bookings that checked out before the archive horizon to bookings_archive - Admin only
+
+    Body (optional): {"afterDays": 90} overrides BOOKING_ARCHIVE_AFTER_DAYS.
+    Runs as a background job; the counts are in the job's result.
+    """
+    try:
+        if bookings_archive_collection is None:
+            return jsonify({'success': False, 'error': 'Service unavailable'}), 503
+        
+        data = request.get_json(silent=True) or {}
+        after_days = data.get('afterDays', BOOKING_ARCHIVE_AFTER_DAYS)
+        if not isinstance(after_days, int) or isinstance(after_days, bool) or after_days < 0:
+            return jsonify({
+                'success': False,
+                'error': 'afterDays must be a non-negative integer'
+            }), 400
+        
+        job, created = enqueue_job('bookings.archive', {'afterDays': after_days},
+                                   created_by=request.current_user.get('username'))
+        return job_accepted_response(job, created)
+    except Exception as e:
+        print(f"Archive bookings error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/bookings/batch', methods=['POST'])
+@token_required
+def batch_bookings():
+    """Create, cancel and update many bookings across rooms in one request.
+
+    Body: {"operations": [{"op": "create"|"cancel"|"update", "roomId", "checkIn",
+    "checkOut", "guestName", ...}], "atomic": false}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        atomic = bool(data.get('atomic', False))
+
+        if not isinstance(operations, list) or not operations:
+            return jsonify({
+                'success': False,
+                'error': 'operations must be a non-empty list'
+            }), 400
+        if len(operations) > BOOKING_BATCH_MAX_OPERATIONS:
+            return jsonify({
+                'success': False,
+                'error': f'At most {BOOKING_BATCH_MAX_OPERATIONS} operations per batch'
+            }), 400
+
+        results, changed_rooms = apply_booking_batch(operations, atomic=atomic)
+        applied = bool(changed_rooms)
+        succeeded = sum(1 for result in results if result['success'])
+
+        if applied:
+            event_types = {'create': 'booking.added', 'cancel': 'booking.removed', 'update': 'booking.updated'}
+            for result in results:
+                if result['success']:
+                    operation = operations[result['index']]
+                    publish_event(
+                        event_types[result['op']], roomId=result['roomId'], bookingId=result.get('bookingId'),
+                        checkIn=operation['checkIn'], checkOut=operation['checkOut']
+                    )
+            room_catalog_changed(changed_rooms[0] if len(changed_rooms) == 1 else None)
+
+        if atomic and not applied:
+            return jsonify({
+                'success': False,
+                'error': f'Batch rejected: {len(results) - succeeded} of {len(results)} operations failed',
+                'applied': False,
+                'results': results
+            }), 409
+
+        return jsonify({
+            'success': True,
+            'message': f'{succeeded} of {len(results)} operations applied',
+            'applied': applied,
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'results': results
+        }), 200
+    except RoomBusyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        print(f"Batch bookings error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/backend/api/admin/rooms/<room_id>/book', methods=['POST'])
 def book_room(room_id):
     """Create a booking for a room"""
@@ -1708,7 +5448,7 @@ def book_room(room_id):
         
         if rooms_collection is None:
             # Fallback mode
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
@@ -1729,54 +5469,49 @@ def book_room(room_id):
             room['updated_at'] = datetime.now().isoformat()
             
             # Save to JSON
-            with open(json_file_path, 'w') as f:
-                json.dump(fallback_rooms, f, indent=2)
+            save_fallback_rooms()
         else:
             # MongoDB mode
-            # Find room
-            room = rooms_collection.find_one({'_id': room_id})
+            # Find room (string and ObjectId _id in one query)
+            room = resolve_room(room_id, {'bookedIntervals': 1})
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Room not found'
-                    }), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
             
-            # Check for duplicate/overlapping bookings
+            # Not-yet-migrated embedded bookings are checked in memory
             if has_duplicate_booking(room.get('bookedIntervals', [])):
                 return jsonify({
                     'success': False,
                     'error': 'Booking already exists or dates overlap with existing booking'
                 }), 409
             
-            # Add booking interval
-            result = rooms_collection.update_one(
-                room_id_filter,
-                {
-                    '$push': {'bookedIntervals': new_interval},
-                    '$set': {
-                        'updated_at': datetime.now()
-                    }
-                }
-            )
-            
-            if result.modified_count == 0:
+            # Overlap check and insert happen atomically
+            booking_id = create_booking(room['_id'], new_interval)
+            if booking_id is None:
                 return jsonify({
                     'success': False,
-                    'error': 'Failed to update room'
-                }), 500
+                    'error': 'Booking already exists or dates overlap with existing booking'
+                }), 409
+            new_interval['bookingId'] = str(booking_id)
+        
+        publish_event(
+            'booking.added', roomId=str(room['_id']), bookingId=new_interval.get('bookingId'),
+            checkIn=check_in, checkOut=check_out
+        )
+        room_catalog_changed(room['_id'])
         
         return jsonify({
             'success': True,
             'message': 'Booking created successfully',
             'data': new_interval
         }), 200
+    except RoomBusyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1801,7 +5536,7 @@ def unbook_room(room_id):
         
         if rooms_collection is None:
             # Fallback mode
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
@@ -1825,51 +5560,68 @@ def unbook_room(room_id):
                 room['updated_at'] = datetime.now().isoformat()
                 
                 # Save to JSON
-                with open(json_file_path, 'w') as f:
-                    json.dump(fallback_rooms, f, indent=2)
+                save_fallback_rooms()
         else:
             # MongoDB mode
             # Find room
-            room = rooms_collection.find_one({'_id': room_id})
+            room = resolve_room(room_id)
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Room not found'
-                    }), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            room_id_filter = {'_id': room['_id']}
             
-            # Remove booking interval
-            result = rooms_collection.update_one(
-                room_id_filter,
-                {
-                    '$pull': {
-                        'bookedIntervals': {
-                            'checkIn': check_in,
-                            'checkOut': check_out
-                        }
-                    },
-                    '$set': {
-                        'updated_at': datetime.now()
-                    }
-                }
-            )
+            # The removal and its occupancy change go together, under the
+            # room's booking guard like every booking write (see create_booking)
+            def cancel(session):
+                # Remove booking documents
+                result = bookings_collection.delete_many({
+                    'roomId': room_id_filter['_id'],
+                    'checkIn': check_in,
+                    'checkOut': check_out
+                }, session=session)
+                removed_count = result.deleted_count
+                
+                # Rooms whose embedded array has not been migrated yet
+                if removed_count == 0 and room.get('bookedIntervals'):
+                    result = rooms_collection.update_one(
+                        room_id_filter,
+                        {'$pull': {'bookedIntervals': {'checkIn': check_in, 'checkOut': check_out}}},
+                        session=session
+                    )
+                    removed_count = result.modified_count
+                
+                if removed_count:
+                    record_occupancy(
+                        [(room_id_filter['_id'], {'checkIn': check_in, 'checkOut': check_out}, -removed_count)],
+                        session=session
+                    )
+                    rooms_collection.update_one(
+                        room_id_filter,
+                        {'$set': {'updated_at': datetime.now(timezone.utc)}},
+                        session=session
+                    )
+                return removed_count
             
-            if result.modified_count == 0:
+            if run_in_transaction(cancel, room_ids=[str(room['_id'])]) == 0:
                 return jsonify({
                     'success': False,
                     'error': 'Booking not found or failed to update'
                 }), 404
         
+        publish_event('booking.removed', roomId=str(room['_id']), checkIn=check_in, checkOut=check_out)
+        room_catalog_changed(room['_id'])
+        
         return jsonify({
             'success': True,
             'message': 'Booking cancelled successfully'
         }), 200
+    except RoomBusyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
     except Exception as e:
         return jsonify({
             'success': False,
@@ -1898,7 +5650,7 @@ def update_booking(room_id):
         
         if rooms_collection is None:
             # Fallback mode
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
@@ -1924,43 +5676,54 @@ def update_booking(room_id):
                 room['updated_at'] = datetime.now().isoformat()
                 
                 # Save to JSON
-                with open(json_file_path, 'w') as f:
-                    json.dump(fallback_rooms, f, indent=2)
+                save_fallback_rooms()
         else:
             # MongoDB mode
-            room = rooms_collection.find_one({'_id': room_id})
+            room = resolve_room(room_id)
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Room not found'
-                    }), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            room_id_filter = {'_id': room['_id']}
             
-            # Update the specific booking interval
-            result = rooms_collection.update_one(
+            # Update the specific booking document
+            result = bookings_collection.update_one(
                 {
-                    **room_id_filter,
-                    'bookedIntervals.checkIn': check_in,
-                    'bookedIntervals.checkOut': check_out
+                    'roomId': room_id_filter['_id'],
+                    'checkIn': check_in,
+                    'checkOut': check_out
                 },
                 {
                     '$set': {
-                        'bookedIntervals.$.guestName': guest_name,
-                        'bookedIntervals.$.guestPhone': guest_phone,
-                        'bookedIntervals.$.guestEmail': guest_email,
-                        'bookedIntervals.$.notes': notes,
-                        'bookedIntervals.$.updatedAt': datetime.now(),
-                        'updated_at': datetime.now()
+                        'guestName': guest_name,
+                        'guestPhone': guest_phone,
+                        'guestEmail': guest_email,
+                        'notes': notes,
+                        'updatedAt': datetime.now()
                     }
                 }
             )
             
+            # Rooms whose embedded array has not been migrated yet
+            if result.matched_count == 0 and room.get('bookedIntervals'):
+                # $elemMatch, so the positional $ is the entry with both dates
+                result = rooms_collection.update_one(
+                    {
+                        **room_id_filter,
+                        'bookedIntervals': {'$elemMatch': {'checkIn': check_in, 'checkOut': check_out}}
+                    },
+                    {
+                        '$set': {
+                            'bookedIntervals.$.guestName': guest_name,
+                            'bookedIntervals.$.guestPhone': guest_phone,
+                            'bookedIntervals.$.guestEmail': guest_email,
+                            'bookedIntervals.$.notes': notes,
+                            'bookedIntervals.$.updatedAt': datetime.now()
+                        }
+                    }
+                )
+            
             # Check matched_count instead of modified_count
             # modified_count can be 0 if data is the same, but matched_count shows if booking was found
             if result.matched_count == 0:
@@ -1968,6 +5731,11 @@ def update_booking(room_id):
                     'success': False,
                     'error': 'Booking not found'
                 }), 404
+            
+            touch_room(room_id_filter['_id'])
+        
+        publish_event('booking.updated', roomId=str(room['_id']), checkIn=check_in, checkOut=check_out)
+        room_catalog_changed(room['_id'])
         
         return jsonify({
             'success': True,
@@ -1984,10 +5752,11 @@ def update_booking(room_id):
 @app.route('/backend/api/admin/rooms/<room_id>/ical-url', methods=['PUT'])
 @token_required
 def update_ical_url(room_id):
-    """Update the iCal URL for a room"""
+    """Update the iCal URL (and optionally the sync interval in minutes) for a room"""
     try:
         data = request.json
         ical_url = data.get('icalUrl', '').strip()
+        sync_interval = data.get('syncIntervalMinutes')
         
         # Validate URL format if provided
         if ical_url and not ical_url.startswith(('http://', 'https://')):
@@ -1995,44 +5764,48 @@ def update_ical_url(room_id):
                 'success': False,
                 'error': 'Invalid URL format. Must start with http:// or https://'
             }), 400
+        if sync_interval is not None and (
+                not isinstance(sync_interval, int) or isinstance(sync_interval, bool) or sync_interval < 5):
+            return jsonify({
+                'success': False,
+                'error': 'syncIntervalMinutes must be an integer of at least 5'
+            }), 400
+        update = {'icalUrl': ical_url}
+        if sync_interval is not None:
+            update['icalSyncInterval'] = sync_interval
         
         if rooms_collection is None:
             # Fallback mode
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
                     'error': 'Room not found'
                 }), 404
             
-            room['icalUrl'] = ical_url
+            url_changed = room.get('icalUrl') != ical_url
+            room.update(update)
             room['updated_at'] = datetime.now().isoformat()
             
             # Save to JSON
-            with open(json_file_path, 'w') as f:
-                json.dump(fallback_rooms, f, indent=2)
+            save_fallback_rooms()
         else:
             # MongoDB mode
-            room = rooms_collection.find_one({'_id': room_id})
+            room = resolve_room(room_id)
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Room not found'
-                    }), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            room_id_filter = {'_id': room['_id']}
+            url_changed = room.get('icalUrl') != ical_url
             
             result = rooms_collection.update_one(
                 room_id_filter,
                 {
                     '$set': {
-                        'icalUrl': ical_url,
-                        'updated_at': datetime.now()
+                        **update,
+                        'updated_at': datetime.now(timezone.utc)
                     }
                 }
             )
@@ -2043,6 +5816,11 @@ def update_ical_url(room_id):
                     'error': 'Room not found'
                 }), 404
         
+        # A new feed is picked up by the next scheduler tick
+        if url_changed:
+            forget_ical_sync_state(room['_id'])
+        room_catalog_changed(room['_id'])
+        
         return jsonify({
             'success': True,
             'message': 'iCal URL updated successfully',
@@ -2054,6 +5832,66 @@ def update_ical_url(room_id):
             'error': str(e)
         }), 500
 
+@app.route('/backend/api/admin/rooms/<room_id>/ical-export', methods=['GET'])
+@token_required
+def get_ical_export(room_id):
+    """URL of the room's iCal export feed (null until exporting is enabled)"""
+    try:
+        room = resolve_room(room_id, {'icalExportToken': 1})
+        if not room:
+            return jsonify({
+                'success': False,
+                'error': 'Room not found'
+            }), 404
+        
+        token = room.get('icalExportToken')
+        return jsonify({
+            'success': True,
+            'exportUrl': room_ical_export_url(room_id, token) if token else None
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/rooms/<room_id>/ical-export', methods=['POST'])
+@token_required
+def rotate_ical_export(room_id):
+    """Enable the room's iCal export feed, or replace its token (the old URL stops working)"""
+    try:
+        room = resolve_room(room_id)
+        if not room:
+            return jsonify({
+                'success': False,
+                'error': 'Room not found'
+            }), 404
+        
+        token = secrets.token_urlsafe(24)
+        if rooms_collection is None:
+            # Fallback mode
+            room['icalExportToken'] = token
+            room['updated_at'] = datetime.now().isoformat()
+            save_fallback_rooms()
+        else:
+            # MongoDB mode
+            rooms_collection.update_one(
+                {'_id': room['_id']},
+                {'$set': {'icalExportToken': token, 'updated_at': datetime.now(timezone.utc)}}
+            )
+        room_catalog_changed(room['_id'])
+        
+        return jsonify({
+            'success': True,
+            'message': 'iCal export URL created',
+            'exportUrl': room_ical_export_url(room_id, token)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/backend/api/admin/rooms/<room_id>/promotion', methods=['PUT'])
 @admin_required
 def update_room_promotion(room_id):
@@ -2074,7 +5912,7 @@ def update_room_promotion(room_id):
         
         if rooms_collection is None:
             # Fallback mode
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
+            room = resolve_room(room_id)
             if not room:
                 return jsonify({
                     'success': False,
@@ -2093,25 +5931,18 @@ def update_room_promotion(room_id):
             
             # Save to JSON
             try:
-                with open(json_file_path, 'w') as f:
-                    json.dump(fallback_rooms, f, indent=2)
+                save_fallback_rooms()
             except Exception as save_error:
                 print(f"Warning: Could not save to JSON: {save_error}")
         else:
             # MongoDB mode
-            room = rooms_collection.find_one({'_id': room_id})
+            room = resolve_room(room_id)
             if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                    room_id_filter = {'_id': obj_id}
-                except:
-                    return jsonify({
-                        'success': False,
-                        'error': 'Room not found'
-                    }), 404
-            else:
-                room_id_filter = {'_id': room_id}
+                return jsonify({
+                    'success': False,
+                    'error': 'Room not found'
+                }), 404
+            room_id_filter = {'_id': room['_id']}
             
             if is_active:
                 update_doc = {
@@ -2137,6 +5968,8 @@ def update_room_promotion(room_id):
                     'error': 'Room not found'
                 }), 404
         
+        room_catalog_changed(room['_id'])
+        
         return jsonify({
             'success': True,
             'message': f'Promotion {"activated" if is_active else "deactivated"} successfully',
@@ -2152,7 +5985,11 @@ def update_room_promotion(room_id):
 @app.route('/backend/api/admin/rooms/<room_id>/sync-ical', methods=['POST'])
 @token_required
 def sync_ical(room_id):
-    """Sync bookings from iCal URL for a room"""
+    """Sync bookings from iCal URL for a room
+
+    The feed is skipped when it is unchanged since the last sync; ?force=1
+    fetches and processes it regardless.
+    """
     try:
         if not ICAL_AVAILABLE:
             return jsonify({
@@ -2161,16 +5998,7 @@ def sync_ical(room_id):
             }), 503
         
         # Get the room
-        if rooms_collection is None:
-            room = next((r for r in fallback_rooms if r.get('_id') == room_id), None)
-        else:
-            room = rooms_collection.find_one({'_id': room_id})
-            if not room:
-                try:
-                    obj_id = ObjectId(room_id)
-                    room = rooms_collection.find_one({'_id': obj_id})
-                except:
-                    pass
+        room = resolve_room(room_id)
         
         if not room:
             return jsonify({
@@ -2185,141 +6013,14 @@ def sync_ical(room_id):
                 'error': 'No iCal URL configured for this room'
             }), 400
         
-        # Fetch iCal data from URL
-        try:
-            response = requests.get(ical_url, timeout=30, headers={
-                'User-Agent': 'KhietAnHomestay-Calendar-Sync/1.0'
-            })
-            response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            return jsonify({
-                'success': False,
-                'error': f'Failed to fetch iCal data: {str(e)}'
-            }), 502
-        
-        # Parse iCal data
-        try:
-            cal = Calendar.from_ical(response.content)
-        except Exception as e:
-            return jsonify({
-                'success': False,
-                'error': f'Failed to parse iCal data: {str(e)}'
-            }), 400
-        
-        # Extract booking events
-        new_bookings = []
-        existing_intervals = room.get('bookedIntervals', [])
-        synced_count = 0
-        skipped_count = 0
-        
-        for component in cal.walk():
-            if component.name == 'VEVENT':
-                try:
-                    # Get event details
-                    dtstart = component.get('DTSTART')
-                    dtend = component.get('DTEND')
-                    summary = str(component.get('SUMMARY', 'Airbnb Booking'))
-                    uid = str(component.get('UID', ''))
-                    
-                    if not dtstart or not dtend:
-                        continue
-                    
-                    # Convert to date strings (YYYY-MM-DD)
-                    start_date = dtstart.dt
-                    end_date = dtend.dt
-                    
-                    # Handle datetime vs date objects
-                    if hasattr(start_date, 'date'):
-                        start_date = start_date.date()
-                    if hasattr(end_date, 'date'):
-                        end_date = end_date.date()
-                    
-                    check_in = start_date.strftime('%Y-%m-%d')
-                    check_out = end_date.strftime('%Y-%m-%d')
-                    
-                    # Skip past bookings
-                    today = datetime.now().date()
-                    if end_date < today:
-                        skipped_count += 1
-                        continue
-                    
-                    # Check if booking already exists (avoid duplicates)
-                    is_duplicate = False
-                    for interval in existing_intervals:
-                        if interval.get('checkIn') == check_in and interval.get('checkOut') == check_out:
-                            is_duplicate = True
-                            break
-                        # Also check by UID if available
-                        if uid and interval.get('icalUid') == uid:
-                            is_duplicate = True
-                            break
-                    
-                    if is_duplicate:
-                        skipped_count += 1
-                        continue
-                    
-                    # Create booking interval
-                    new_interval = {
-                        'checkIn': check_in,
-                        'checkOut': check_out,
-                        'guestName': summary if summary != 'Reserved' else 'Airbnb Guest',
-                        'guestPhone': '',
-                        'guestEmail': '',
-                        'notes': f'Synced from Airbnb iCal',
-                        'source': 'airbnb_ical',
-                        'icalUid': uid,
-                        'createdAt': datetime.now().isoformat()
-                    }
-                    
-                    new_bookings.append(new_interval)
-                    synced_count += 1
-                    
-                except Exception as e:
-                    print(f"Error processing iCal event: {e}")
-                    continue
-        
-        # Update room with new bookings
-        if new_bookings:
-            if rooms_collection is None:
-                # Fallback mode
-                if 'bookedIntervals' not in room:
-                    room['bookedIntervals'] = []
-                room['bookedIntervals'].extend(new_bookings)
-                room['lastIcalSync'] = datetime.now().isoformat()
-                room['updated_at'] = datetime.now().isoformat()
-                
-                with open(json_file_path, 'w') as f:
-                    json.dump(fallback_rooms, f, indent=2)
-            else:
-                # MongoDB mode
-                room_id_filter = {'_id': room_id} if not isinstance(room.get('_id'), ObjectId) else {'_id': room.get('_id')}
-                
-                rooms_collection.update_one(
-                    room_id_filter,
-                    {
-                        '$push': {'bookedIntervals': {'$each': new_bookings}},
-                        '$set': {
-                            'lastIcalSync': datetime.now(),
-                            'updated_at': datetime.now()
-                        }
-                    }
-                )
-        else:
-            # Update last sync time even if no new bookings
-            if rooms_collection is not None:
-                room_id_filter = {'_id': room_id} if not isinstance(room.get('_id'), ObjectId) else {'_id': room.get('_id')}
-                rooms_collection.update_one(
-                    room_id_filter,
-                    {'$set': {'lastIcalSync': datetime.now(), 'updated_at': datetime.now()}}
-                )
-        
-        return jsonify({
-            'success': True,
-            'message': f'iCal sync completed. {synced_count} new bookings added, {skipped_count} skipped.',
-            'syncedCount': synced_count,
-            'skippedCount': skipped_count,
-            'lastSync': datetime.now().isoformat()
-        }), 200
+        # Concurrent requests for this room share one sync (see Sync Coalescing)
+        force = request.args.get('force', '').lower() in ('1', 'true')
+        payload, status, coalesced = coalesce_sync(
+            f"ical:room:{room['_id']}",
+            lambda: sync_room_ical(room, force=force),
+            force=force
+        )
+        return jsonify({**payload, 'coalesced': coalesced}), status
         
     except Exception as e:
         return jsonify({
@@ -2330,7 +6031,12 @@ def sync_ical(room_id):
 @app.route('/backend/api/admin/sync-all-ical', methods=['POST'])
 @token_required
 def sync_all_ical():
-    """Sync iCal for all rooms that have an iCal URL configured"""
+    """Sync iCal for all rooms that have an iCal URL configured
+
+    Runs as a background job: answers 202 with the job id, and progress and
+    per-room results are read from GET /backend/api/admin/jobs/<id>. A sync-all
+    already queued or running is shared; ?force=1 refetches unchanged feeds.
+    """
     try:
         if not ICAL_AVAILABLE:
             return jsonify({
@@ -2338,132 +6044,146 @@ def sync_all_ical():
                 'error': 'iCal sync is not available. Please install icalendar package.'
             }), 503
         
-        results = []
+        force = request.args.get('force', '').lower() in ('1', 'true')
+        job, created = enqueue_job('ical.sync_all', {'force': force}, created_by=request.current_user.get('username'))
+        return job_accepted_response(job, created)
         
-        if rooms_collection is None:
-            rooms = fallback_rooms
-        else:
-            rooms = list(rooms_collection.find())
-        
-        for room in rooms:
-            ical_url = room.get('icalUrl', '')
-            room_id = str(room.get('_id', ''))
-            room_name = room.get('name', 'Unknown')
-            
-            if not ical_url:
-                continue
-            
-            try:
-                # Fetch and parse iCal
-                response = requests.get(ical_url, timeout=30, headers={
-                    'User-Agent': 'KhietAnHomestay-Calendar-Sync/1.0'
-                })
-                response.raise_for_status()
-                cal = Calendar.from_ical(response.content)
-                
-                existing_intervals = room.get('bookedIntervals', [])
-                new_bookings = []
-                synced_count = 0
-                
-                for component in cal.walk():
-                    if component.name == 'VEVENT':
-                        try:
-                            dtstart = component.get('DTSTART')
-                            dtend = component.get('DTEND')
-                            summary = str(component.get('SUMMARY', 'Airbnb Booking'))
-                            uid = str(component.get('UID', ''))
-                            
-                            if not dtstart or not dtend:
-                                continue
-                            
-                            start_date = dtstart.dt
-                            end_date = dtend.dt
-                            
-                            if hasattr(start_date, 'date'):
-                                start_date = start_date.date()
-                            if hasattr(end_date, 'date'):
-                                end_date = end_date.date()
-                            
-                            check_in = start_date.strftime('%Y-%m-%d')
-                            check_out = end_date.strftime('%Y-%m-%d')
-                            
-                            today = datetime.now().date()
-                            if end_date < today:
-                                continue
-                            
-                            is_duplicate = False
-                            for interval in existing_intervals:
-                                if (interval.get('checkIn') == check_in and interval.get('checkOut') == check_out) or \
-                                   (uid and interval.get('icalUid') == uid):
-                                    is_duplicate = True
-                                    break
-                            
-                            if is_duplicate:
-                                continue
-                            
-                            new_interval = {
-                                'checkIn': check_in,
-                                'checkOut': check_out,
-                                'guestName': summary if summary != 'Reserved' else 'Airbnb Guest',
-                                'guestPhone': '',
-                                'guestEmail': '',
-                                'notes': f'Synced from Airbnb iCal',
-                                'source': 'airbnb_ical',
-                                'icalUid': uid,
-                                'createdAt': datetime.now().isoformat()
-                            }
-                            
-                            new_bookings.append(new_interval)
-                            synced_count += 1
-                            
-                        except Exception:
-                            continue
-                
-                # Update room
-                if new_bookings:
-                    if rooms_collection is not None:
-                        room_id_filter = {'_id': room.get('_id')}
-                        rooms_collection.update_one(
-                            room_id_filter,
-                            {
-                                '$push': {'bookedIntervals': {'$each': new_bookings}},
-                                '$set': {'lastIcalSync': datetime.now(), 'updated_at': datetime.now()}
-                            }
-                        )
-                    else:
-                        room['bookedIntervals'] = existing_intervals + new_bookings
-                        room['lastIcalSync'] = datetime.now().isoformat()
-                
-                results.append({
-                    'roomId': room_id,
-                    'roomName': room_name,
-                    'success': True,
-                    'syncedCount': synced_count
-                })
-                
-            except Exception as e:
-                results.append({
-                    'roomId': room_id,
-                    'roomName': room_name,
-                    'success': False,
-                    'error': str(e)
-                })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/admin/ical/status', methods=['GET'])
+@token_required
+def get_ical_status():
+    """Last scheduled/manual sync run and next scheduled run of every room with an iCal URL"""
+    try:
+        states = load_ical_sync_states()
+        rooms = []
+        for room in load_ical_rooms():
+            state = states.get(str(room['_id']))
+            rooms.append({
+                'roomId': str(room['_id']),
+                'roomName': room.get('name', 'Unknown'),
+                'intervalMinutes': int(room_sync_interval(room).total_seconds() // 60),
+                **(convert_ical_sync_state_for_api(state) if state else {})
+            })
+        return jsonify({
+            'success': True,
+            'data': rooms,
+            'count': len(rooms)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/backend/api/cron/ical-sync', methods=['GET', 'POST'])
+def cron_ical_sync():
+    """Run one iCal scheduler tick (Vercel Cron, or any scheduler sending the secret)
+
+    Also runs booking maintenance and background jobs left queued or
+    abandoned by their instance.
+    Authorized by "Authorization: Bearer <CRON_SECRET>" or an admin token.
+    """
+    try:
+        auth_header = request.headers.get('Authorization', '')
+        token = auth_header[7:] if auth_header.startswith('Bearer ') else ''
+        if not (CRON_SECRET and hmac.compare_digest(token, CRON_SECRET)):
+            payload = verify_token(token) if token else None
+            if not payload or payload.get('role') != 'admin':
+                return jsonify({'success': False, 'error': 'Unauthorized'}), 401
         
-        # Save fallback data if using JSON
-        if rooms_collection is None:
-            with open(json_file_path, 'w') as f:
-                json.dump(fallback_rooms, f, indent=2)
+        started = time.monotonic()
+        # One worker at a time runs the maintenance (see Sync Coalescing)
+        maintenance, _, _ = coalesce_sync('maintenance:bookings', lambda: (run_booking_maintenance(), 200))
         
-        total_synced = sum(r.get('syncedCount', 0) for r in results if r.get('success'))
-        successful_rooms = sum(1 for r in results if r.get('success'))
+        if not ICAL_AVAILABLE:
+            return jsonify({
+                'success': False,
+                'error': 'iCal sync is not available. Please install icalendar package.',
+                'maintenance': maintenance
+            }), 503
         
+        results = run_ical_scheduler_tick()
+        # Queued jobs, and those whose instance was frozen or died before finishing them
+        jobs_run = run_pending_jobs(limit=JOB_MAX_WORKERS, deadline=time.monotonic() + JOB_SLICE_SECONDS)
         return jsonify({
             'success': True,
-            'message': f'Synced {successful_rooms} rooms, {total_synced} total new bookings',
-            'results': results
+            'message': f'Synced {len(results)} due rooms',
+            'results': results,
+            'jobsRun': jobs_run,
+            'maintenance': maintenance,
+            'durationMs': round((time.monotonic() - started) * 1000)
         }), 200
-        
     except Exception as e:
+        print(f"Cron iCal sync error: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ===== Job API Endpoints =====
+
+@app.route('/backend/api/admin/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_job(job_id):
+    """Status, progress and result of a background job
+
+    Without background threads (serverless, see Background Jobs) a poll of a
+    queued job runs it for up to JOB_SLICE_SECONDS before answering.
+    """
+    try:
+        job = find_job(job_id)
+        if not job:
+            return jsonify({
+                'success': False,
+                'error': 'Job not found'
+            }), 404
+        if not JOB_RUN_IN_BACKGROUND:
+            fail_abandoned_jobs()
+            if job_is_claimable(job):
+                run_job(job_id, deadline=time.monotonic() + JOB_SLICE_SECONDS)
+            job = find_job(job_id)
+        return jsonify({
+            'success': True,
+            'data': convert_job_for_api(job)
+        }), 200
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ===== iCal Export Feed =====
+
+@app.route('/backend/ical/rooms/<room_id>.ics', methods=['GET'])
+def export_room_ical(room_id):
+    """A room's own bookings as an iCalendar feed, for Airbnb / Booking.com to import
+
+    Authorized by the room's export token in ?token=. Served from the cached
+    render with a strong ETag and Last-Modified (see iCal Export).
+    """
+    try:
+        # The token is checked on a point read before anything is rendered
+        room = resolve_room(room_id, {'icalExportToken': 1, 'bookedIntervals': 1})
+        expected = (room or {}).get('icalExportToken')
+        token = request.args.get('token', '')
+        if not expected or not hmac.compare_digest(token.encode('utf-8'), expected.encode('utf-8')):
+            # Same answer for unknown rooms and wrong tokens
+            return jsonify({'success': False, 'error': 'Calendar not found'}), 404
+        
+        entry = get_room_ical_export(room)
+        if request_is_fresh(entry['etag'], entry['last_modified']):
+            return not_modified_response(entry['etag'], entry['last_modified'], private=True)
+        
+        response = app.response_class(entry['body'], mimetype='text/calendar')
+        response.headers['Content-Disposition'] = f'inline; filename="room-{room_id}.ics"'
+        return with_validators(response, entry['etag'], entry['last_modified'], private=True)
+    except Exception as e:
+        print(f"iCal export error: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
@@ -2514,6 +6234,14 @@ def internal_error(error):
 app = app
 
 if __name__ == '__main__':
+    try:
+        maintenance = run_booking_maintenance()
+        print(f"✓ Booking maintenance: {maintenance}")
+    except Exception as e:
+        print(f"⚠️ Booking maintenance failed: {e}")
+    # Sync iCal feeds in the background (on Vercel the cron endpoint does this)
+    if os.getenv('ICAL_SCHEDULER_ENABLED', 'true').lower() == 'true':
+        start_ical_scheduler()
     # Use threaded=True to handle multiple concurrent requests properly
     # Disable use_reloader to prevent server restart when uploading files to static folder
     app.run(debug=True, host='0.0.0.0', port=5000, threaded=True, use_reloader=False)
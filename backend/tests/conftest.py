@@ -0,0 +1,98 @@
+"""Shared fixtures: the app against an in-memory MongoDB (mongomock).
+
+Run from the repository root:
+    python -m pytest backend/tests
+"""
+import hashlib
+import os
+import sys
+from collections import OrderedDict
+
+import pytest
+
+mongomock = pytest.importorskip('mongomock')
+
+# Import the app in fallback mode - never connect to a real database from here
+os.environ['MONGODB_URI'] = ''
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import server  # noqa: E402
+
+COLLECTIONS = (
+    ('rooms_collection', 'rooms'),
+    ('meta_collection', 'app_meta'),
+    ('bookings_collection', 'bookings'),
+    ('occupancy_collection', 'room_occupancy'),
+    ('tombstones_collection', 'room_tombstones'),
+    ('bookings_archive_collection', 'bookings_archive'),
+    ('ical_sync_state_collection', 'ical_sync_state'),
+    ('sync_locks_collection', 'sync_locks'),
+    ('jobs_collection', 'jobs'),
+)
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """Point the app at a fresh mongomock database with three rooms"""
+    database = mongomock.MongoClient()['test']
+    for name, collection in COLLECTIONS:
+        monkeypatch.setattr(server, name, database[collection])
+    # Per-process caches must not leak between tests
+    monkeypatch.setattr(server, '_room_catalog', {'version': None, 'variants': {}, 'stamps': {}, 'checked_at': 0.0})
+    monkeypatch.setattr(server, '_room_fragments', OrderedDict())
+    monkeypatch.setattr(server, '_ical_exports', OrderedDict())
+    monkeypatch.setattr(server, '_room_id_types', {})
+    monkeypatch.setattr(server, '_occupancy_built', False)
+    database['jobs'].create_index(
+        'activeKey', unique=True, partialFilterExpression={'activeKey': {'$exists': True}}
+    )
+    database['rooms'].insert_many([
+        {'_id': f'000{n}', 'name': f'Room {n}', 'price': 100 + n, 'persons': 2, 'bookedIntervals': []}
+        for n in range(1, 4)
+    ])
+    database['bookings'].insert_one({
+        'roomId': '0002', 'checkIn': '2030-01-10', 'checkOut': '2030-01-12', 'guestName': 'Guest'
+    })
+    return database
+
+
+@pytest.fixture
+def client():
+    """Test client logged in as an admin"""
+    token = server.generate_token({'_id': 'x', 'username': 'admin', 'role': 'admin', 'displayName': 'Admin'})
+    test_client = server.app.test_client()
+    test_client.environ_base['HTTP_AUTHORIZATION'] = f'Bearer {token}'
+    return test_client
+
+
+FEED = (
+    b'BEGIN:VCALENDAR\r\n'
+    b'VERSION:2.0\r\n'
+    b'BEGIN:VEVENT\r\n'
+    b'UID:stay-1@airbnb\r\n'
+    b'DTSTART;VALUE=DATE:20300301\r\n'
+    b'DTEND;VALUE=DATE:20300305\r\n'
+    b'SUMMARY:Reserved\r\n'
+    b'END:VEVENT\r\n'
+    b'END:VCALENDAR\r\n'
+)
+
+
+@pytest.fixture
+def feed(monkeypatch):
+    """Serve FEED (or whatever the test puts in feed['body']) to fetch_ical_feed"""
+    served = {'body': FEED, 'fetches': 0}
+    
+    def fake_fetch(url, process, timeout=None, etag=None, last_modified=None):
+        served['fetches'] += 1
+        body = served['body']
+        result = process(iter(body.splitlines(keepends=True)))
+        return result, None, None, hashlib.sha256(body).hexdigest()
+    
+    monkeypatch.setattr(server, 'fetch_ical_feed', fake_fetch)
+    return served
+
+
+@pytest.fixture
+def ical_room(db):
+    db['rooms'].update_one({'_id': '0001'}, {'$set': {'icalUrl': 'https://example.com/room1.ics'}})
+    return db['rooms'].find_one({'_id': '0001'})
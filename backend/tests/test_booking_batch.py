@@ -0,0 +1,70 @@
+"""Booking batches and updates of not-yet-migrated embedded bookings"""
+import pytest
+
+EMBEDDED = [
+    {'checkIn': '2030-06-01', 'checkOut': '2030-06-09', 'guestName': 'A'},
+    {'checkIn': '2030-06-09', 'checkOut': '2030-06-12', 'guestName': 'B'},
+    {'checkIn': '2030-06-01', 'checkOut': '2030-06-12', 'guestName': 'C'},
+]
+
+
+def batch(client, operations, atomic=False):
+    return client.post('/backend/api/admin/bookings/batch', json={'operations': operations, 'atomic': atomic})
+
+
+OPERATIONS = [
+    {'op': 'create', 'roomId': '0001', 'checkIn': '2030-07-01', 'checkOut': '2030-07-03', 'guestName': 'Ok'},
+    {'op': 'create', 'roomId': '0002', 'checkIn': '2030-01-11', 'checkOut': '2030-01-13', 'guestName': 'Overlap'},
+    {'op': 'cancel', 'roomId': '0003', 'checkIn': '2030-07-01', 'checkOut': '2030-07-03'},
+    {'op': 'create', 'roomId': '0001', 'checkIn': '2030/07/05', 'checkOut': '2030-07-06', 'guestName': 'Bad'},
+    {'op': 'create', 'roomId': '0009', 'checkIn': '2030-07-01', 'checkOut': '2030-07-03', 'guestName': 'Nobody'},
+]
+
+
+def test_partial_failures_are_reported_per_operation(db, client):
+    response = batch(client, OPERATIONS)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['applied'] is True and body['succeeded'] == 1 and body['failed'] == 4
+    assert [r['status'] for r in body['results']] == [200, 409, 404, 400, 404]
+    assert db['bookings'].count_documents({'roomId': '0001'}) == 1
+
+
+def test_atomic_batch_writes_nothing_on_failure(db, client):
+    response = batch(client, OPERATIONS, atomic=True)
+    assert response.status_code == 409
+    assert response.get_json()['applied'] is False
+    assert db['bookings'].count_documents({}) == 1
+
+
+def test_batch_cannot_overlap_itself(db, client):
+    response = batch(client, [
+        {'op': 'create', 'roomId': '0001', 'checkIn': '2030-07-01', 'checkOut': '2030-07-04', 'guestName': 'One'},
+        {'op': 'create', 'roomId': '0001', 'checkIn': '2030-07-03', 'checkOut': '2030-07-05', 'guestName': 'Two'},
+    ])
+    assert [r['status'] for r in response.get_json()['results']] == [200, 409]
+
+
+@pytest.fixture
+def embedded(db):
+    db['rooms'].update_one({'_id': '0003'}, {'$set': {'bookedIntervals': [dict(b) for b in EMBEDDED]}})
+
+
+def guests(db):
+    return [b['guestName'] for b in db['rooms'].find_one({'_id': '0003'})['bookedIntervals']]
+
+
+def test_update_booking_targets_the_entry_with_both_dates(db, client, embedded):
+    response = client.put('/backend/api/admin/rooms/0003/update-booking', json={
+        'checkIn': '2030-06-01', 'checkOut': '2030-06-12', 'guestName': 'Changed'
+    })
+    assert response.status_code == 200
+    assert guests(db) == ['A', 'B', 'Changed']
+
+
+def test_batch_update_targets_the_entry_with_both_dates(db, client, embedded):
+    response = batch(client, [
+        {'op': 'update', 'roomId': '0003', 'checkIn': '2030-06-01', 'checkOut': '2030-06-12', 'guestName': 'Changed'}
+    ])
+    assert response.get_json()['succeeded'] == 1
+    assert guests(db) == ['A', 'B', 'Changed']
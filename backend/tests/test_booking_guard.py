@@ -0,0 +1,71 @@
+"""Booking overlap guard: admin bookings, batches and iCal imports share one per-room guard"""
+import threading
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def book(client, room_id, check_in, check_out, guest='Guest'):
+    return client.post(f'/backend/api/admin/rooms/{room_id}/book', json={
+        'checkIn': check_in, 'checkOut': check_out, 'guestName': guest
+    })
+
+
+def test_overlapping_booking_is_rejected(db, client):
+    assert book(client, '0002', '2030-01-11', '2030-01-13').status_code == 409
+    assert book(client, '0002', '2030-01-12', '2030-01-13').status_code == 200
+
+
+def test_concurrent_bookings_of_the_same_nights(db, client):
+    statuses = []
+    
+    def attempt(n):
+        statuses.append(book(client, '0001', '2030-05-01', '2030-05-04', guest=f'Guest {n}').status_code)
+    
+    threads = [threading.Thread(target=attempt, args=(n,)) for n in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(statuses) == [200] + [409] * 5
+    assert db['bookings'].count_documents({'roomId': '0001'}) == 1
+    assert db['sync_locks'].find_one({'_id': 'booking:0001'})['expiresAt'] is None
+
+
+def test_busy_room_fails_closed(db, client, monkeypatch):
+    monkeypatch.setattr(server, 'BOOKING_LOCK_WAIT_SECONDS', 0.1)
+    db['sync_locks'].insert_one({
+        '_id': 'booking:0001', 'owner': 'other',
+        'expiresAt': datetime.now(timezone.utc) + timedelta(seconds=30)
+    })
+    assert book(client, '0001', '2030-05-01', '2030-05-04').status_code == 503
+    assert db['bookings'].count_documents({'roomId': '0001'}) == 0
+
+
+def test_expired_lease_is_taken_over(db, client):
+    db['sync_locks'].insert_one({
+        '_id': 'booking:0001', 'owner': 'crashed',
+        'expiresAt': datetime.now(timezone.utc) - timedelta(seconds=1)
+    })
+    assert book(client, '0001', '2030-05-01', '2030-05-04').status_code == 200
+
+
+def test_ical_import_does_not_double_book(db, client, ical_room, feed):
+    # The feed's stay (2030-03-01 .. 03-05) overlaps a booking made here
+    assert book(client, '0001', '2030-03-04', '2030-03-06').status_code == 200
+    payload, status = server.sync_room_ical(ical_room)
+    assert status == 200
+    assert payload['syncedCount'] == 0 and payload['conflictCount'] == 1
+    assert payload['conflicts'][0]['checkIn'] == '2030-03-01'
+    assert db['bookings'].count_documents({'roomId': '0001'}) == 1
+    # Validators are dropped, so the next sync reads the feed again
+    room = db['rooms'].find_one({'_id': '0001'})
+    assert 'hash' not in room['icalFeed']
+    
+    # Once the nights are free the stay comes in
+    assert client.post('/backend/api/admin/rooms/0001/unbook', json={
+        'checkIn': '2030-03-04', 'checkOut': '2030-03-06'
+    }).status_code == 200
+    payload, status = server.sync_room_ical(db['rooms'].find_one({'_id': '0001'}))
+    assert payload['syncedCount'] == 1 and payload['conflictCount'] == 0
+    assert db['bookings'].find_one({'roomId': '0001'})['icalUid'] == 'stay-1@airbnb'
@@ -0,0 +1,52 @@
+"""Month occupancy grid: first build, rebuilds and conditional GETs"""
+import server
+
+
+def bitmap(client, room_id, month='2030-01'):
+    response = client.get(f'/backend/api/admin/calendar?month={month}')
+    assert response.status_code == 200
+    return next(entry['bitmap'] for entry in response.get_json()['data'] if entry['id'] == room_id)
+
+
+def test_first_read_builds_the_grid(db, client):
+    # Nothing built yet, as right after a deploy
+    assert db['app_meta'].find_one({'_id': server.OCCUPANCY_META_ID}) is None
+    assert bitmap(client, '0002')[9:12] == '110'
+    assert db['app_meta'].find_one({'_id': server.OCCUPANCY_META_ID}) is not None
+
+
+def test_booking_writes_keep_the_grid_current(db, client):
+    bitmap(client, '0001')
+    assert client.post('/backend/api/admin/rooms/0001/book', json={
+        'checkIn': '2030-01-30', 'checkOut': '2030-02-02', 'guestName': 'Guest'
+    }).status_code == 200
+    assert bitmap(client, '0001').endswith('11')
+    assert bitmap(client, '0001', '2030-02').startswith('10')
+    
+    assert client.post('/backend/api/admin/rooms/0001/unbook', json={
+        'checkIn': '2030-01-30', 'checkOut': '2030-02-02'
+    }).status_code == 200
+    assert '1' not in bitmap(client, '0001') + bitmap(client, '0001', '2030-02')
+
+
+def test_rebuild_replaces_counts_room_by_room(db):
+    db['room_occupancy'].insert_many([
+        {'_id': '0002|2030-01', 'roomId': '0002', 'month': '2030-01', 'days': {'10': 5, '20': 1}},
+        {'_id': '0099|2030-01', 'roomId': '0099', 'month': '2030-01', 'days': {'1': 1}},
+    ])
+    assert server.rebuild_occupancy() == 1
+    assert db['room_occupancy'].find_one({'_id': '0002|2030-01'})['days'] == {'10': 1, '11': 1}
+    assert db['room_occupancy'].find_one({'_id': '0099|2030-01'}) is None
+    # Each room was recounted under its booking lease
+    assert db['sync_locks'].find_one({'_id': 'booking:0002'})['expiresAt'] is None
+
+
+def test_etag_depends_on_the_month(db, client):
+    january = client.get('/backend/api/admin/calendar?month=2030-01')
+    assert client.get('/backend/api/admin/calendar?month=2030-01',
+                      headers={'If-None-Match': january.headers['ETag']}).status_code == 304
+    # Same catalog version, other month (as when the current month rolls over)
+    february = client.get('/backend/api/admin/calendar?month=2030-02',
+                          headers={'If-None-Match': january.headers['ETag']})
+    assert february.status_code == 200
+    assert february.headers['ETag'] != january.headers['ETag']
@@ -0,0 +1,35 @@
+"""Response compression around static files and byte ranges"""
+import gzip
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def static_css(tmp_path, monkeypatch):
+    body = b'.room { color: #333; }\n' * 200
+    (tmp_path / 'site.css').write_bytes(body)
+    monkeypatch.setattr(server.app, 'static_folder', str(tmp_path))
+    return body
+
+
+def test_full_static_response_is_compressed(client, static_css):
+    response = client.get('/backend/static/site.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == static_css
+
+
+def test_range_request_gets_identity_bytes(client, static_css):
+    response = client.get('/backend/static/site.css', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=0-99'})
+    assert response.status_code == 206
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['Content-Range'] == f'bytes 0-99/{len(static_css)}'
+    assert response.data == static_css[:100]
+
+
+def test_unsatisfiable_range_is_left_alone(client, static_css):
+    response = client.get('/backend/static/site.css', headers={'Accept-Encoding': 'gzip', 'Range': 'bytes=999999-'})
+    assert response.status_code == 416
+    assert 'Content-Encoding' not in response.headers
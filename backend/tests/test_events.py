@@ -0,0 +1,68 @@
+"""Change event stream: stream tokens and the change stream watcher backoff"""
+import threading
+
+import pytest
+from pymongo.errors import OperationFailure
+
+import server
+
+
+@pytest.fixture
+def short_streams(monkeypatch):
+    monkeypatch.setattr(server, 'EVENT_STREAM_ENABLED', True)
+    monkeypatch.setattr(server, 'EVENT_STREAM_MAX_SECONDS', 0)
+
+
+def stream_token(client):
+    response = client.post('/backend/api/events/token')
+    assert response.status_code == 200 and response.get_json()['enabled'] is True
+    return response.get_json()['token']
+
+
+def test_stream_opens_with_a_stream_token(client, short_streams):
+    anonymous = server.app.test_client()
+    response = anonymous.get(f'/backend/api/events?token={stream_token(client)}')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    assert response.get_data(as_text=True).startswith('retry:')
+
+
+def test_login_token_is_refused_in_the_url(client, short_streams):
+    login_token = client.environ_base['HTTP_AUTHORIZATION'][7:]
+    anonymous = server.app.test_client()
+    assert anonymous.get(f'/backend/api/events?token={login_token}').status_code == 401
+    assert anonymous.get('/backend/api/events').status_code == 401
+
+
+def test_stream_token_is_not_a_login_token(client, short_streams):
+    token = stream_token(client)
+    response = server.app.test_client().get('/backend/api/auth/verify', headers={'Authorization': f'Bearer {token}'})
+    assert response.status_code == 401
+
+
+def test_streams_can_be_disabled(client, monkeypatch):
+    monkeypatch.setattr(server, 'EVENT_STREAM_ENABLED', False)
+    assert client.post('/backend/api/events/token').get_json() == {'success': True, 'enabled': False}
+    assert client.get('/backend/api/events').status_code == 503
+
+
+def test_unsupported_change_streams_are_not_retried_on_every_subscribe(monkeypatch):
+    calls = []
+    
+    class StandaloneDatabase:
+        def watch(self, pipeline):
+            calls.append(pipeline)
+            raise OperationFailure('The $changeStream stage is only supported on replica sets', code=40573)
+    
+    monkeypatch.setattr(server, 'db', StandaloneDatabase())
+    monkeypatch.setattr(server, '_change_stream', {
+        'thread': None, 'active': False, 'retry_at': 0.0, 'backoff': server.CHANGE_STREAM_RETRY_SECONDS
+    })
+    for _ in range(3):
+        subscriber = server.subscribe_events()
+        for thread in threading.enumerate():
+            if thread.name == 'change-stream-watcher':
+                thread.join()
+        server.unsubscribe_events(subscriber)
+    assert len(calls) == 1
+    assert server._change_stream['backoff'] == 2 * server.CHANGE_STREAM_RETRY_SECONDS
@@ -0,0 +1,75 @@
+"""iCal export feed: token check and ETag stability"""
+from urllib.parse import urlparse
+
+import server
+
+
+def enable_export(client, room_id):
+    response = client.post(f'/backend/api/admin/rooms/{room_id}/ical-export')
+    assert response.status_code == 200
+    url = urlparse(response.get_json()['exportUrl'])
+    return f'{url.path}?{url.query}'
+
+
+def test_wrong_token_is_rejected_before_rendering(db, client, monkeypatch):
+    enable_export(client, '0002')
+    rendered = []
+    monkeypatch.setattr(server, 'render_room_ical', lambda *args: rendered.append(args))
+    
+    assert client.get('/backend/ical/rooms/0002.ics?token=wrong').status_code == 404
+    assert client.get('/backend/ical/rooms/0002.ics').status_code == 404
+    assert client.get('/backend/ical/rooms/0009.ics?token=wrong').status_code == 404
+    assert rendered == []
+
+
+def test_feed_lists_own_bookings_only(db, client):
+    db['bookings'].insert_one({
+        'roomId': '0002', 'checkIn': '2030-02-01', 'checkOut': '2030-02-03',
+        'source': 'airbnb_ical', 'icalUid': 'abc@airbnb'
+    })
+    response = client.get(enable_export(client, '0002'))
+    assert response.status_code == 200
+    body = response.get_data(as_text=True)
+    assert body.count('BEGIN:VEVENT') == 1
+    assert 'DTSTART;VALUE=DATE:20300110' in body
+    assert 'Guest' not in body
+
+
+def test_etag_survives_room_edits(db, client):
+    url = enable_export(client, '0002')
+    first = client.get(url)
+    etag = first.headers['ETag']
+    
+    # Rename, token rotation and an imported booking do not touch the export
+    response = client.put('/backend/api/admin/rooms/0002', json={'name': 'Renamed'})
+    assert response.status_code == 200
+    db['bookings'].insert_one({
+        'roomId': '0002', 'checkIn': '2030-03-01', 'checkOut': '2030-03-02', 'icalUid': 'x@airbnb'
+    })
+    url = enable_export(client, '0002')
+    second = client.get(url)
+    assert second.headers['ETag'] == etag
+    assert second.get_data() == first.get_data()
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+
+def test_etag_and_last_modified_follow_bookings(db, client):
+    url = enable_export(client, '0002')
+    first = client.get(url)
+    
+    response = client.post('/backend/api/admin/rooms/0002/book', json={
+        'checkIn': '2030-04-01', 'checkOut': '2030-04-03', 'guestName': 'New'
+    })
+    assert response.status_code == 200
+    booked = client.get(url)
+    assert booked.headers['ETag'] != first.headers['ETag']
+    assert booked.get_data(as_text=True).count('BEGIN:VEVENT') == 2
+    
+    # A cancellation moves Last-Modified forward, never back
+    response = client.post('/backend/api/admin/rooms/0002/unbook', json={
+        'checkIn': '2030-04-01', 'checkOut': '2030-04-03'
+    })
+    assert response.status_code == 200
+    cancelled = client.get(url)
+    assert cancelled.headers['ETag'] == first.headers['ETag']
+    assert cancelled.last_modified >= booked.last_modified
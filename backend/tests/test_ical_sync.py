@@ -0,0 +1,84 @@
+"""iCal feed sync: parser edge cases and what a sync writes"""
+import server
+from conftest import FEED
+
+
+def test_unchanged_feed_leaves_room_and_catalog_alone(db, ical_room, feed):
+    payload, status = server.sync_room_ical(ical_room)
+    assert status == 200 and payload['syncedCount'] == 1
+    
+    room = db['rooms'].find_one({'_id': '0001'})
+    version = server.get_meta_version(server.ROOM_CATALOG_META_ID)
+    payload, status = server.sync_room_ical(room)
+    assert status == 200 and payload['unchanged'] is True
+    
+    assert server.get_meta_version(server.ROOM_CATALOG_META_ID) == version
+    assert db['rooms'].find_one({'_id': '0001'})['updated_at'] == room['updated_at']
+    assert db['ical_sync_state'].find_one({'_id': '0001'})['unchanged'] is True
+
+
+def test_feed_without_booking_changes_does_not_bump_catalog(db, ical_room, feed):
+    server.sync_room_ical(ical_room)
+    room = db['rooms'].find_one({'_id': '0001'})
+    version = server.get_meta_version(server.ROOM_CATALOG_META_ID)
+    
+    # Different bytes, same stays
+    feed['body'] = FEED.replace(b'VERSION:2.0\r\n', b'VERSION:2.0\r\nX-WR-CALNAME:Room\r\n')
+    payload, status = server.sync_room_ical(room)
+    assert status == 200 and payload['unchanged'] is False and payload['syncedCount'] == 0
+    assert server.get_meta_version(server.ROOM_CATALOG_META_ID) == version
+
+
+def test_folded_and_escaped_properties_are_joined(db):
+    lines = [
+        b'BEGIN:VCALENDAR\r\n',
+        b'BEGIN:VEVENT\r\n',
+        b'UID:stay-\r\n',
+        b' 2@airbnb\r\n',
+        b'DTSTART;VALUE=DATE:20300401\r\n',
+        b'DTEND:20300403T120000Z\r\n',
+        b'SUMMARY:Nguyen\\, Anh\r\n',
+        b'\t (2 guests)\r\n',
+        b'BEGIN:VALARM\r\n',
+        b'SUMMARY:Reminder\r\n',
+        b'END:VALARM\r\n',
+        b'END:VEVENT\r\n',
+        b'END:VCALENDAR\r\n',
+    ]
+    assert list(server.iter_ical_events(lines)) == [{
+        'UID': 'stay-2@airbnb', 'DTSTART': '20300401', 'DTEND': '20300403', 'SUMMARY': 'Nguyen, Anh (2 guests)'
+    }]
+
+
+def test_truncated_feed_raises_after_its_events():
+    events = server.iter_ical_events(FEED.replace(b'END:VCALENDAR\r\n', b'').splitlines(keepends=True))
+    assert next(events)['UID'] == 'stay-1@airbnb'
+    try:
+        next(events)
+    except ValueError as e:
+        assert 'Truncated' in str(e)
+    else:
+        raise AssertionError('a feed without END:VCALENDAR must not parse')
+
+
+def test_diff_adds_moves_and_cancels():
+    existing = [
+        {'checkIn': '2030-02-01', 'checkOut': '2030-02-03', 'source': 'airbnb_ical', 'icalUid': 'stay-1@airbnb'},
+        {'checkIn': '2030-02-10', 'checkOut': '2030-02-12', 'source': 'airbnb_ical', 'icalUid': 'gone@airbnb'},
+        {'checkIn': '2030-02-20', 'checkOut': '2030-02-22', 'source': 'admin', 'guestName': 'Walk-in'},
+    ]
+    feed = FEED.replace(b'END:VCALENDAR', b'BEGIN:VEVENT\r\nUID:new@airbnb\r\n'
+                        b'DTSTART:20300601\r\nDTEND:20300603\r\nEND:VEVENT\r\nEND:VCALENDAR')
+    diff, skipped = server.diff_ical_bookings(feed, existing)
+    assert [(b['icalUid'], b['checkIn']) for b in diff['added']] == [('new@airbnb', '2030-06-01')]
+    assert diff['changed'] == [(existing[0], {'checkIn': '2030-03-01', 'checkOut': '2030-03-05'})]
+    assert diff['removed'] == [existing[1]]
+    assert skipped == 0
+
+
+def test_truncated_feed_cancels_nothing(db, ical_room, feed):
+    server.sync_room_ical(ical_room)
+    feed['body'] = b'BEGIN:VCALENDAR\r\nVERSION:2.0\r\n'
+    payload, status = server.sync_room_ical(db['rooms'].find_one({'_id': '0001'}))
+    assert status != 200
+    assert db['bookings'].count_documents({'roomId': '0001', 'icalUid': 'stay-1@airbnb'}) == 1
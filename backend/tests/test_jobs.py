@@ -0,0 +1,69 @@
+"""Background jobs: dedupe, sliced runs on poll and abandoned leases"""
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def on_poll(monkeypatch):
+    """Run jobs the serverless way: on GET /jobs/<id> polls"""
+    monkeypatch.setattr(server, 'JOB_RUN_IN_BACKGROUND', False)
+    monkeypatch.setattr(server, 'JOB_LEASE_SECONDS', 60)
+
+
+@pytest.fixture
+def ical_rooms(db):
+    db['rooms'].insert_many([
+        {'_id': f'001{n}', 'name': f'Extra {n}', 'price': 100, 'persons': 2} for n in range(2)
+    ])
+    db['rooms'].update_many({}, {'$set': {'icalUrl': 'https://example.com/feed.ics'}})
+
+
+def test_concurrent_requests_share_one_job(db, client, on_poll):
+    first = client.post('/backend/api/admin/sync-all-ical')
+    second = client.post('/backend/api/admin/sync-all-ical')
+    assert first.status_code == second.status_code == 202
+    assert first.get_json()['jobId'] == second.get_json()['jobId']
+    assert second.get_json()['message'] == 'Job already in progress'
+    assert db['jobs'].count_documents({}) == 1
+
+
+def test_sync_all_runs_in_slices_on_poll(db, client, on_poll, ical_rooms, feed, monkeypatch):
+    monkeypatch.setattr(server, 'ICAL_SYNC_MAX_WORKERS', 2)
+    monkeypatch.setattr(server, 'JOB_SLICE_SECONDS', 0)  # One group of rooms per poll
+    job_id = client.post('/backend/api/admin/sync-all-ical').get_json()['jobId']
+    
+    job = client.get(f'/backend/api/admin/jobs/{job_id}').get_json()['data']
+    assert job['status'] == 'queued'
+    assert job['progress'] == {'done': 2, 'total': 5}
+    assert 'checkpoint' not in job
+    
+    for _ in range(2):
+        job = client.get(f'/backend/api/admin/jobs/{job_id}').get_json()['data']
+    assert job['status'] == 'succeeded'
+    assert sorted(r['roomId'] for r in job['result']['results']) == ['0001', '0002', '0003', '0010', '0011']
+    assert feed['fetches'] == 5
+    assert 'activeKey' not in db['jobs'].find_one({'_id': job_id})
+
+
+def test_stale_lease_is_taken_over(db, client, on_poll, ical_rooms, feed):
+    job, _ = server.enqueue_job('ical.sync_all', {'force': False})
+    db['jobs'].update_one({'_id': job['_id']}, {'$set': {
+        'status': 'running', 'owner': 'frozen', 'attempts': 1,
+        'heartbeatAt': datetime.now(timezone.utc) - timedelta(minutes=5)
+    }})
+    job = client.get(f"/backend/api/admin/jobs/{job['_id']}").get_json()['data']
+    assert job['status'] == 'succeeded'
+
+
+def test_abandoned_job_releases_its_key(db, client, on_poll):
+    job, _ = server.enqueue_job('bookings.archive', {})
+    db['jobs'].update_one({'_id': job['_id']}, {'$set': {
+        'status': 'running', 'owner': 'gone', 'attempts': server.JOB_MAX_ATTEMPTS,
+        'heartbeatAt': datetime.now(timezone.utc) - timedelta(minutes=5)
+    }})
+    again, created = server.enqueue_job('bookings.archive', {})
+    assert created and again['_id'] != job['_id']
+    assert db['jobs'].find_one({'_id': job['_id']})['status'] == 'failed'
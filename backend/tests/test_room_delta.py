@@ -0,0 +1,67 @@
+"""Room catalog versioning: ETag revalidation and delta sync tokens"""
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import server
+
+
+def test_revalidation_is_answered_until_a_room_changes(db, client):
+    first = client.get('/backend/api/admin/rooms')
+    etag = first.headers['ETag']
+    assert client.get('/backend/api/admin/rooms', headers={'If-None-Match': etag}).status_code == 304
+    
+    version = server.get_meta_version(server.ROOM_CATALOG_META_ID)
+    assert client.put('/backend/api/admin/rooms/0001', json={'name': 'Renamed'}).status_code == 200
+    assert server.get_meta_version(server.ROOM_CATALOG_META_ID) == version + 1
+    
+    second = client.get('/backend/api/admin/rooms', headers={'If-None-Match': etag})
+    assert second.status_code == 200 and second.headers['ETag'] != etag
+    assert 'Renamed' in [room['name'] for room in second.get_json()['data']]
+
+
+def test_other_workers_writes_are_noticed(db, client, monkeypatch):
+    monkeypatch.setattr(server, 'ROOM_CATALOG_VERSION_CHECK_SECONDS', 0)
+    etag = client.get('/backend/api/admin/rooms').headers['ETag']
+    server.bump_meta_version(server.ROOM_CATALOG_META_ID)  # As another process would
+    assert client.get('/backend/api/admin/rooms', headers={'If-None-Match': etag}).status_code == 200
+
+
+def test_delta_reports_changed_and_deleted_rooms(db, client):
+    token = client.get('/backend/api/admin/rooms').get_json()['syncToken']
+    client.put('/backend/api/admin/rooms/0001', json={'price': 150})
+    client.delete('/backend/api/admin/rooms/0003')
+    
+    body = client.get(f'/backend/api/admin/rooms?since={token}').get_json()
+    assert [room['id'] for room in body['data']] == ['0001']
+    assert body['deleted'] == ['0003'] and body['full'] is False
+    
+    # Nothing moved since the new token: answered from the version alone
+    again = client.get(f"/backend/api/admin/rooms?since={body['syncToken']}").get_json()
+    assert again['data'] == [] and again['deleted'] == [] and again['syncToken'] == body['syncToken']
+
+
+def test_recreated_room_is_changed_not_deleted(db, client):
+    token = client.get('/backend/api/admin/rooms').get_json()['syncToken']
+    client.delete('/backend/api/admin/rooms/0003')
+    db['rooms'].insert_one({'_id': '0003', 'name': 'Room 3 again', 'price': 90, 'persons': 2,
+                            'updated_at': datetime.now(timezone.utc)})
+    server.room_catalog_changed('0003')
+    
+    body = client.get(f'/backend/api/admin/rooms?since={token}').get_json()
+    assert [room['id'] for room in body['data']] == ['0003'] and body['deleted'] == []
+
+
+def test_token_older_than_tombstones_gets_the_full_list(db, client):
+    too_old = datetime.now(timezone.utc) - timedelta(days=server.ROOM_TOMBSTONE_RETENTION_DAYS + 1)
+    token = server.encode_sync_token(too_old, server.get_meta_version(server.ROOM_CATALOG_META_ID))
+    client.put('/backend/api/admin/rooms/0001', json={'price': 150})
+    body = client.get(f'/backend/api/admin/rooms?since={token}').get_json()
+    assert body['full'] is True and len(body['data']) == 3
+
+
+def test_since_rejects_garbage_and_paging(db, client):
+    garbage = base64.urlsafe_b64encode(json.dumps({'t': 'yesterday'}).encode()).decode()
+    assert client.get(f'/backend/api/admin/rooms?since={garbage}').status_code == 400
+    token = client.get('/backend/api/admin/rooms').get_json()['syncToken']
+    assert client.get(f'/backend/api/admin/rooms?since={token}&limit=2').status_code == 400
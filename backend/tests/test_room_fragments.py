@@ -0,0 +1,32 @@
+"""Single-room responses served from the per-room fragment cache"""
+import server
+
+
+def test_single_room_hit_skips_serialization(db, client, monkeypatch):
+    first = client.get('/backend/api/admin/rooms/0002')
+    assert first.status_code == 200
+    assert first.get_json()['data']['bookedIntervals'][0]['checkIn'] == '2030-01-10'
+    
+    rendered = []
+    convert = server.convert_room_for_api
+    monkeypatch.setattr(server, 'convert_room_for_api', lambda *args: rendered.append(args) or convert(*args))
+    monkeypatch.setattr(server, 'attach_bookings', lambda rooms: rendered.append(rooms) or rooms)
+    hits = server.room_fragment_stats()['hits']
+    
+    second = client.get('/backend/api/admin/rooms/0002')
+    assert second.get_data() == first.get_data()
+    assert rendered == []
+    assert server.room_fragment_stats()['hits'] == hits + 1
+
+
+def test_room_change_renders_a_new_fragment(db, client):
+    first = client.get('/backend/api/admin/rooms/0002')
+    response = client.post('/backend/api/admin/rooms/0002/book', json={
+        'checkIn': '2030-02-01', 'checkOut': '2030-02-03', 'guestName': 'New'
+    })
+    assert response.status_code == 200
+    
+    second = client.get('/backend/api/admin/rooms/0002')
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert [b['checkIn'] for b in second.get_json()['data']['bookedIntervals']] == ['2030-01-10', '2030-02-01']
+
@@ -0,0 +1,41 @@
+"""Room listing against an in-memory MongoDB (mongomock)"""
+
+
+def test_paged_listing_includes_bookings(db, client):
+    response = client.get('/backend/api/admin/rooms?include=bookings&sort=name&limit=5')
+    assert response.status_code == 200
+    rooms = {room['id']: room for room in response.get_json()['data']}
+    assert [b['checkIn'] for b in rooms['0002']['bookedIntervals']] == ['2030-01-10']
+    assert rooms['0001']['bookedIntervals'] == []
+
+
+def test_paged_listing_without_bookings_omits_them(db, client):
+    response = client.get('/backend/api/admin/rooms?sort=name&limit=2')
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [room['id'] for room in body['data']] == ['0001', '0002']
+    assert all('bookedIntervals' not in room for room in body['data'])
+
+
+def test_cursor_pages_through_every_room_once(db, client):
+    seen = []
+    url = '/backend/api/admin/rooms?sort=price_desc&limit=2'
+    while url:
+        body = client.get(url).get_json()
+        seen += [room['id'] for room in body['data']]
+        url = body['nextCursor'] and f"/backend/api/admin/rooms?sort=price_desc&limit=2&cursor={body['nextCursor']}"
+    assert seen == ['0003', '0002', '0001']
+
+
+def test_cursor_does_not_skip_rooms_added_behind_it(db, client):
+    first = client.get('/backend/api/admin/rooms?sort=room_id&limit=2').get_json()
+    db['rooms'].insert_one({'_id': '0000', 'name': 'Room 0', 'price': 100, 'persons': 2})
+    rest = client.get(f"/backend/api/admin/rooms?sort=room_id&limit=2&cursor={first['nextCursor']}").get_json()
+    assert [room['id'] for room in rest['data']] == ['0003']
+    assert rest['nextCursor'] is None
+
+
+def test_cursor_is_bound_to_its_sort(db, client):
+    cursor = client.get('/backend/api/admin/rooms?sort=name&limit=1').get_json()['nextCursor']
+    assert client.get(f'/backend/api/admin/rooms?sort=price_asc&limit=1&cursor={cursor}').status_code == 400
+    assert client.get('/backend/api/admin/rooms?sort=name&cursor=not-a-cursor').status_code == 400
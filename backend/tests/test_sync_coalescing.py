@@ -0,0 +1,75 @@
+"""Single-flight syncs: in-process coalescing and cross-worker sync_locks leases"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+@pytest.fixture
+def flights(db, monkeypatch):
+    monkeypatch.setattr(server, '_sync_flights', {})
+    monkeypatch.setattr(server, '_sync_recent', {})
+    monkeypatch.setattr(server, 'SYNC_LOCK_POLL_SECONDS', 0.01)
+
+
+def test_concurrent_callers_share_one_run(flights):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+    
+    def run():
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        return {'synced': True}, 200
+    
+    modes = []
+    leader = threading.Thread(target=lambda: modes.append(server.coalesce_sync('ical:0001', run)[2]))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: modes.append(server.coalesce_sync('ical:0001', run)[2]))
+    follower.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+    
+    assert len(runs) == 1 and sorted(modes) == ['fresh', 'joined']
+    assert server.coalesce_sync('ical:0001', run)[2] == 'cached'
+    assert server.coalesce_sync('ical:0001', run, force=True)[2] == 'fresh' and len(runs) == 2
+
+
+def test_result_of_another_worker_is_reused(db, flights):
+    db['sync_locks'].insert_one({
+        '_id': 'ical:0001', 'expiresAt': None, 'finishedAt': datetime.now(timezone.utc),
+        'result': [{'synced': True}, 200]
+    })
+    payload, status, mode = server.coalesce_sync('ical:0001', lambda: pytest.fail('must not run'))
+    assert (payload, status, mode) == ({'synced': True}, 200, 'cached')
+
+
+def test_held_lease_is_joined(db, flights):
+    now = datetime.now(timezone.utc)
+    db['sync_locks'].insert_one({'_id': 'ical:0001', 'owner': 'other', 'expiresAt': now + timedelta(minutes=1)})
+    
+    def other_worker_finishes():
+        time.sleep(0.05)
+        db['sync_locks'].update_one({'_id': 'ical:0001'}, {'$set': {
+            'expiresAt': None, 'finishedAt': datetime.now(timezone.utc), 'result': [{'synced': True}, 200]
+        }})
+    
+    threading.Thread(target=other_worker_finishes).start()
+    result, mode = server.locked_sync('ical:0001', lambda: pytest.fail('must not run'))
+    assert result == ({'synced': True}, 200) and mode == 'joined'
+
+
+def test_expired_lease_is_taken_over(db, flights):
+    past = datetime.now(timezone.utc) - timedelta(minutes=1)
+    db['sync_locks'].insert_one({'_id': 'ical:0001', 'owner': 'dead', 'expiresAt': past})
+    
+    result, mode = server.locked_sync('ical:0001', lambda: ({'synced': True}, 200))
+    assert mode == 'fresh'
+    lock = db['sync_locks'].find_one({'_id': 'ical:0001'})
+    assert lock['expiresAt'] is None and lock['result'] == [{'synced': True}, 200]
@@ -311,6 +311,120 @@ function showDashboard() {
     
     // Initialize dashboard
     roomManager.loadRooms();
+    
+    // Keep data current with other staff members' changes
+    connectChangeEvents();
+}
+
+// ===== Live Change Events =====
+// The server pushes compact change events (room.updated, booking.added,
+// transaction.created, ...) over Server-Sent Events. Bursts are coalesced into
+// one delta refresh of the affected data. The stream URL carries a short-lived
+// stream token, never the login token; when the server ends the stream and the
+// token has expired, a new token is fetched and the stream reopened from the
+// last event seen. Deployments without streams (serverless) are polled instead.
+const CHANGE_POLL_MS = 60 * 1000;
+const CHANGE_RECONNECT_MS = 3000;
+let changeEventSource = null;
+let changeEventsWanted = false;
+let lastChangeEventId = null;
+let changePollTimer = null;
+let roomRefreshTimer = null;
+let financeRefreshTimer = null;
+
+const EVENTS_BASE_URL = API_BASE_URL.replace(/\/admin$/, '') + '/events';
+
+async function connectChangeEvents() {
+    if (changeEventSource || changePollTimer || !getAuthToken()) return;
+    changeEventsWanted = true;
+    
+    let data = { enabled: false };
+    if (typeof EventSource !== 'undefined') {
+        try {
+            const response = await fetch(`${EVENTS_BASE_URL}/token`, {
+                method: 'POST',
+                headers: getAuthHeaders()
+            });
+            data = await response.json();
+            if (!response.ok || !data.success) {
+                throw new Error(data.error || 'Could not open live updates');
+            }
+        } catch (error) {
+            logger.debug('Live updates unavailable:', error);
+            data = { enabled: false };
+        }
+    }
+    if (!changeEventsWanted || changeEventSource || changePollTimer) return;
+    
+    if (!data.enabled) {
+        changePollTimer = setInterval(() => {
+            if (document.hidden) return;
+            scheduleRoomRefresh();
+            scheduleFinanceRefresh();
+        }, CHANGE_POLL_MS);
+        return;
+    }
+    
+    let eventsUrl = `${EVENTS_BASE_URL}?token=${encodeURIComponent(data.token)}`;
+    if (lastChangeEventId) {
+        eventsUrl += `&lastEventId=${encodeURIComponent(lastChangeEventId)}`;
+    }
+    const source = new EventSource(eventsUrl);
+    changeEventSource = source;
+    
+    const track = (listener) => (event) => {
+        if (event.lastEventId) lastChangeEventId = event.lastEventId;
+        listener();
+    };
+    const onRoomChange = track(() => scheduleRoomRefresh());
+    const onFinanceChange = track(() => scheduleFinanceRefresh());
+    ['room.updated', 'room.deleted', 'rooms.changed',
+     'booking.added', 'booking.removed', 'booking.updated', 'reset'].forEach(type => {
+        source.addEventListener(type, onRoomChange);
+    });
+    ['transaction.created', 'transaction.updated', 'transaction.deleted', 'reset'].forEach(type => {
+        source.addEventListener(type, onFinanceChange);
+    });
+    
+    source.onerror = () => {
+        // The browser reconnects by itself until the server refuses the
+        // (expired) stream token; then open a new stream with a fresh one
+        if (source.readyState !== EventSource.CLOSED || changeEventSource !== source) return;
+        changeEventSource = null;
+        setTimeout(() => {
+            if (changeEventsWanted) connectChangeEvents();
+        }, CHANGE_RECONNECT_MS);
+    };
+}
+
+function disconnectChangeEvents() {
+    changeEventsWanted = false;
+    lastChangeEventId = null;
+    if (changeEventSource) {
+        changeEventSource.close();
+        changeEventSource = null;
+    }
+    if (changePollTimer) {
+        clearInterval(changePollTimer);
+        changePollTimer = null;
+    }
+}
+
+function scheduleRoomRefresh() {
+    clearTimeout(roomRefreshTimer);
+    roomRefreshTimer = setTimeout(() => {
+        if (isUploadingImages) return;
+        roomManager.loadRoomsSilent().catch(error => logger.debug('Live room refresh failed:', error));
+    }, 300);
+}
+
+function scheduleFinanceRefresh() {
+    clearTimeout(financeRefreshTimer);
+    financeRefreshTimer = setTimeout(() => {
+        if (document.getElementById('finance')?.classList.contains('active')) {
+            loadTransactions();
+        }
+    }, 300);
 }
 
 // Force show dashboard tab (used after login to ensure correct tab is shown)
@@ -384,6 +498,7 @@ function applyRoleBasedAccess() {
 function logout() {
     if (confirm('Are you sure you want to logout?')) {
         clearAuthData();  // Clear token and session data
+        disconnectChangeEvents();
         document.getElementById('login-form').reset();
         document.getElementById('login-error').textContent = '';
         showLoginPage();
@@ -438,26 +553,35 @@ function formatSyncTime(dateString) {
     }
 }
 
+// Describe a room's last iCal sync from the scheduler status
+function describeIcalStatus(status) {
+    if (status.error) {
+        return `⚠️ Sync failed ${formatSyncTime(status.lastRunAt)}`;
+    }
+    return `Last sync: ${formatSyncTime(status.lastSuccessAt || status.lastRunAt)}`;
+}
+
 // Update last sync time display for a specific room
-function updateLastSyncDisplay(roomId) {
+// (status comes from /ical/status; without it the sync just happened)
+function updateLastSyncDisplay(roomId, status = null) {
     const dropdown = document.querySelector(`.room-settings-dropdown[data-room-id="${roomId}"]`);
     if (!dropdown) return;
     
     const icalSection = dropdown.querySelector('.room-ical-section');
     if (!icalSection) return;
+    if (status && !status.lastRunAt) return;
     
     // Update or create the last sync element
     let lastSyncElement = icalSection.querySelector('.ical-last-sync');
-    const syncTime = formatSyncTime(new Date().toISOString());
+    const text = status ? describeIcalStatus(status) : `Last sync: ${formatSyncTime(new Date().toISOString())}`;
     
-    if (lastSyncElement) {
-        lastSyncElement.textContent = `Last sync: ${syncTime}`;
-    } else {
+    if (!lastSyncElement) {
         lastSyncElement = document.createElement('small');
         lastSyncElement.className = 'ical-last-sync';
-        lastSyncElement.textContent = `Last sync: ${syncTime}`;
         icalSection.appendChild(lastSyncElement);
     }
+    lastSyncElement.textContent = text;
+    lastSyncElement.title = status && status.error ? status.error : '';
 }
 
 // ===== Room Management System =====
@@ -466,6 +590,11 @@ class RoomManager {
     constructor() {
         this.rooms = [];
         this.apiUrl = API_BASE_URL + '/rooms';
+        // The list endpoint returns a lightweight summary by default;
+        // the dashboard, calendars and edit forms need the full room data
+        this.listUrl = this.apiUrl + '?include=bookings,images,details';
+        // Token from the last list response; refreshes ask only for changes since
+        this.syncToken = null;
     }
 
     // Load rooms from MongoDB
@@ -477,17 +606,18 @@ class RoomManager {
         }
         
         try {
-            const response = await fetch(this.apiUrl);
+            const response = await fetch(this.listUrl);
             const result = await response.json();
             
             if (result.success) {
                 this.rooms = result.data || [];
+                this.syncToken = result.syncToken || null;
                 console.log(`✓ Loaded ${this.rooms.length} rooms from database`);
                 updateDashboard();
                 displayRooms();
                 
-                // Auto-sync iCal for all rooms with configured URLs (runs in background)
-                autoSyncAllIcal();
+                // Feeds are synced by the server's scheduler; only show its status
+                loadIcalStatus();
             } else {
                 console.error('Failed to load rooms:', result.error);
                 alert('Failed to load rooms from database');
@@ -498,14 +628,23 @@ class RoomManager {
         }
     }
 
-    // Load rooms silently (no error alerts) - used after image upload/delete
+    // Load rooms silently (no error alerts) - used after image upload/delete.
+    // Only rooms changed since the last load are fetched and merged in.
     async loadRoomsSilent() {
-        const response = await fetch(this.apiUrl);
+        const url = this.syncToken
+            ? `${this.listUrl}&since=${encodeURIComponent(this.syncToken)}`
+            : this.listUrl;
+        const response = await fetch(url);
         const result = await response.json();
         
         if (result.success) {
-            this.rooms = result.data || [];
-            console.log(`✓ Loaded ${this.rooms.length} rooms from database`);
+            if (!this.syncToken || result.full) {
+                this.rooms = result.data || [];
+            } else {
+                this.mergeRoomChanges(result.data || [], result.deleted || []);
+            }
+            this.syncToken = result.syncToken || null;
+            console.log(`✓ Refreshed rooms from database (${(result.data || []).length} changed)`);
             updateDashboard();
             displayRooms();
         } else {
@@ -513,6 +652,20 @@ class RoomManager {
         }
     }
 
+    // Apply a delta sync response: replace changed rooms by id, drop deleted ones
+    mergeRoomChanges(changedRooms, deletedIds) {
+        const deleted = new Set(deletedIds);
+        const changed = new Map(changedRooms.map(room => [room.id, room]));
+        const merged = this.rooms
+            .filter(room => !deleted.has(room.id))
+            .map(room => {
+                const update = changed.get(room.id);
+                changed.delete(room.id);
+                return update || room;
+            });
+        this.rooms = merged.concat([...changed.values()]);
+    }
+
     // Get all rooms
     getAllRooms() {
         return this.rooms;
@@ -612,6 +765,7 @@ const roomManager = new RoomManager();
 // ===== Calendar State =====
 let currentCalendarYear = new Date().getFullYear();
 let currentCalendarMonth = new Date().getMonth(); // 0-indexed
+let calendarMonthData = null; // Server occupancy grid for the displayed month
 
 // ===== UI Functions =====
 
@@ -827,7 +981,7 @@ document.addEventListener('DOMContentLoaded', function() {
 });
 
 // Apply filters and render calendars
-function applyDashboardFilters() {
+async function applyDashboardFilters() {
     const capacityFilter = document.getElementById('dashboard-filter-capacity')?.value || '';
     const priceFilter = document.getElementById('dashboard-filter-price')?.value || '';
     let checkinDate = document.getElementById('dashboard-filter-checkin')?.value || '';
@@ -875,7 +1029,11 @@ function applyDashboardFilters() {
 
     // Filter by availability for date range (check-in to check-out)
     if (checkinDate && checkoutDate) {
+        const availableIds = await fetchAvailableRoomIds(checkinDate, checkoutDate);
         filteredRooms = filteredRooms.filter(room => {
+            if (availableIds) {
+                return availableIds.has(room.room_id || room.id);
+            }
             return isRoomAvailableForDateRange(room, checkinDate, checkoutDate);
         });
     } else if (checkinDate) {
@@ -892,11 +1050,63 @@ function applyDashboardFilters() {
     // Update results count
     updateFilterResultsCount(filteredRooms.length, roomManager.getAllRooms().length);
 
+    // Load the displayed month's occupancy grid before rendering
+    calendarMonthData = await loadCalendarMonth(currentCalendarYear, currentCalendarMonth);
+
     // Render filtered calendars with temporary selection highlight
     renderFilteredCalendars(filteredRooms, checkinDate, checkoutDate);
 }
 
-// Check if room is available for entire date range
+// Load the server's occupancy grid for a month (null if the lookup fails)
+async function loadCalendarMonth(year, month) {
+    const monthKey = `${year}-${String(month + 1).padStart(2, '0')}`;
+    try {
+        const response = await fetch(`${API_BASE_URL}/calendar?month=${monthKey}&include=bookings`);
+        const result = await response.json();
+        if (response.ok && result.success) {
+            const rooms = new Map();
+            result.data.forEach(entry => {
+                const bookedDates = new Set();
+                for (let day = 1; day <= entry.bitmap.length; day++) {
+                    if (entry.bitmap[day - 1] === '1') {
+                        bookedDates.add(`${monthKey}-${String(day).padStart(2, '0')}`);
+                    }
+                }
+                rooms.set(entry.room_id || entry.id, { bookedDates, bookings: entry.bookings || [] });
+            });
+            return { monthKey, rooms };
+        }
+    } catch (error) {
+        logger.debug('Calendar grid lookup failed, using room bookings:', error);
+    }
+    return null;
+}
+
+// Get a room's entry in the loaded month grid, if it is for the displayed month
+function getCalendarMonthEntry(room) {
+    const monthKey = `${currentCalendarYear}-${String(currentCalendarMonth + 1).padStart(2, '0')}`;
+    if (!calendarMonthData || calendarMonthData.monthKey !== monthKey) {
+        return null;
+    }
+    return calendarMonthData.rooms.get(room.room_id || room.id) || null;
+}
+
+// Ask the server which rooms are free for a date range (null if the lookup fails)
+async function fetchAvailableRoomIds(checkinDate, checkoutDate) {
+    try {
+        const params = new URLSearchParams({ checkIn: checkinDate, checkOut: checkoutDate });
+        const response = await fetch(`${API_BASE_URL}/availability?${params}`);
+        const result = await response.json();
+        if (response.ok && result.success) {
+            return new Set(result.data.map(room => room.room_id || room.id));
+        }
+    } catch (error) {
+        logger.debug('Availability lookup failed, checking locally:', error);
+    }
+    return null;
+}
+
+// Check if room is available for entire date range (local fallback)
 function isRoomAvailableForDateRange(room, checkinDate, checkoutDate) {
     const bookedDates = getBookedDatesForRoom(room);
     const startDate = new Date(checkinDate);
@@ -1072,7 +1282,10 @@ function createRoomCalendarRow(room, checkinDate, checkoutDate) {
     
     const roomId = room.room_id || room.id;
     const icalUrl = room.icalUrl || '';
-    const lastSync = room.lastIcalSync ? formatSyncTime(room.lastIcalSync) : '';
+    const syncStatus = icalSyncStatus[room.room_id || room.id];
+    const lastSync = syncStatus && syncStatus.lastRunAt
+        ? describeIcalStatus(syncStatus)
+        : (room.lastIcalSync ? `Last sync: ${formatSyncTime(room.lastIcalSync)}` : '');
     
     // Check if promotion is active
     const hasPromotion = room.promotion && room.promotion.active;
@@ -1148,7 +1361,7 @@ function createRoomCalendarRow(room, checkinDate, checkoutDate) {
                     <button type="button" class="btn-ical-save" title="Save URL">💾</button>
                     <button type="button" class="btn-ical-sync" title="Sync bookings" ${!icalUrl ? 'disabled' : ''}>🔄</button>
                 </div>
-                ${lastSync ? `<small class="ical-last-sync">Last sync: ${lastSync}</small>` : ''}
+                ${lastSync ? `<small class="ical-last-sync">${lastSync}</small>` : ''}
             </div>
         `;
     }
@@ -1406,9 +1619,10 @@ function createCalendarGrid(room, checkinDate, checkoutDate) {
         grid.appendChild(header);
     });
 
-    // Get booked dates for this room
-    const bookedDates = getBookedDatesForRoom(room);
-    const bookedIntervals = getBookedIntervalsForRoom(room);
+    // Get booked dates for this room (from the month grid when loaded)
+    const monthEntry = getCalendarMonthEntry(room);
+    const bookedDates = monthEntry ? monthEntry.bookedDates : getBookedDatesForRoom(room);
+    const bookedIntervals = monthEntry ? monthEntry.bookings : getBookedIntervalsForRoom(room);
 
     // Build a map of date to interval info for booking bars
     const dateToIntervalInfo = buildDateToIntervalMap(bookedIntervals, currentCalendarYear, currentCalendarMonth);
@@ -4534,8 +4748,9 @@ async function syncRoomIcal() {
             // Show result message
             const icalStatus = document.getElementById('ical-status');
             if (icalStatus) {
-                if (data.syncedCount > 0) {
-                    icalStatus.textContent = `✓ ${data.syncedCount} new booking(s) synced!`;
+                if (data.syncedCount > 0 || data.updatedCount > 0 || data.removedCount > 0) {
+                    const cancelled = data.removedCount ? `, ${data.removedCount} cancelled` : '';
+                    icalStatus.textContent = `✓ ${data.syncedCount} new booking(s) synced${cancelled}!`;
                     icalStatus.className = 'ical-success';
                 } else {
                     icalStatus.textContent = '✓ Already up to date';
@@ -4569,6 +4784,53 @@ async function syncRoomIcal() {
     }
 }
 
+// Poll a background job until it finishes; resolves with the job, onProgress gets each poll.
+// Polls back off from 1s to 5s. Rejects when the job takes longer than timeoutMs
+// or makes no progress (no heartbeat) for stallMs.
+const JOB_POLL_MIN_MS = 1000;
+const JOB_POLL_MAX_MS = 5000;
+
+async function waitForJob(jobId, onProgress = null, { timeoutMs = 10 * 60 * 1000, stallMs = 2 * 60 * 1000 } = {}) {
+    const startedAt = Date.now();
+    let delay = JOB_POLL_MIN_MS;
+    let lastSign = null;
+    let lastChangeAt = startedAt;
+    
+    while (true) {
+        const response = await fetch(`${API_BASE_URL}/jobs/${jobId}`, {
+            headers: getAuthHeaders()
+        });
+        const data = await response.json();
+        if (!response.ok || !data.success) {
+            throw new Error(data.error || 'Could not read job status');
+        }
+        
+        const job = data.data;
+        if (onProgress) {
+            onProgress(job);
+        }
+        if (job.status === 'succeeded' || job.status === 'failed') {
+            return job;
+        }
+        
+        const now = Date.now();
+        const sign = `${job.status}|${job.heartbeatAt}|${job.progress && job.progress.done}`;
+        if (sign !== lastSign) {
+            lastSign = sign;
+            lastChangeAt = now;
+        }
+        if (now - startedAt > timeoutMs) {
+            throw new Error('The job did not finish in time. It may still complete - check again later.');
+        }
+        if (now - lastChangeAt > stallMs) {
+            throw new Error('The job stopped making progress. It will be retried by the server.');
+        }
+        
+        await new Promise(resolve => setTimeout(resolve, delay));
+        delay = Math.min(Math.round(delay * 1.5), JOB_POLL_MAX_MS);
+    }
+}
+
 // Sync all rooms with iCal URLs (called from dashboard or bulk action)
 async function syncAllIcal() {
     if (!confirm('This will sync iCal data for all rooms with configured URLs. Continue?')) {
@@ -4581,15 +4843,30 @@ async function syncAllIcal() {
             headers: getAuthHeaders()
         });
         
-        const data = await response.json();
+        const accepted = await response.json();
+        if (!response.ok || !accepted.success) {
+            alert('Bulk sync failed: ' + (accepted.error || 'Unknown error'));
+            return;
+        }
         
-        if (response.ok && data.success) {
+        // The sync runs as a background job; wait for its per-room results
+        const job = await waitForJob(accepted.jobId, (job) => {
+            if (job.progress && job.progress.total) {
+                logger.info(`Bulk iCal sync: ${job.progress.done}/${job.progress.total} rooms`);
+            }
+        });
+        const data = job.status === 'succeeded' ? job.result : { success: false, error: job.error };
+        
+        if (data.success) {
             logger.info(`Bulk iCal sync completed: ${data.message}`);
             
             let message = `Sync completed!\n\n`;
             for (const result of data.results) {
-                if (result.success) {
-                    message += `✓ ${result.roomName}: ${result.syncedCount} new bookings\n`;
+                if (result.success && result.unchanged) {
+                    message += `✓ ${result.roomName}: unchanged\n`;
+                } else if (result.success) {
+                    const cancelled = result.removedCount ? `, ${result.removedCount} cancelled` : '';
+                    message += `✓ ${result.roomName}: ${result.syncedCount} new bookings${cancelled}\n`;
                 } else {
                     message += `✗ ${result.roomName}: ${result.error}\n`;
                 }
@@ -4606,7 +4883,7 @@ async function syncAllIcal() {
         }
     } catch (error) {
         console.error('Error in bulk iCal sync:', error);
-        alert('Error syncing all rooms. Please try again.');
+        alert('Error syncing all rooms: ' + (error.message || 'Please try again.'));
     }
 }
 
@@ -4768,71 +5045,28 @@ async function syncRoomIcalFromCard(roomId, syncBtn) {
     }
 }
 
-// Flag to prevent multiple auto-syncs running simultaneously
-let isAutoSyncing = false;
+// Per-room status of the server's background iCal sync, by room id
+let icalSyncStatus = {};
 
-// Auto-sync all rooms with iCal URLs on page load (runs silently in background)
-async function autoSyncAllIcal() {
-    // Prevent multiple simultaneous auto-syncs
-    if (isAutoSyncing) {
-        console.log('⏸️ Auto-sync already in progress, skipping');
-        return;
-    }
-    
-    // Get all rooms with iCal URLs
-    const rooms = roomManager.getAllRooms();
-    const roomsWithIcal = rooms.filter(r => r.icalUrl && r.icalUrl.trim() !== '');
-    
-    if (roomsWithIcal.length === 0) {
-        console.log('📅 No rooms with iCal URLs configured');
-        return;
-    }
-    
-    isAutoSyncing = true;
-    console.log(`📅 Auto-syncing iCal for ${roomsWithIcal.length} room(s)...`);
-    
-    let totalSynced = 0;
-    let hasNewBookings = false;
-    
+// Load the iCal scheduler's last run / error per room (does not trigger a sync)
+async function loadIcalStatus() {
     try {
-        // Sync all rooms with iCal URLs via the bulk endpoint
-        const response = await fetch(`${API_BASE_URL}/sync-all-ical`, {
-            method: 'POST',
+        const response = await fetch(`${API_BASE_URL}/ical/status`, {
             headers: getAuthHeaders()
         });
-        
         const data = await response.json();
         
         if (response.ok && data.success) {
-            // Count total new bookings and update sync times
-            for (const result of data.results) {
-                if (result.success) {
-                    // Update last sync display for this room
-                    updateLastSyncDisplay(result.roomId);
-                    
-                    if (result.syncedCount > 0) {
-                        totalSynced += result.syncedCount;
-                        hasNewBookings = true;
-                        console.log(`  ✓ ${result.roomName}: ${result.syncedCount} new booking(s)`);
-                    }
+            icalSyncStatus = {};
+            for (const status of data.data) {
+                icalSyncStatus[status.roomId] = status;
+                updateLastSyncDisplay(status.roomId, status);
+                if (status.error) {
+                    console.warn(`📅 iCal sync failing for ${status.roomName}: ${status.error}`);
                 }
             }
-            
-            if (hasNewBookings) {
-                console.log(`📅 Auto-sync complete: ${totalSynced} new booking(s) imported`);
-                
-                // Reload rooms silently to show new bookings
-                await roomManager.loadRoomsSilent();
-            } else {
-                console.log('📅 Auto-sync complete: No new bookings');
-            }
-        } else {
-            console.warn('📅 Auto-sync failed:', data.error || 'Unknown error');
         }
     } catch (error) {
-        console.warn('📅 Auto-sync error:', error.message);
-        // Don't show alert for auto-sync errors - it's background operation
-    } finally {
-        isAutoSyncing = false;
+        console.warn('📅 Could not load iCal sync status:', error.message);
     }
 }
\ No newline at end of file